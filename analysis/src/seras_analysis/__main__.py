@@ -0,0 +1,329 @@
+"""
+コマンドラインエントリーポイント
+
+使い方:
+    python -m seras_analysis report --out reports/ --format svg
+    python -m seras_analysis report --profile trace.json
+    python -m seras_analysis report --campuses
+    python -m seras_analysis export --out public/analysis --format json
+    python -m seras_analysis anomalies --fail-on-anomaly
+    python -m seras_analysis bench --sizes 1d 1m 1y --baseline bench/baseline.json
+"""
+import argparse
+import sys
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Sequence
+from .baseline import BaselineParams
+from .constants import ARTIFACT_FORMATS, ARTIFACTS, REPORT_CHARTS, SIZES
+
+if TYPE_CHECKING:
+    import polars as pl
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _load_frames(args: argparse.Namespace) -> Optional[tuple]:
+    """
+    report / export 共通の読み込み。読み込めなかった場合はエラーを表示して None を返します。
+
+    Returns:
+        (df_occupancy, df_open, スプレッドシートID) のタプル。スプレッドシートIDは
+        キャンパス名（`--campuses` でない場合は None）→ ID（None の場合は `config.SPREADSHEET_ID`）
+    """
+    from . import config
+    from .data_loader import PartialResultError, load_campuses, load_data
+    from .sources import LocalSource
+
+    options = dict(use_cache=not args.no_cache, refresh=args.refresh, strict=args.strict)
+    try:
+        if args.campuses:
+            # --data-dir の場合は <data-dir>/<キャンパス名>/ をそれぞれのキャンパスとして読む
+            sources = None
+            spreadsheet_ids = dict(config.CAMPUSES)
+            if args.data_dir:
+                sources = {
+                    p.name: LocalSource(p) for p in sorted(Path(args.data_dir).iterdir()) if p.is_dir()
+                }
+                spreadsheet_ids = {name: source.spreadsheet_id for name, source in sources.items()}
+            df_occupancy, df_open = load_campuses(sources=sources, **options)
+        else:
+            source = LocalSource(args.data_dir) if args.data_dir else None
+            spreadsheet_ids = {None: source.spreadsheet_id if source else None}
+            df_occupancy, df_open = load_data(source=source, **options)
+    except PartialResultError as e:
+        print(e, file=sys.stderr)
+        return None
+    if df_occupancy.is_empty():
+        print("在室状況ログを読み込めませんでした。", file=sys.stderr)
+        return None
+    return df_occupancy, df_open, spreadsheet_ids
+
+
+def _refresh_cube(
+    args: argparse.Namespace,
+    df_occupancy: "pl.DataFrame",
+    spreadsheet_ids: dict[Optional[str], Optional[str]]
+) -> Optional["pl.DataFrame"]:
+    """
+    期間を指定していない（`--start` / `--end` / `--include-today` のない）場合は、保存済みの
+    集計キューブ（`cube.refresh_occupancy_cube`）に前回以降の行だけを加算して返します。
+    `--refresh` の場合はキューブも全件から作り直します。
+    期間を指定した場合は保存済みのキューブと範囲が合わないため、`--no-cache` の場合は
+    保存済みのものを使わないため None を返します（生ログから集計する）。
+    """
+    if args.start or args.end or args.include_today or args.no_cache:
+        return None
+    import polars as pl
+    from .cube import refresh_occupancy_cube
+    from .schema import CAMPUS_COLUMN
+
+    if CAMPUS_COLUMN not in df_occupancy.columns:
+        return refresh_occupancy_cube(df_occupancy, spreadsheet_ids[None], rebuild=args.refresh)
+    # ウォーターマークはスプレッドシートごとのため、キャンパスごとに更新してから Campus を付けて結合する
+    campus_dtype = df_occupancy.schema[CAMPUS_COLUMN]
+    cubes = []
+    for name, spreadsheet_id in spreadsheet_ids.items():
+        df = df_occupancy.filter(pl.col(CAMPUS_COLUMN).cast(pl.Utf8) == name).drop(CAMPUS_COLUMN)
+        cube = refresh_occupancy_cube(df, spreadsheet_id, rebuild=args.refresh)
+        cubes.append(cube.select(pl.lit(name).cast(campus_dtype).alias(CAMPUS_COLUMN), pl.all()))
+    return pl.concat(cubes)
+
+
+def _cmd_report(args: argparse.Namespace) -> int:
+    from . import profiling
+    from .preprocessing import filter_occupancy_data
+    from .report import render_report
+
+    if args.profile:
+        profiling.enable()
+    started = time.perf_counter()
+    frames = _load_frames(args)
+    if frames is None:
+        return 1
+    df_occupancy, df_open, spreadsheet_ids = frames
+
+    start_date = args.start or df_occupancy["Date"].min()
+    df_occupancy = filter_occupancy_data(
+        df_occupancy, start_date=start_date, end_date=args.end, exclude_today=not args.include_today
+    )
+    cube = _refresh_cube(args, df_occupancy, spreadsheet_ids) if "heatmap" in args.charts else None
+
+    paths = render_report(
+        df_occupancy, df_open, args.out,
+        fmt=args.format,
+        charts=args.charts,
+        building=args.building,
+        workers=args.workers,
+        use_figure_cache=not args.no_figure_cache,
+        cube=cube,
+    )
+    for path in paths:
+        print(path)
+    print(f"{len(paths)} 件のチャートを書き出しました（{time.perf_counter() - started:.1f} 秒）")
+
+    if args.profile:
+        if args.profile_format == "json":
+            profiling.export_json(args.profile)
+        else:
+            profiling.export_chrome_trace(args.profile)
+        print(profiling.summary())
+        print(f"計測結果を書き出しました: {args.profile}")
+    return 0
+
+
+def _cmd_export(args: argparse.Namespace) -> int:
+    from .artifacts import export_artifacts
+    from .preprocessing import filter_occupancy_data
+
+    frames = _load_frames(args)
+    if frames is None:
+        return 1
+    df_occupancy, df_open, spreadsheet_ids = frames
+
+    start_date = args.start or df_occupancy["Date"].min()
+    df_occupancy = filter_occupancy_data(
+        df_occupancy, start_date=start_date, end_date=args.end, exclude_today=not args.include_today
+    )
+    cube = _refresh_cube(args, df_occupancy, spreadsheet_ids) if "heatmap" in args.artifacts else None
+    exported = export_artifacts(
+        df_occupancy, df_open, args.out, fmt=args.format, artifacts=args.artifacts, building=args.building,
+        cube=cube,
+    )
+    for a in exported:
+        print(f"{a.path}  {a.content_hash[:19]}  {'更新' if a.changed else '変更なし'}")
+    n_changed = sum(a.changed for a in exported)
+    print(f"{len(exported)} 件の成果物のうち {n_changed} 件を書き出しました。")
+    return 0
+
+
+def _cmd_anomalies(args: argparse.Namespace) -> int:
+    import polars as pl
+    from . import config
+    from .baseline import BaselineParams, refresh_baseline
+    from .data_loader import PartialResultError, load_campuses, load_data
+    from .schema import CAMPUS_COLUMN
+    from .sources import LocalSource, default_source
+
+    params = BaselineParams(alpha=args.alpha, z_threshold=args.threshold, min_slots=args.min_slots)
+    options = dict(use_cache=not args.no_cache, strict=args.strict)
+    try:
+        if args.campuses:
+            # ベースラインはキャンパス（スプレッドシート）ごとに別々に保存する
+            if args.data_dir:
+                sources = {p.name: LocalSource(p) for p in sorted(Path(args.data_dir).iterdir()) if p.is_dir()}
+                spreadsheet_ids = {name: source.spreadsheet_id for name, source in sources.items()}
+                df_occupancy, _ = load_campuses(sources=sources, **options)
+            else:
+                spreadsheet_ids = dict(config.CAMPUSES)
+                df_occupancy, _ = load_campuses(campuses=spreadsheet_ids, **options)
+            targets = [
+                (name, df_occupancy.filter(pl.col(CAMPUS_COLUMN) == name), spreadsheet_id)
+                for name, spreadsheet_id in spreadsheet_ids.items()
+            ]
+        else:
+            source = LocalSource(args.data_dir) if args.data_dir else default_source()
+            df_occupancy, _ = load_data(source=source, **options)
+            targets = [(None, df_occupancy, source.spreadsheet_id)]
+    except PartialResultError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    flagged = []
+    for name, df, spreadsheet_id in targets:
+        label = f"[{name}] " if name else ""
+        scores, days = refresh_baseline(df, spreadsheet_id, params=params, rebuild=args.rebuild)
+        anomalies = days.filter(pl.col("Anomaly"))
+        print(f"{label}{scores['Date'].n_unique()} 日分を取り込み、{anomalies.height} 件の異常を検出しました。")
+        for row in anomalies.iter_rows(named=True):
+            print(
+                f"  {label}{row['Date']} {row['Building']}: 異常スロット {row['AnomalousSlots']}/{row['Slots']}"
+                f"（Z {row['MinZ']:.1f}〜{row['MaxZ']:.1f}、実測 {row['Observed']:.0f} / 平常 {row['Expected']:.0f}）"
+            )
+        if name:
+            anomalies = anomalies.select(pl.lit(name).alias(CAMPUS_COLUMN), pl.all())
+        flagged.append(anomalies)
+
+    if args.out:
+        pl.concat(flagged, how="diagonal").write_csv(args.out)
+        print(f"検出結果を書き出しました: {args.out}")
+    if args.fail_on_anomaly and any(not f.is_empty() for f in flagged):
+        return 2
+    return 0
+
+
+def _cmd_bench(args: argparse.Namespace) -> int:
+    from .bench import BENCHMARKS, check_imports, compare_results, format_result, load_results, run_benchmarks, save_results
+
+    if args.imports:
+        results, violations = check_imports(budget_ms=args.import_budget)
+        for r in results:
+            print(f"{r.module:<32} {r.own_ms:7.1f}ms（polars {r.polars_ms:.1f}ms を除く）")
+        if violations:
+            print(f"\nimport の制約に {len(violations)} 件の違反があります:", file=sys.stderr)
+            for line in violations:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("\nimport の制約を満たしています。")
+        return 0
+
+    unknown = sorted(set(args.only or []) - {b.name for b in BENCHMARKS})
+    if unknown:
+        print(f"未対応のベンチマークです: {', '.join(unknown)}（{', '.join(b.name for b in BENCHMARKS)} のいずれか）", file=sys.stderr)
+        return 1
+
+    results = run_benchmarks(
+        sizes=args.sizes, names=args.only, repeat=args.repeat,
+        progress=lambda r: print(format_result(r), flush=True),
+    )
+    if args.save:
+        save_results(results, args.save)
+        print(f"計測結果を保存しました: {args.save}")
+
+    if args.baseline:
+        regressions = compare_results(
+            results, load_results(args.baseline),
+            tolerance=args.tolerance, memory_tolerance=args.memory_tolerance,
+        )
+        if regressions:
+            print(f"\nベースラインから {len(regressions)} 件の回帰があります:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("\nベースラインからの回帰はありません。")
+    return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="seras-analysis", description="Seras 在室状況分析ツール")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    report = subparsers.add_parser("report", help="全チャートを画像として書き出す（画面不要）")
+    report.add_argument("--out", default="reports", help="出力先ディレクトリ（既定: reports）")
+    report.add_argument("--format", default="png", choices=["png", "svg", "pdf"], help="画像形式")
+    report.add_argument("--start", type=_parse_date, help="開始日 YYYY-MM-DD（既定: データの最初の日）")
+    report.add_argument("--end", type=_parse_date, help="終了日 YYYY-MM-DD（既定: 最新日まで）")
+    report.add_argument("--include-today", action="store_true", help="最新日（集計途中の当日）も含める")
+    report.add_argument("--charts", nargs="+", default=list(REPORT_CHARTS), choices=REPORT_CHARTS, help="描画するチャート")
+    report.add_argument("--building", default="2号館", help="開館時刻分布の対象建物")
+    report.add_argument("--workers", type=int, help="並列プロセス数")
+    report.add_argument("--data-dir", help="スプレッドシートの代わりに読み込むワークシートファイルのディレクトリ")
+    report.add_argument("--campuses", action="store_true", help="全キャンパス（SERAS_CAMPUSES）を並行して読み込み、キャンパスごとに書き出す")
+    report.add_argument("--no-cache", action="store_true", help="ローカルスナップショットを使わない")
+    report.add_argument("--refresh", action="store_true", help="スナップショットを破棄して全件を再取得する")
+    report.add_argument("--strict", action="store_true", help="取得できないシートがあれば（スナップショットで代用せず）終了コード1で終了する")
+    report.add_argument("--no-figure-cache", action="store_true", help="図のキャッシュを使わずに全て描画し直す")
+    report.add_argument("--profile", help="各段階の計測結果を書き出すパス（指定した場合のみ計測する）")
+    report.add_argument("--profile-format", default="chrome", choices=["chrome", "json"], help="計測結果の形式（既定: chrome）")
+    report.set_defaults(func=_cmd_report)
+
+    export = subparsers.add_parser("export", help="Webのダッシュボード向けの集計済みデータ（JSON / Arrow）を書き出す")
+    export.add_argument("--out", default="artifacts", help="出力先ディレクトリ（既定: artifacts）")
+    export.add_argument("--format", default="json", choices=ARTIFACT_FORMATS, help="形式（既定: json）")
+    export.add_argument("--artifacts", nargs="+", default=list(ARTIFACTS), choices=ARTIFACTS, help="書き出す成果物")
+    export.add_argument("--start", type=_parse_date, help="開始日 YYYY-MM-DD（既定: データの最初の日）")
+    export.add_argument("--end", type=_parse_date, help="終了日 YYYY-MM-DD（既定: 最新日まで）")
+    export.add_argument("--include-today", action="store_true", help="最新日（集計途中の当日）も含める")
+    export.add_argument("--building", default="Total", choices=["Building1", "Building2", "Total"], help="ヒートマップの建物（既定: Total）")
+    export.add_argument("--data-dir", help="スプレッドシートの代わりに読み込むワークシートファイルのディレクトリ")
+    export.add_argument("--campuses", action="store_true", help="全キャンパス（SERAS_CAMPUSES）を並行して読み込み、キャンパスごとに書き出す")
+    export.add_argument("--no-cache", action="store_true", help="ローカルスナップショットを使わない")
+    export.add_argument("--refresh", action="store_true", help="スナップショットを破棄して全件を再取得する")
+    export.add_argument("--strict", action="store_true", help="取得できないシートがあれば（スナップショットで代用せず）終了コード1で終了する")
+    export.set_defaults(func=_cmd_export)
+
+    anomalies = subparsers.add_parser("anomalies", help="平常時のベースラインに前回以降の日を取り込み、異常な日を検出する（cron 向け）")
+    anomalies.add_argument("--data-dir", help="スプレッドシートの代わりに読み込むワークシートファイルのディレクトリ")
+    anomalies.add_argument("--campuses", action="store_true", help="全キャンパス（SERAS_CAMPUSES）をそれぞれのベースラインで判定する")
+    anomalies.add_argument("--no-cache", action="store_true", help="ローカルスナップショットを使わない")
+    anomalies.add_argument("--strict", action="store_true", help="取得できないシートがあれば（スナップショットで代用せず）終了コード1で終了する")
+    anomalies.add_argument("--rebuild", action="store_true", help="保存済みのベースラインを破棄して全期間から作り直す")
+    anomalies.add_argument("--alpha", type=float, default=BaselineParams.alpha, help=f"指数加重の係数（既定: {BaselineParams.alpha}。変えるとベースラインを作り直す）")
+    anomalies.add_argument("--threshold", type=float, default=BaselineParams.z_threshold, help=f"異常とみなす |Z| の閾値（既定: {BaselineParams.z_threshold}）")
+    anomalies.add_argument("--min-slots", type=int, default=BaselineParams.min_slots, help=f"異常とみなす異常スロット数（既定: {BaselineParams.min_slots}）")
+    anomalies.add_argument("--out", help="検出した日をCSVで書き出すパス")
+    anomalies.add_argument("--fail-on-anomaly", action="store_true", help="異常を検出した場合は終了コード2で終了する")
+    anomalies.set_defaults(func=_cmd_anomalies)
+
+    bench = subparsers.add_parser("bench", help="合成データで主要な関数の実行時間・メモリを計測する")
+    bench.add_argument("--sizes", nargs="+", default=["1d", "1m", "1y"], choices=list(SIZES), help="データ量（既定: 1d 1m 1y）")
+    # 計測対象の一覧は bench（numpy を読み込む）にあるため、名前は _cmd_bench で確認する
+    bench.add_argument("--only", nargs="+", help="計測する関数")
+    bench.add_argument("--repeat", type=int, default=3, help="繰り返し回数（最小値を採用）")
+    bench.add_argument("--save", help="計測結果をJSONで保存するパス（ベースラインの作成）")
+    bench.add_argument("--baseline", help="比較するベースラインのJSON。回帰があれば終了コード1")
+    bench.add_argument("--tolerance", type=float, default=0.25, help="実行時間の許容率（既定: 0.25）")
+    bench.add_argument("--memory-tolerance", type=float, default=0.25, help="メモリ使用量の許容率（既定: 0.25）")
+    bench.add_argument("--imports", action="store_true", help="関数の代わりに、データ処理モジュールの import 時間と依存を確認する")
+    bench.add_argument("--import-budget", type=float, default=100.0, help="polars を除いた import 時間の上限ミリ秒（既定: 100）")
+    bench.set_defaults(func=_cmd_bench)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
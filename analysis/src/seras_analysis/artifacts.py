@@ -0,0 +1,342 @@
+import hashlib
+import io
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Sequence, Union
+import polars as pl
+from .constants import ARTIFACT_FORMATS, ARTIFACTS
+from .cube import build_occupancy_cube, summarize_cube
+from .preprocessing import compute_daily_trend_profile, extract_daily_opening_times, quantile_column
+from .schema import CAMPUS_COLUMN
+
+# 成果物の形式のバージョン。カラム・JSONの構造を変えたら上げる（読み込む側はこの値で判定する）
+ARTIFACT_VERSION = 1
+
+MANIFEST_NAME = "manifest.json"
+
+# Webの `/api/analysis/occupancy`（src/services/analysisService.ts）と同じ範囲・ラベル
+HEATMAP_HOURS = list(range(7, 23))
+WEEKDAY_LABELS = ["月", "火", "水", "木", "金", "土", "日"]
+TREND_QUANTILES = (0.1, 0.25, 0.75, 0.9)
+OPENING_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+@dataclass
+class ExportedArtifact:
+    """
+    `export_artifacts` で書き出した成果物。
+
+    Attributes:
+        name: 成果物名（`ARTIFACTS` のいずれか）
+        path: ファイルのパス
+        content_hash: 内容のハッシュ（'sha256:<hex>'。生成時刻を含まないため、内容が同じなら同じ値）
+        changed: 今回ファイルを書き換えたかどうか（内容が前回と同じ場合は False で、ファイルはそのまま）
+        campus: キャンパス名（Campus カラムを持つデータの場合）
+    """
+    name: str
+    path: Path
+    content_hash: str
+    changed: bool
+    campus: Optional[str] = None
+
+
+def heatmap_table(cube: pl.DataFrame, building: str = "Total") -> pl.DataFrame:
+    """
+    曜日×時間の平均在室人数を、ヒートマップの全セル（7日 × `HEATMAP_HOURS`）の表にします。
+
+    Args:
+        cube: `cube.build_occupancy_cube` のキューブ
+        building: 建物（Building1, Building2, Total のいずれか）
+
+    Returns:
+        pl.DataFrame: [Weekday, Hour, Mean]（Campus がある場合は先頭に Campus）。
+        データのないセルは 0、平均は小数1位に丸める（Webと同じ）
+    """
+    campus = [CAMPUS_COLUMN] if CAMPUS_COLUMN in cube.columns else []
+    cells = (
+        summarize_cube(cube, stats=("mean",))
+        .filter((pl.col("Building") == building) & pl.col("Hour").is_in(HEATMAP_HOURS))
+        .select(*campus, pl.col("Weekday").cast(pl.Int8), pl.col("Hour").cast(pl.Int8), pl.col("mean").alias("Mean"))
+    )
+    grid = pl.DataFrame({"Weekday": list(range(1, 8))}, schema={"Weekday": pl.Int8}).join(
+        pl.DataFrame({"Hour": HEATMAP_HOURS}, schema={"Hour": pl.Int8}), how="cross"
+    )
+    if campus:
+        grid = cells.select(campus).unique().join(grid, how="cross")
+    return (
+        grid
+        .join(cells, on=[*campus, "Weekday", "Hour"], how="left")
+        .with_columns(pl.col("Mean").fill_null(0.0).round(1))
+        .sort([*campus, "Weekday", "Hour"])
+    )
+
+
+def trend_table(df: Union[pl.DataFrame, pl.LazyFrame]) -> pl.DataFrame:
+    """
+    平日・土日別の15分スロットごとの平均と分位点（`TREND_QUANTILES`）を求めます。
+
+    Returns:
+        pl.DataFrame: [IsWeekend, Slot, MeanTotal, P10, P25, P75, P90]（Campus がある場合は先頭に Campus）。
+        値は小数1位に丸める
+    """
+    _, profile = compute_daily_trend_profile(df, quantiles=TREND_QUANTILES)
+    values = ["MeanTotal", *[quantile_column(q) for q in TREND_QUANTILES]]
+    return profile.with_columns(pl.col(values).round(1))
+
+
+def opening_table(df_pairs: pl.DataFrame) -> pl.DataFrame:
+    """
+    建物・曜日ごとの開館時刻の分布（件数・平均・分位点・最小・最大）と平均開館時間を求めます。
+
+    Args:
+        df_pairs: `preprocessing.extract_daily_opening_times` の結果
+
+    Returns:
+        pl.DataFrame: [Building, Weekday, Count, Mean, P10, P25, P50, P75, P90, Min, Max, MeanDurationHours]
+        （Campus がある場合は先頭に Campus）。時刻は小数の時（例: 13.5 = 13:30）で、小数2位に丸める
+    """
+    campus = [CAMPUS_COLUMN] if CAMPUS_COLUMN in df_pairs.columns else []
+    open_time = pl.col("OpenTime")
+    hour = pl.col("OpenHour")
+    quantiles = [quantile_column(q) for q in OPENING_QUANTILES]
+    return (
+        df_pairs
+        .select(
+            *[pl.col(c).cast(pl.Utf8) for c in campus],
+            pl.col("Building").cast(pl.Utf8),
+            open_time.dt.weekday().cast(pl.Int8).alias("Weekday"),
+            (open_time.dt.hour() + open_time.dt.minute() / 60.0).alias("OpenHour"),
+            "DurationHours",
+        )
+        .group_by([*campus, "Building", "Weekday"])
+        .agg(
+            pl.len().alias("Count"),
+            hour.mean().alias("Mean"),
+            *[hour.quantile(q, interpolation="linear").alias(name) for q, name in zip(OPENING_QUANTILES, quantiles)],
+            hour.min().alias("Min"),
+            hour.max().alias("Max"),
+            pl.col("DurationHours").mean().alias("MeanDurationHours"),
+        )
+        .with_columns(pl.col(["Mean", *quantiles, "Min", "Max", "MeanDurationHours"]).round(2))
+        .sort([*campus, "Building", "Weekday"])
+    )
+
+
+def _heatmap_json(table: pl.DataFrame) -> dict:
+    """`HeatmapData`（src/types/analysis.ts）と同じ形にします。"""
+    rows = table.group_by("Weekday", maintain_order=True).agg(pl.col("Mean"))
+    return {
+        "matrix": rows["Mean"].to_list(),
+        "weekdayLabels": WEEKDAY_LABELS,
+        "hourLabels": HEATMAP_HOURS,
+        "maxValue": float(table["Mean"].max() or 0.0),
+    }
+
+
+def _trends_json(table: pl.DataFrame) -> dict:
+    """`TrendsData`（src/types/analysis.ts）と同じ形にします。"""
+    points = table.select(
+        "IsWeekend",
+        pl.col("Slot").alias("time"),
+        pl.col("MeanTotal").alias("total"),
+        *[pl.col(quantile_column(q)).alias(quantile_column(q).lower()) for q in TREND_QUANTILES],
+    )
+    return {
+        key: points.filter(pl.col("IsWeekend") == is_weekend).drop("IsWeekend").to_dicts()
+        for key, is_weekend in (("weekdayMean", False), ("weekendMean", True))
+    }
+
+
+def _opening_json(table: pl.DataFrame) -> dict:
+    """建物ごとに、曜日別の開館時刻の分布の配列にします。"""
+    rows = table.with_columns(
+        pl.col("Weekday").replace_strict(dict(enumerate(WEEKDAY_LABELS, start=1)), return_dtype=pl.Utf8).alias("Label")
+    )
+    return {
+        "buildings": {
+            building: part.drop("Building").rename(_camel_case).to_dicts()
+            for (building,), part in rows.partition_by("Building", as_dict=True, maintain_order=True).items()
+        }
+    }
+
+
+def _camel_case(name: str) -> str:
+    """カラム名をJSONのキー（先頭小文字）にします（例: 'MeanDurationHours' → 'meanDurationHours'）"""
+    return name[:1].lower() + name[1:]
+
+
+_JSON_SHAPES = {"heatmap": _heatmap_json, "trends": _trends_json, "opening_times": _opening_json}
+
+
+def _period(df: pl.DataFrame) -> dict:
+    """対象期間（'Date' の最初と最後）と日数"""
+    if df.is_empty():
+        return {"from": None, "to": None, "totalDays": 0}
+    first, last, n_days = df.select(
+        pl.col("Date").min().alias("first"), pl.col("Date").max().alias("last"), pl.col("Date").n_unique().alias("n")
+    ).row(0)
+    return {"from": first.isoformat(), "to": last.isoformat(), "totalDays": n_days}
+
+
+def _canonical_json(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _content_hash(data: bytes) -> str:
+    return "sha256:" + hashlib.sha256(data).hexdigest()
+
+
+def _replace(path: Path, data: bytes) -> None:
+    """一時ファイル経由で置き換えます（配信中のファイルを途中まで書いた状態にしない）"""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+def _write_artifacts(
+    out_dir: Path,
+    tables: dict[str, tuple[pl.DataFrame, dict]],
+    fmt: str,
+    generated_at: str,
+    campus: Optional[str]
+) -> list[ExportedArtifact]:
+    """1つの出力先（キャンパス）に成果物とマニフェストを書き出します。"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST_NAME
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        manifest = {}
+    previous = manifest.get("artifacts", {}) if manifest.get("version") == ARTIFACT_VERSION else {}
+
+    exported = []
+    entries = {}
+    for name, (table, period) in tables.items():
+        path = out_dir / f"{name}.{fmt}"
+        if fmt == "json":
+            body = {"artifact": name, "version": ARTIFACT_VERSION, "period": period, "data": _JSON_SHAPES[name](table)}
+            content_hash = _content_hash(_canonical_json(body))
+            payload = json.dumps(
+                {**body, "generatedAt": generated_at, "contentHash": content_hash}, ensure_ascii=False
+            ).encode("utf-8")
+        else:
+            buf = io.BytesIO()
+            table.write_ipc(buf, compression="uncompressed")
+            payload = buf.getvalue()
+            content_hash = _content_hash(_canonical_json({"version": ARTIFACT_VERSION, "period": period}) + payload)
+
+        # 内容が前回と同じならファイルも生成時刻もそのまま
+        prev = previous.get(name, {})
+        changed = not path.exists() or prev.get("contentHash") != content_hash or prev.get("format") != fmt
+        if changed:
+            _replace(path, payload)
+        entries[name] = {
+            "path": path.name,
+            "format": fmt,
+            "contentHash": content_hash,
+            "generatedAt": generated_at if changed else prev["generatedAt"],
+            "bytes": path.stat().st_size,
+            "period": period,
+        }
+        exported.append(ExportedArtifact(name, path, content_hash, changed, campus))
+
+    # 他の成果物（--artifacts で今回書き出さなかったもの）の記録は残す
+    artifacts = {**{k: v for k, v in previous.items() if k not in entries}, **entries}
+    if any(e.changed for e in exported) or artifacts != manifest.get("artifacts"):
+        _replace(manifest_path, json.dumps({
+            "version": ARTIFACT_VERSION,
+            "campus": campus,
+            "generatedAt": generated_at,
+            "artifacts": dict(sorted(artifacts.items())),
+        }, ensure_ascii=False, indent=2).encode("utf-8"))
+    return exported
+
+
+def export_artifacts(
+    df_occupancy: pl.DataFrame,
+    df_open: pl.DataFrame,
+    out_dir: Union[str, Path],
+    fmt: str = "json",
+    artifacts: Sequence[str] = ARTIFACTS,
+    building: str = "Total",
+    generated_at: Optional[datetime] = None,
+    cube: Optional[pl.DataFrame] = None
+) -> list[ExportedArtifact]:
+    """
+    Webのダッシュボードがそのまま配信できる集計済みの成果物を書き出します。
+
+    曜日×時間のヒートマップ（`heatmap`）、平日・土日別のトレンドの平均と分位点（`trends`）、
+    建物・曜日ごとの開館時刻の分布（`opening_times`）を、JSON（Webの型と同じ形）または
+    Arrow IPC（長い形式の表）で `out_dir` に書き出し、一覧を `manifest.json` に記録します。
+
+    各成果物には形式のバージョン（`ARTIFACT_VERSION`）・内容のハッシュ・生成時刻を付けます。
+    ハッシュは生成時刻を含まない内容から求めるため、前回と内容が同じ成果物はファイルを
+    書き換えません（配信側のキャッシュ・ETag がそのまま使える）。
+
+    Campus カラムを持つデータ（`data_loader.load_campuses()`）の場合は、全キャンパスを
+    1回で集計してから `out_dir/<キャンパス名>/` にキャンパスごとに書き出します。
+
+    Args:
+        df_occupancy: 在室状況ログ（期間の絞り込みは呼び出し側で行う）
+        df_open: 開館記録ログ
+        out_dir: 出力先ディレクトリ
+        fmt: 'json' または 'arrow'
+        artifacts: 書き出す成果物（`ARTIFACTS` のサブセット）
+        building: ヒートマップの建物（Building1, Building2, Total のいずれか）
+        generated_at: 生成時刻（省略時は現在時刻）
+        cube: ヒートマップに使う集計キューブ（`cube.refresh_occupancy_cube` で差分更新したもの）。
+            指定した場合は生ログを集計しない。`df_occupancy` と同じ期間のキューブを渡すこと
+
+    Returns:
+        list[ExportedArtifact]: 成果物（キャンパスごとに `artifacts` の順）
+
+    Raises:
+        ValueError: 未対応の成果物・形式を指定した場合
+    """
+    unknown = set(artifacts) - set(ARTIFACTS)
+    if unknown:
+        raise ValueError(f"未対応の成果物です: {', '.join(sorted(unknown))}")
+    if fmt not in ARTIFACT_FORMATS:
+        raise ValueError(f"未対応の形式です: {fmt}（{', '.join(ARTIFACT_FORMATS)} のいずれか）")
+
+    generated_at = (generated_at or datetime.now()).astimezone().isoformat(timespec="seconds")
+    out_dir = Path(out_dir)
+
+    # 全キャンパス分を1回で集計する（Campus カラムがあれば各表の先頭に Campus が付く）
+    # 成果物名 → (表, 対象期間を求める元のDataFrame)
+    tables: dict[str, tuple[pl.DataFrame, pl.DataFrame]] = {}
+    if "heatmap" in artifacts:
+        if cube is None:
+            cube = build_occupancy_cube(df_occupancy)
+        tables["heatmap"] = (heatmap_table(cube, building), df_occupancy)
+    if "trends" in artifacts:
+        tables["trends"] = (trend_table(df_occupancy), df_occupancy)
+    if "opening_times" in artifacts:
+        df_pairs = extract_daily_opening_times(df_open)
+        tables["opening_times"] = (opening_table(df_pairs), df_pairs)
+
+    campuses = [None]
+    if CAMPUS_COLUMN in df_occupancy.columns:
+        campuses = df_occupancy[CAMPUS_COLUMN].unique().sort().to_list()
+
+    exported = []
+    for campus in campuses:
+        selected = {}
+        for name in artifacts:
+            table, source = tables[name]
+            if campus is not None:
+                table = _campus_rows(table, campus)
+                source = _campus_rows(source, campus)
+            selected[name] = (table, _period(source))
+        target = out_dir if campus is None else out_dir / str(campus)
+        exported.extend(_write_artifacts(target, selected, fmt, generated_at, campus))
+    return exported
+
+
+def _campus_rows(df: pl.DataFrame, campus: str) -> pl.DataFrame:
+    """キャンパスの行を取り出し、Campus カラムを除きます（Campus がない表はそのまま）"""
+    if CAMPUS_COLUMN not in df.columns:
+        return df
+    return df.filter(pl.col(CAMPUS_COLUMN).cast(pl.Utf8) == str(campus)).drop(CAMPUS_COLUMN)
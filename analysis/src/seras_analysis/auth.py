@@ -1,14 +1,142 @@
+import contextlib
 import functools
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator, Optional
 import gspread
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.service_account import Credentials
-from . import config
+from requests.adapters import HTTPAdapter
+from . import config, profiling
+
+try:
+    import fcntl
+except ImportError:  # Windows ではロックせずに読み書きする
+    fcntl = None
+
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+
+# 残り時間がこれより短いキャッシュ済みトークンは使わない
+# （google-auth が期限前に更新を始める閾値 3分45秒 より長くする）
+_MIN_REMAINING = timedelta(minutes=5)
+# 接続プールのサイズ（並列にシートを読み込む場合の同時接続数）
+_POOL_SIZE = 16
+
+
+def token_cache_path(client_email: Optional[str] = None) -> Path:
+    """
+    アクセストークンのキャッシュファイルのパスを返します。
+
+    サービスアカウントとスコープの組み合わせごとに1ファイルです。
+
+    Returns:
+        Path: `<CACHE_DIR>/auth/<ハッシュ>.json`
+    """
+    client_email = client_email or config.GOOGLE_SERVICE_ACCOUNT_EMAIL
+    digest = hashlib.sha256(f"{client_email}\n{' '.join(SCOPES)}".encode()).hexdigest()[:16]
+    return Path(config.CACHE_DIR) / "auth" / f"{digest}.json"
+
+
+@contextlib.contextmanager
+def _locked(path: Path) -> Iterator[None]:
+    """`path` に対応するロックファイルを排他ロックします（プロセス間で共有）。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(path.with_suffix(".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_token(path: Path) -> Optional[tuple[str, datetime]]:
+    """キャッシュ済みのトークンと有効期限（UTC）を返します。期限が近い・読めない場合は None"""
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        token, expiry = data["token"], datetime.fromisoformat(data["expiry"])
+    except (OSError, ValueError, KeyError):
+        return None
+    # google-auth の expiry はタイムゾーンなしの UTC
+    if expiry - datetime.now(timezone.utc).replace(tzinfo=None) < _MIN_REMAINING:
+        return None
+    return token, expiry
+
+
+def _write_token(path: Path, token: str, expiry: datetime) -> None:
+    """トークンを所有者だけが読めるファイルに書き込みます（一時ファイルからの置き換え）。"""
+    tmp = path.with_suffix(".json.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"token": token, "expiry": expiry.isoformat()}, f)
+    tmp.replace(path)
+
+
+class CachedCredentials(Credentials):
+    """
+    アクセストークンをディスクにキャッシュするサービスアカウント認証情報。
+
+    トークンの更新時はまずロックを取ってキャッシュを読み直し、他のプロセスが取得した
+    有効なトークンがあればそれを使います。ない場合だけトークンを交換して書き込むため、
+    Notebook のカーネル・レポートのワーカー・cron の実行で1つのトークンを共有できます。
+    """
+
+    cache_path: Optional[Path] = None
+
+    def load_cached_token(self) -> bool:
+        """
+        キャッシュに有効なトークンがあれば設定します（認証の往復なしで使えるようにする）。
+
+        Returns:
+            bool: 有効なトークンを設定できたかどうか
+        """
+        if self.cache_path is None:
+            return False
+        cached = _read_token(self.cache_path)
+        if cached is None:
+            return False
+        self.token, self.expiry = cached
+        return True
+
+    def refresh(self, request) -> None:
+        if self.cache_path is None:
+            super().refresh(request)
+            return
+
+        with _locked(self.cache_path):
+            cached = _read_token(self.cache_path)
+            # 401 で拒否されたトークン自体がキャッシュされている場合は使わない
+            if cached is not None and cached[0] != self.token:
+                self.token, self.expiry = cached
+                return
+            with profiling.span("auth:token", "fetch"):
+                super().refresh(request)
+            _write_token(self.cache_path, self.token, self.expiry)
+
+
+def _session(creds: Credentials) -> AuthorizedSession:
+    """接続を使い回す（keep-alive）認証付きセッションを作成します。"""
+    session = AuthorizedSession(creds)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_POOL_SIZE)
+    session.mount("https://", adapter)
+    return session
+
 
 @functools.lru_cache(maxsize=1)
 def get_google_client() -> gspread.Client:
     """
     Google Sheets APIのクライアントを取得および認証します。
-    結果はキャッシュされ、再認証のオーバーヘッドを回避します。
-    
+
+    アクセストークンは `<CACHE_DIR>/auth/` にキャッシュし、有効期限内であれば
+    新しいプロセスでもトークン交換の往復なしで最初のリクエストを送ります。
+    全てのリクエストは接続プール付きの1つのセッションを使い回します。
+    結果はプロセス内でもキャッシュされます。
+
     Returns:
         gspread.Client: 認証済みのgspreadクライアント
     """
@@ -18,9 +146,16 @@ def get_google_client() -> gspread.Client:
         "private_key": config.GOOGLE_PRIVATE_KEY,
         "token_uri": "https://oauth2.googleapis.com/token",
     }
-    
-    creds = Credentials.from_service_account_info(
-        credentials_config, 
-        scopes=['https://www.googleapis.com/auth/spreadsheets']
-    )
-    return gspread.authorize(creds)
+
+    creds = CachedCredentials.from_service_account_info(credentials_config, scopes=SCOPES)
+    creds.cache_path = token_cache_path(credentials_config["client_email"])
+    creds.load_cached_token()
+    return gspread.authorize(creds, session=_session(creds))
+
+
+def clear_token_cache() -> None:
+    """キャッシュ済みのアクセストークンを削除します（サービスアカウントの鍵を変更した場合など）。"""
+    path = token_cache_path()
+    with _locked(path):
+        path.unlink(missing_ok=True)
+    get_google_client.cache_clear()
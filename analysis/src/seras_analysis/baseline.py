@@ -0,0 +1,312 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+import polars as pl
+from . import config, profiling, snapshot, timeindex
+from .preprocessing import resample_occupancy
+from .schema import CAMPUS_COLUMN
+
+# ベースラインの状態（(曜日, スロット, 建物) ごとの指数加重平均・分散）
+BASELINE_SCHEMA = {
+    "Weekday": pl.Int8,   # 1=月 ... 7=日
+    "Slot": pl.Time,
+    "Building": pl.Utf8,
+    "Count": pl.Int64,    # これまでに取り込んだサンプル数
+    "Mean": pl.Float64,
+    "Var": pl.Float64,
+    "LastDate": pl.Date,  # 最後に取り込んだ日
+}
+
+# スロットごとの異常スコア
+SCORE_SCHEMA = {
+    "Date": pl.Date,
+    "Weekday": pl.Int8,
+    "Slot": pl.Time,
+    "Building": pl.Utf8,
+    "Value": pl.Float64,
+    "Mean": pl.Float64,   # そのサンプルを取り込む前のベースライン
+    "Std": pl.Float64,
+    "Count": pl.Int64,
+    "Z": pl.Float64,      # ベースラインのサンプル数が足りない場合は null
+}
+
+# 日・建物ごとの判定結果
+DAY_SCHEMA = {
+    "Date": pl.Date,
+    "Building": pl.Utf8,
+    "Slots": pl.UInt32,
+    "AnomalousSlots": pl.UInt32,
+    "MinZ": pl.Float64,
+    "MaxZ": pl.Float64,
+    "Observed": pl.Float64,
+    "Expected": pl.Float64,
+    "Anomaly": pl.Boolean,
+}
+
+# ベースラインに集計する人数カラム（Building列の値になる）
+BASELINE_COLUMNS = ["Building1", "Building2", "Total"]
+
+_KEYS = ["Weekday", "Slot", "Building"]
+
+
+@dataclass
+class BaselineParams:
+    """
+    ベースラインと異常判定の設定。
+
+    Attributes:
+        every: スロットの幅（`resample_occupancy` に渡す）
+        alpha: 指数加重の係数。1サンプルの重み（0.1 でおよそ直近19週の平均に相当）
+        min_count: スコアを付けるのに必要なベースラインのサンプル数（それまでは Z が null）。
+            セルは曜日ごとのため 8 でおよそ8週分。指数加重の分散は最初のうち小さく出るため、少ないと誤検知が増える
+        min_std: 標準偏差の下限（人数）。ばらつきのほとんどない時間帯で少しの差が異常にならないようにする
+        z_threshold: スロットを異常とみなす |Z| の閾値
+        min_slots: 日・建物を異常とみなす異常スロット数（15分刻みで4 = 1時間分）
+    """
+    every: str = "15m"
+    alpha: float = 0.1
+    min_count: int = 8
+    min_std: float = 1.0
+    z_threshold: float = 3.0
+    min_slots: int = 4
+
+    def state_params(self) -> dict:
+        """保存したベースラインを使い続けられるかの判定に使う設定（判定の閾値は含めない）"""
+        return {"every": self.every, "alpha": self.alpha}
+
+
+def occupancy_samples(df: pl.DataFrame, every: str = "15m") -> pl.DataFrame:
+    """
+    在室状況ログを (日付, スロット, 建物) ごとのサンプルにします。
+
+    `preprocessing.resample_occupancy` で等間隔のグリッドに揃え（同じ日の直前の値で補完）、
+    建物を行に展開します。その日の最初のサンプルより前のスロットは含めません。
+
+    Args:
+        df: 在室状況ログ（'Timestamp', 'Date' と人数カラム）
+        every: スロットの幅
+
+    Returns:
+        pl.DataFrame: [Date, Weekday, Slot, Building, Value]（Date, Building, Slot 順）
+    """
+    schema = {"Date": pl.Date, "Weekday": pl.Int8, "Slot": pl.Time, "Building": pl.Utf8, "Value": pl.Float64}
+    grid = resample_occupancy(df, every=every, fill="forward")
+    value_cols = [c for c in BASELINE_COLUMNS if c in grid.columns]
+    if grid.is_empty() or not value_cols:
+        return pl.DataFrame(schema=schema)
+
+    return (
+        grid
+        .unpivot(index=["Date", "Slot"], on=value_cols, variable_name="Building", value_name="Value")
+        .drop_nulls("Value")
+        .with_columns(pl.col("Date").dt.weekday().cast(pl.Int8).alias("Weekday"))
+        .sort(["Date", "Building", "Slot"])
+        .select(list(schema))
+    )
+
+
+def update_baseline(
+    baseline: Optional[pl.DataFrame],
+    samples: pl.DataFrame,
+    params: Optional[BaselineParams] = None
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    新しいサンプルを取り込んでベースラインを更新し、各サンプルの異常スコアを求めます。
+
+    セルごとの状態（件数・指数加重平均・指数加重分散）だけを持ち、1サンプルあたり O(1) で更新します
+    （平均 m ← m + α(x - m)、分散 v ← (1 - α)(v + α(x - m)²)）。履歴を読み直す必要はありません。
+    同じセルに複数の日のサンプルがある場合も日付順に取り込み、各サンプルはその直前の状態で採点します。
+    更新はセルごとの `ewm_mean` として1回のクエリで計算します。
+
+    Args:
+        baseline: 保存済みのベースライン（None または空の場合は新しく作る）
+        samples: `occupancy_samples` の結果（ベースラインの最終日より後の日だけを渡すこと）
+        params: 設定（省略時は `BaselineParams()`）
+
+    Returns:
+        Tuple[pl.DataFrame, pl.DataFrame]: (更新後のベースライン, スロットごとの異常スコア)
+    """
+    params = params or BaselineParams()
+    a = params.alpha
+    if baseline is None or baseline.is_empty():
+        baseline = pl.DataFrame(schema=BASELINE_SCHEMA)
+    if samples.is_empty():
+        return baseline, pl.DataFrame(schema=SCORE_SCHEMA)
+
+    # 保存済みの状態を各セルの系列の先頭に置き、続けてサンプルを日付順に並べる
+    prior = baseline.select(
+        *_KEYS,
+        pl.col("LastDate").alias("Date"),
+        pl.col("Mean").alias("Value"),
+        pl.col("Var").alias("Var0"),
+        pl.col("Count").alias("Step"),
+        pl.lit(False).alias("IsSample"),
+    )
+    new = samples.select(
+        *_KEYS, "Date", "Value",
+        pl.lit(0.0).alias("Var0"),
+        pl.lit(1, pl.Int64).alias("Step"),
+        pl.lit(True).alias("IsSample"),
+    )
+    ewm = dict(alpha=a, adjust=False)
+    seq = (
+        pl.concat([prior, new.cast(prior.schema)])
+        .sort([*_KEYS, "IsSample", "Date"])
+        .with_columns(pl.col("Value").ewm_mean(**ewm).over(_KEYS).alias("Mean"))
+        .with_columns(pl.col("Mean").shift(1).over(_KEYS).alias("PrevMean"))
+        .with_columns(
+            # 系列の先頭は保存済みの分散（新しいセルは 0）、以降は (1 - α)(x - m)² の指数加重平均
+            pl.when(pl.col("PrevMean").is_null())
+            .then(pl.col("Var0"))
+            .otherwise((1 - a) * (pl.col("Value") - pl.col("PrevMean")) ** 2)
+            .ewm_mean(**ewm).over(_KEYS)
+            .alias("Var"),
+            pl.col("Step").cum_sum().over(_KEYS).alias("Count"),
+        )
+    )
+
+    updated = (
+        seq
+        .group_by(_KEYS, maintain_order=True)
+        .agg(pl.col("Count").last(), pl.col("Mean").last(), pl.col("Var").last(), pl.col("Date").last().alias("LastDate"))
+        .sort(_KEYS)
+        .select(list(BASELINE_SCHEMA))
+    )
+
+    prev_count = pl.col("Count").shift(1).over(_KEYS)
+    std = pl.max_horizontal(pl.col("Var").shift(1).over(_KEYS).sqrt(), pl.lit(params.min_std))
+    scores = (
+        seq
+        .with_columns(prev_count.alias("PrevCount"), std.alias("Std"))
+        .filter(pl.col("IsSample"))
+        .select(
+            "Date", "Weekday", "Slot", "Building", "Value",
+            pl.col("PrevMean").alias("Mean"),
+            "Std",
+            pl.col("PrevCount").fill_null(0).alias("Count"),
+            pl.when(pl.col("PrevCount") >= params.min_count)
+            .then((pl.col("Value") - pl.col("PrevMean")) / pl.col("Std"))
+            .alias("Z"),
+        )
+        .sort(["Date", "Building", "Slot"])
+    )
+    return updated, scores
+
+
+def flag_days(scores: pl.DataFrame, params: Optional[BaselineParams] = None) -> pl.DataFrame:
+    """
+    スロットごとの異常スコアを日・建物ごとにまとめ、異常な日を判定します。
+
+    |Z| が `z_threshold` 以上のスロットが `min_slots` 以上ある日を異常とします
+    （開館しなかった日は多くのスロットで Z が大きく負に、急な混雑は正になります）。
+
+    Args:
+        scores: `update_baseline` の異常スコア
+        params: 設定（省略時は `BaselineParams()`）
+
+    Returns:
+        pl.DataFrame: [Date, Building, Slots, AnomalousSlots, MinZ, MaxZ, Observed, Expected, Anomaly]。
+        Observed / Expected は採点したスロットの実測値・ベースライン平均の合計
+    """
+    params = params or BaselineParams()
+    scored = scores.filter(pl.col("Z").is_not_null())
+    if scored.is_empty():
+        return pl.DataFrame(schema=DAY_SCHEMA)
+
+    return (
+        scored
+        .group_by(["Date", "Building"])
+        .agg(
+            pl.len().alias("Slots"),
+            (pl.col("Z").abs() >= params.z_threshold).sum().alias("AnomalousSlots"),
+            pl.col("Z").min().alias("MinZ"),
+            pl.col("Z").max().alias("MaxZ"),
+            pl.col("Value").sum().alias("Observed"),
+            pl.col("Mean").sum().alias("Expected"),
+        )
+        .with_columns((pl.col("AnomalousSlots") >= params.min_slots).alias("Anomaly"))
+        .sort(["Date", "Building"])
+        .cast(DAY_SCHEMA)
+        .select(list(DAY_SCHEMA))
+    )
+
+
+def refresh_baseline(
+    df: pl.DataFrame,
+    spreadsheet_id: Optional[str] = None,
+    params: Optional[BaselineParams] = None,
+    exclude_today: bool = True,
+    rebuild: bool = False
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    保存済みのベースラインに前回以降の日だけを取り込んで保存し、その日の判定結果を返します。
+
+    前回取り込んだ最終日をウォーターマークとして保存し、それより後の日の行だけを
+    （ソート済みの場合は二分探索のスライスで）取り出すため、履歴全体を走査し直しません。
+    日ごとの判定結果は `occupancy_anomalies` として追記保存します（`read_anomalies` で読める）。
+    cron などで1日1回実行する想定です。
+
+    Args:
+        df: 在室状況ログ（`load_data()` の df_occupancy）
+        spreadsheet_id: 保存先を決めるスプレッドシートID（省略時は `config.SPREADSHEET_ID`）
+        params: 設定（省略時は `BaselineParams()`。every / alpha が保存時と異なる場合は作り直す）
+        exclude_today: データ内の最新日（集計途中の当日とみなす）を取り込まない
+        rebuild: Trueの場合は保存済みのベースラインを使わずに全期間から作り直す
+
+    Returns:
+        Tuple[pl.DataFrame, pl.DataFrame]: (今回取り込んだ日のスロットごとの異常スコア, 日・建物ごとの判定結果)
+
+    Raises:
+        ValueError: 複数のキャンパスを含むデータの場合（キャンパスごとに呼び出すこと）
+    """
+    spreadsheet_id = spreadsheet_id or config.SPREADSHEET_ID
+    params = params or BaselineParams()
+    if CAMPUS_COLUMN in df.columns:
+        if df[CAMPUS_COLUMN].n_unique() > 1:
+            raise ValueError("複数のキャンパスを含むデータです。キャンパスごとに分けて呼び出してください")
+        df = df.drop(CAMPUS_COLUMN)
+    if df.is_empty():
+        return pl.DataFrame(schema=SCORE_SCHEMA), pl.DataFrame(schema=DAY_SCHEMA)
+
+    df = timeindex.mark_sorted(df)
+    name = f"occupancy_baseline_{params.every}"
+    saved = None if rebuild else snapshot.read_derived(spreadsheet_id, name)
+    baseline, watermark = None, None
+    if saved is not None and saved[1].get("params") == params.state_params():
+        baseline = saved[0]
+        watermark = date.fromisoformat(saved[1]["watermark"])
+
+    df_new = timeindex.slice_between(df, "Date", lower=watermark, closed="right")
+    if exclude_today:
+        today = timeindex.last_date(df)
+        df_new = timeindex.slice_between(df_new, "Date", upper=today, closed="left")
+    if df_new.is_empty():
+        return pl.DataFrame(schema=SCORE_SCHEMA), pl.DataFrame(schema=DAY_SCHEMA)
+
+    with profiling.span("baseline:update", "aggregate", rows_in=df_new.height) as sp:
+        baseline, scores = update_baseline(baseline, occupancy_samples(df_new, params.every), params)
+        days = flag_days(scores, params)
+        sp.set(rows=scores.height)
+
+    snapshot.write_derived(spreadsheet_id, name, baseline, {
+        "params": params.state_params(),
+        "watermark": df_new["Date"].max().isoformat(),
+    })
+    # 判定結果の履歴に追記する（作り直した日の分は置き換える）
+    history = None if rebuild else snapshot.read_derived(spreadsheet_id, "occupancy_anomalies")
+    days_all = days
+    if history is not None:
+        days_all = pl.concat([history[0].cast(DAY_SCHEMA).filter(pl.col("Date") < df_new["Date"].min()), days])
+    snapshot.write_derived(spreadsheet_id, "occupancy_anomalies", days_all, {"params": params.state_params()})
+    return scores, days
+
+
+def read_anomalies(spreadsheet_id: Optional[str] = None) -> pl.DataFrame:
+    """
+    `refresh_baseline` で保存した日ごとの判定結果（全期間）を読み込みます。
+
+    Returns:
+        pl.DataFrame: `DAY_SCHEMA` の表（保存されていない場合は空）
+    """
+    saved = snapshot.read_derived(spreadsheet_id or config.SPREADSHEET_ID, "occupancy_anomalies")
+    return saved[0] if saved is not None else pl.DataFrame(schema=DAY_SCHEMA)
@@ -0,0 +1,441 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence, Tuple, Union
+import polars as pl
+from . import synthetic
+from .schema import compact_frame
+from .timeindex import mark_sorted
+
+# 実行時間の差がこれ未満なら回帰とみなさない（計測のばらつき対策）
+_MIN_SECONDS_DELTA = 0.005
+# メモリの差がこれ未満なら回帰とみなさない
+_MIN_BYTES_DELTA = 1024 * 1024
+
+
+@dataclass
+class Dataset:
+    """ベンチマーク用の合成データ一式"""
+    size: str
+    days: int
+    occupancy: pl.DataFrame
+    open: pl.DataFrame
+    entry_exit: pl.DataFrame
+    fixtures: Path
+
+
+@dataclass
+class Benchmark:
+    """
+    1つの計測対象。
+
+    Attributes:
+        name: 名前（結果・ベースラインのキー）
+        func: データ一式を受け取って計測対象を1回実行する関数
+    """
+    name: str
+    func: Callable[[Dataset], Any]
+
+
+@dataclass
+class BenchResult:
+    """
+    計測結果。
+
+    Attributes:
+        benchmark: ベンチマーク名
+        size: データ量のプリセット名（例: '1y'）
+        rows: 在室状況ログの行数
+        seconds: 実行時間（`repeat` 回の最小値）
+        py_peak_bytes: Pythonヒープの最大使用量（tracemalloc）
+        rss_peak_bytes: プロセスの最大常駐メモリの増分（Linux のみ。Polars のネイティブ領域を含む）
+    """
+    benchmark: str
+    size: str
+    rows: int
+    seconds: float
+    py_peak_bytes: int
+    rss_peak_bytes: Optional[int] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.benchmark}[{self.size}]"
+
+
+def _save_figure(plot: Callable, *args, **kwargs) -> None:
+    """描画関数を実行し、画面に出さずにメモリ上へ保存します。"""
+    plot(*args, save_path=io.BytesIO(), **kwargs)
+
+
+def _bench_load_data(data: Dataset) -> None:
+    from .data_loader import load_data
+    from .sources import LocalSource
+    load_data(use_cache=False, source=LocalSource(data.fixtures))
+
+
+def _bench_filter(data: Dataset) -> None:
+    from .preprocessing import filter_occupancy_data
+    filter_occupancy_data(data.occupancy, start_date=data.occupancy["Date"].min())
+
+
+def _bench_trend_profile(data: Dataset) -> None:
+    from .preprocessing import compute_daily_trend_profile
+    compute_daily_trend_profile(data.occupancy)
+
+
+def _bench_resample(data: Dataset) -> None:
+    from .preprocessing import resample_occupancy
+    resample_occupancy(data.occupancy)
+
+
+def _bench_opening_times(data: Dataset) -> None:
+    from .preprocessing import extract_daily_opening_times
+    extract_daily_opening_times(data.open)
+
+
+def _bench_cube(data: Dataset) -> None:
+    from .cube import build_occupancy_cube, cube_matrix
+    cube_matrix(build_occupancy_cube(data.occupancy))
+
+
+def _bench_sweep_headcount(data: Dataset) -> None:
+    from .headcount import headcount_grid, sweep_headcount
+    result = sweep_headcount(data.entry_exit, until=data.entry_exit["Entry"].max())
+    headcount_grid(result.steps, "15m")
+
+
+def _bench_plot_trends(data: Dataset) -> None:
+    from .plotting import plot_daily_trends
+    _save_figure(plot_daily_trends, data.occupancy)
+
+
+def _bench_plot_breakdown(data: Dataset) -> None:
+    from .plotting import plot_daily_breakdown
+    # 日数に比例してパネルが増えるため、直近30日分だけを描画する
+    dates = data.occupancy["Date"].unique().sort()
+    _save_figure(plot_daily_breakdown, data.occupancy, start_date=dates[max(len(dates) - 30, 0)])
+
+
+def _bench_plot_heatmap(data: Dataset) -> None:
+    from .plotting import plot_average_occupancy_heatmap
+    _save_figure(plot_average_occupancy_heatmap, data.occupancy)
+
+
+def _bench_plot_opening(data: Dataset) -> None:
+    from .plotting import plot_opening_time_stats
+    from .preprocessing import extract_daily_opening_times
+    _save_figure(plot_opening_time_stats, extract_daily_opening_times(data.open))
+
+
+BENCHMARKS = [
+    Benchmark("load_data", _bench_load_data),
+    Benchmark("filter_occupancy_data", _bench_filter),
+    Benchmark("compute_daily_trend_profile", _bench_trend_profile),
+    Benchmark("resample_occupancy", _bench_resample),
+    Benchmark("extract_daily_opening_times", _bench_opening_times),
+    Benchmark("build_occupancy_cube", _bench_cube),
+    Benchmark("sweep_headcount", _bench_sweep_headcount),
+    Benchmark("plot_daily_trends", _bench_plot_trends),
+    Benchmark("plot_daily_breakdown", _bench_plot_breakdown),
+    Benchmark("plot_average_occupancy_heatmap", _bench_plot_heatmap),
+    Benchmark("plot_opening_time_stats", _bench_plot_opening),
+]
+
+
+def make_dataset(size: str, workdir: Union[str, Path], seed: int = 0) -> Dataset:
+    """
+    プリセット名（`synthetic.SIZES` のキー）に対応する合成データを作成します。
+    `load_data` 用のワークシートファイルも `workdir/<size>/` に書き出します。
+    DataFrame は `load_data` の既定と同じく省メモリの型（`schema.compact_frame`）にし、
+    ソート済みのフラグ（`timeindex.mark_sorted`）を付けます。
+    """
+    days = synthetic.SIZES[size]
+    fixtures = synthetic.write_fixtures(Path(workdir) / size, days, seed=seed)
+    return Dataset(
+        size=size,
+        days=days,
+        occupancy=mark_sorted(compact_frame(synthetic.generate_occupancy_logs(days, seed=seed))),
+        open=mark_sorted(compact_frame(synthetic.generate_open_logs(days, seed=seed))),
+        entry_exit=synthetic.generate_entry_exit_logs(days, seed=seed),
+        fixtures=fixtures,
+    )
+
+
+def _read_rss_kb(field: str) -> Optional[int]:
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """最大常駐メモリ（VmHWM）を現在値にリセットします（Linux のみ）。"""
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+        return True
+    except OSError:
+        return False
+
+
+def _measure(benchmark: Benchmark, data: Dataset, repeat: int) -> BenchResult:
+    """実行時間（最小値）とメモリ使用量を計測します。"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        # 1回目はimportやキャッシュの準備を含むため計測しない
+        benchmark.func(data)
+
+        seconds = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            benchmark.func(data)
+            seconds = min(seconds, time.perf_counter() - started)
+
+        # メモリは時間とは別に計測する（tracemalloc は実行を遅くするため）
+        rss_peak = None
+        if _reset_peak_rss():
+            before = _read_rss_kb("VmRSS")
+            benchmark.func(data)
+            after = _read_rss_kb("VmHWM")
+            if before is not None and after is not None:
+                rss_peak = max(after - before, 0) * 1024
+
+        tracemalloc.start()
+        try:
+            benchmark.func(data)
+            _, py_peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return BenchResult(
+        benchmark=benchmark.name,
+        size=data.size,
+        rows=data.occupancy.height,
+        seconds=seconds,
+        py_peak_bytes=py_peak,
+        rss_peak_bytes=rss_peak,
+    )
+
+
+def run_benchmarks(
+    sizes: Sequence[str] = ("1d", "1m", "1y"),
+    names: Optional[Sequence[str]] = None,
+    repeat: int = 3,
+    seed: int = 0,
+    progress: Optional[Callable[[BenchResult], None]] = None
+) -> list[BenchResult]:
+    """
+    合成データでベンチマークを実行します。
+
+    Args:
+        sizes: データ量のプリセット名（`synthetic.SIZES` のキー）
+        names: 実行するベンチマーク名（None の場合は全て）
+        repeat: 計測の繰り返し回数（最小値を採用）
+        seed: 合成データの乱数シード
+        progress: 1件計測するたびに呼ばれる関数
+
+    Returns:
+        list[BenchResult]: 計測結果
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+
+    unknown = set(names or []) - {b.name for b in BENCHMARKS}
+    if unknown:
+        raise ValueError(f"未対応のベンチマークです: {', '.join(sorted(unknown))}")
+    targets = [b for b in BENCHMARKS if names is None or b.name in names]
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="seras-bench-") as workdir:
+        for size in sizes:
+            data = make_dataset(size, workdir, seed=seed)
+            for benchmark in targets:
+                result = _measure(benchmark, data, repeat)
+                results.append(result)
+                if progress is not None:
+                    progress(result)
+    return results
+
+
+def save_results(results: list[BenchResult], path: Union[str, Path]) -> None:
+    """計測結果をJSONとして保存します（ベースラインとして `compare_results` に渡せます）。"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+        "machine": platform.machine(),
+        "results": [asdict(r) for r in results],
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def load_results(path: Union[str, Path]) -> list[BenchResult]:
+    """`save_results` で保存した計測結果を読み込みます。"""
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    return [BenchResult(**r) for r in data["results"]]
+
+
+def compare_results(
+    results: list[BenchResult],
+    baseline: list[BenchResult],
+    tolerance: float = 0.25,
+    memory_tolerance: float = 0.25
+) -> list[str]:
+    """
+    計測結果をベースラインと比較し、回帰したものを返します。
+
+    実行時間・メモリがベースラインの (1 + 許容率) 倍を超え、かつ差が計測誤差の目安
+    （5ms / 1MB）より大きいものを回帰とみなします。ベースラインにない項目は比較しません。
+
+    Args:
+        results: 今回の計測結果
+        baseline: ベースラインの計測結果
+        tolerance: 実行時間の許容率（0.25 = 25% まで遅くなってもよい）
+        memory_tolerance: メモリ使用量の許容率
+
+    Returns:
+        list[str]: 回帰の説明（回帰がなければ空）
+    """
+    base = {r.key: r for r in baseline}
+    regressions = []
+    for r in results:
+        b = base.get(r.key)
+        if b is None:
+            continue
+        if r.seconds > b.seconds * (1 + tolerance) and r.seconds - b.seconds > _MIN_SECONDS_DELTA:
+            regressions.append(f"{r.key}: 実行時間 {b.seconds * 1000:.1f}ms → {r.seconds * 1000:.1f}ms")
+        for label, now, before in (
+            ("Pythonヒープ", r.py_peak_bytes, b.py_peak_bytes),
+            ("最大常駐メモリ", r.rss_peak_bytes, b.rss_peak_bytes),
+        ):
+            if now is None or before is None:
+                continue
+            if now > before * (1 + memory_tolerance) and now - before > _MIN_BYTES_DELTA:
+                regressions.append(f"{r.key}: {label} {before / 2**20:.1f}MB → {now / 2**20:.1f}MB")
+    return regressions
+
+
+def format_result(result: BenchResult) -> str:
+    """計測結果を1行の文字列にします。"""
+    rss = "-" if result.rss_peak_bytes is None else f"{result.rss_peak_bytes / 2**20:7.1f}MB"
+    return (
+        f"{result.key:<45} {result.rows:>9,} 行 {result.seconds * 1000:10.1f}ms "
+        f"py {result.py_peak_bytes / 2**20:7.1f}MB  rss {rss}"
+    )
+
+
+# import を軽く保つモジュール（データ処理だけのジョブや描画前の import）
+LIGHT_MODULES = (
+    "seras_analysis.config",
+    "seras_analysis.snapshot",
+    "seras_analysis.sources",
+    "seras_analysis.data_loader",
+    "seras_analysis.timeindex",
+    "seras_analysis.preprocessing",
+    "seras_analysis.cube",
+    "seras_analysis.baseline",
+    "seras_analysis.artifacts",
+    "seras_analysis.history",
+    "seras_analysis.plotting",
+    # コマンドラインの引数の解析（全サブコマンド共通）でも重いパッケージを読み込まない
+    "seras_analysis.__main__",
+)
+# LIGHT_MODULES の import で読み込まれてはいけないパッケージ
+HEAVY_PACKAGES = ("matplotlib", "seaborn", "japanize_matplotlib", "numpy", "gspread", "google", "dotenv")
+# polars 自体を除いた import 時間の上限（ミリ秒）
+DEFAULT_IMPORT_BUDGET_MS = 100.0
+
+
+@dataclass
+class ImportResult:
+    """
+    `python -X importtime` による import 時間の計測結果。
+
+    Attributes:
+        module: モジュール名
+        total_ms: import 全体の時間
+        polars_ms: そのうち polars の import にかかった時間
+        heavy: 読み込まれた重いパッケージ（`HEAVY_PACKAGES` のうち）
+    """
+    module: str
+    total_ms: float
+    polars_ms: float
+    heavy: list[str]
+
+    @property
+    def own_ms(self) -> float:
+        return self.total_ms - self.polars_ms
+
+
+def _importtime(module: str) -> ImportResult:
+    """別プロセスで `module` を import し、`-X importtime` の出力を集計します。"""
+    src_dir = str(Path(__file__).resolve().parent.parent)
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [src_dir, os.environ.get("PYTHONPATH")]))}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, check=True,
+    )
+
+    total_us = polars_us = 0
+    loaded = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # ヘッダー行
+        name = name.strip()
+        loaded.add(name.split(".")[0])
+        if name == module:
+            total_us = int(cumulative)
+        elif name == "polars":
+            polars_us = int(cumulative)
+
+    return ImportResult(
+        module=module,
+        total_ms=total_us / 1000,
+        polars_ms=polars_us / 1000,
+        heavy=sorted(loaded & set(HEAVY_PACKAGES)),
+    )
+
+
+def check_imports(
+    modules: Sequence[str] = LIGHT_MODULES,
+    budget_ms: float = DEFAULT_IMPORT_BUDGET_MS,
+    repeat: int = 3
+) -> Tuple[list[ImportResult], list[str]]:
+    """
+    モジュールの import 時間と、重いパッケージを読み込んでいないかを確認します。
+
+    各モジュールを新しいプロセスで `repeat` 回 import し、最も速かった回で判定します。
+
+    Args:
+        modules: 確認するモジュール
+        budget_ms: polars を除いた import 時間の上限（ミリ秒）
+        repeat: 計測回数
+
+    Returns:
+        (計測結果, 違反の説明) のタプル。違反がなければ説明は空
+    """
+    results = []
+    violations = []
+    for module in modules:
+        result = min((_importtime(module) for _ in range(repeat)), key=lambda r: r.own_ms)
+        results.append(result)
+        if result.heavy:
+            violations.append(f"{module}: import 時に {', '.join(result.heavy)} を読み込んでいます")
+        if result.own_ms > budget_ms:
+            violations.append(f"{module}: import に {result.own_ms:.0f}ms かかっています（上限 {budget_ms:.0f}ms、polars を除く）")
+    return results, violations
@@ -1,14 +1,21 @@
+import functools
 import os
 from pathlib import Path
-from dotenv import load_dotenv
 
-# .envファイルの読み込み
-# analysisディレクトリ直下、またはプロジェクトルートの.envを探す
-env_path = Path(__file__).parent.parent.parent / '.env'
-if not env_path.exists():
-    env_path = Path(__file__).parent.parent.parent.parent / '.env'
+@functools.cache
+def load_env() -> None:
+    """
+    .envファイルを読み込みます（初回のみ）。
+    import時ではなく、最初に設定値を参照したときに呼ばれます。
+    """
+    from dotenv import load_dotenv
+
+    # analysisディレクトリ直下、またはプロジェクトルートの.envを探す
+    env_path = Path(__file__).parent.parent.parent / '.env'
+    if not env_path.exists():
+        env_path = Path(__file__).parent.parent.parent.parent / '.env'
 
-load_dotenv(dotenv_path=env_path)
+    load_dotenv(dotenv_path=env_path)
 
 def get_env_var(key: str, default: str | None = None) -> str:
     """
@@ -24,6 +31,7 @@ def get_env_var(key: str, default: str | None = None) -> str:
     Raises:
         ValueError: 環境変数が見つからず、デフォルト値も指定されていない場合
     """
+    load_env()
     value = os.getenv(key)
     if value is None:
         if default is not None:
@@ -31,7 +39,63 @@ def get_env_var(key: str, default: str | None = None) -> str:
         raise ValueError(f"必須の環境変数が見つかりません: {key}")
     return value
 
-# 設定値
-SPREADSHEET_ID = get_env_var('OCCUPANCY_SPREADSHEET_ID')
-GOOGLE_SERVICE_ACCOUNT_EMAIL = get_env_var('GOOGLE_SERVICE_ACCOUNT_EMAIL')
-GOOGLE_PRIVATE_KEY = get_env_var('GOOGLE_PRIVATE_KEY').replace('\\n', '\n')
+def parse_campuses(value: str) -> dict[str, str]:
+    """
+    キャンパスの一覧（`名前=スプレッドシートID` のカンマ区切り）を読み取ります。
+
+    例: `本校=1AbC...,駅前校=1XyZ...`
+
+    Args:
+        value: 環境変数 `SERAS_CAMPUSES` の値
+
+    Returns:
+        dict[str, str]: キャンパス名 → スプレッドシートID（記載順）
+
+    Raises:
+        ValueError: 形式が正しくない、または名前が重複している場合
+    """
+    campuses = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, sep, spreadsheet_id = item.partition("=")
+        name, spreadsheet_id = name.strip(), spreadsheet_id.strip()
+        if not sep or not name or not spreadsheet_id:
+            raise ValueError(f"SERAS_CAMPUSES の形式が正しくありません（名前=スプレッドシートID）: {item.strip()}")
+        if name in campuses:
+            raise ValueError(f"SERAS_CAMPUSES のキャンパス名が重複しています: {name}")
+        campuses[name] = spreadsheet_id
+    return campuses
+
+def _campuses() -> dict[str, str]:
+    campuses = parse_campuses(get_env_var('SERAS_CAMPUSES', ''))
+    # 未指定の場合は OCCUPANCY_SPREADSHEET_ID の1校だけ
+    return campuses or {DEFAULT_CAMPUS: get_env_var('OCCUPANCY_SPREADSHEET_ID')}
+
+# SERAS_CAMPUSES を指定しない場合のキャンパス名
+DEFAULT_CAMPUS = 'default'
+
+# 設定値は参照されたときに .env と環境変数から読み込む
+# （import を軽くし、オフライン実行では認証情報が未設定でも import できるように）
+_SETTINGS = {
+    'SPREADSHEET_ID': lambda: get_env_var('OCCUPANCY_SPREADSHEET_ID'),
+    'GOOGLE_SERVICE_ACCOUNT_EMAIL': lambda: get_env_var('GOOGLE_SERVICE_ACCOUNT_EMAIL'),
+    'GOOGLE_PRIVATE_KEY': lambda: get_env_var('GOOGLE_PRIVATE_KEY').replace('\\n', '\n'),
+    # ローカルスナップショットの保存先（未指定の場合は analysis/.cache）
+    'CACHE_DIR': lambda: Path(get_env_var('SERAS_CACHE_DIR', str(Path(__file__).parent.parent.parent / '.cache'))),
+    # ローカルのワークシートファイル（CSV/Parquet/JSON）の置き場所。
+    # 指定した場合はスプレッドシートの代わりにこのディレクトリから読み込む（オフライン実行用）
+    'DATA_DIR': lambda: get_env_var('SERAS_DATA_DIR', ''),
+    # Sheets API の1分あたりの読み取りリクエスト数の上限（既定はユーザーごとの上限 60）
+    'READ_QUOTA_PER_MINUTE': lambda: int(get_env_var('SERAS_READ_QUOTA', '60')),
+    # キャンパス名 → スプレッドシートID（SERAS_CAMPUSES。`load_campuses()` で並行して読み込む）
+    'CAMPUSES': _campuses,
+}
+
+def __getattr__(name: str):
+    """設定値を初回参照時に読み込みます（必須の値が未設定の場合は ValueError）。"""
+    if name not in _SETTINGS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = _SETTINGS[name]()
+    globals()[name] = value
+    return value
@@ -0,0 +1,13 @@
+# コマンドラインの選択肢にも使う名前の一覧。
+# `__main__` が引数の解析だけのために重いモジュール（numpy を読み込む synthetic / bench など）を
+# import しなくて済むよう、依存のないこのモジュールにまとめる
+
+# ベンチマーク等で使う合成データのプリセット名 → 日数（`synthetic` / `bench`）
+SIZES = {"1d": 1, "1w": 7, "1m": 30, "1y": 365, "10y": 3650}
+
+# レポートに含めるチャート（ファイル名にも使用）
+REPORT_CHARTS = ("daily_trends", "daily_breakdown", "heatmap", "opening_times")
+
+# `export` で書き出す成果物（ファイル名にも使用）と形式
+ARTIFACTS = ("heatmap", "trends", "opening_times")
+ARTIFACT_FORMATS = ("json", "arrow")
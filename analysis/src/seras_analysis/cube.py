@@ -0,0 +1,277 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import TYPE_CHECKING, Mapping, Optional, Sequence, Union
+import polars as pl
+from . import config, profiling, snapshot, timeindex
+from .schema import CAMPUS_COLUMN
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# キューブに集計する人数カラム（Building列の値になる）
+BUILDING_COLUMNS = ["Building1", "Building2", "Total"]
+
+CUBE_SCHEMA = {
+    "Weekday": pl.Int8,   # 1=月 ... 7=日
+    "Hour": pl.Int8,
+    "Building": pl.Utf8,
+    "Count": pl.Int64,
+    "Sum": pl.Float64,
+    "SumSq": pl.Float64,
+    "Min": pl.Float64,
+    "Max": pl.Float64,
+}
+
+# 読み出せる統計量
+CUBE_STATS = ("count", "mean", "var", "std", "min", "max")
+
+
+def _cell_keys(columns: Sequence[str]) -> list[str]:
+    """キューブのセルを決めるカラム（Campus があれば先頭に含める）"""
+    keys = ["Weekday", "Hour", "Building"]
+    return [CAMPUS_COLUMN, *keys] if CAMPUS_COLUMN in columns else keys
+
+_CUBE_NAME = "occupancy_cube"
+
+
+@profiling.profiled("aggregate")
+def build_occupancy_cube(df: Union[pl.DataFrame, pl.LazyFrame]) -> pl.DataFrame:
+    """
+    在室状況ログから (曜日, 時間, 建物) ごとの集計キューブを作成します。
+
+    各セルには件数・合計・二乗和・最小・最大を持たせるため、平均・分散・ピークは
+    生ログを走査し直さずにセル数のオーダーで求められ、キューブ同士の合算
+    （`merge_occupancy_cubes`）で差分更新もできます。
+
+    集計はストリーミングエンジンで実行するため、`history.scan_history()` の LazyFrame を
+    渡せば全期間をメモリに載せずに集計できます。
+    Campus カラムがある場合は、全キャンパスを1回のクエリで (キャンパス, 曜日, 時間, 建物) ごとに集計します。
+
+    Args:
+        df: 'Timestamp' と人数カラム（Building1, Building2, Total）を含むDataFrame または LazyFrame
+
+    Returns:
+        pl.DataFrame: `CUBE_SCHEMA` のカラムを持つキューブ（Campus がある場合は先頭に Campus）
+    """
+    columns = df.collect_schema().names()
+    value_cols = [c for c in BUILDING_COLUMNS if c in columns]
+    keys = _cell_keys(columns)
+    campus = [CAMPUS_COLUMN] if CAMPUS_COLUMN in keys else []
+    if not value_cols or (isinstance(df, pl.DataFrame) and df.is_empty()):
+        return pl.DataFrame(schema=_cube_schema(df.collect_schema(), keys))
+
+    # Hourカラムがあればそれを優先（なければTimestampから補完）
+    hour = pl.col("Hour") if "Hour" in columns else pl.col("Timestamp").dt.hour()
+    value = pl.col("Value").cast(pl.Float64)
+
+    return (
+        df.lazy()
+        .select(
+            *campus,
+            pl.col("Timestamp").dt.weekday().cast(pl.Int8).alias("Weekday"),
+            hour.cast(pl.Int8).alias("Hour"),
+            *value_cols,
+        )
+        .unpivot(index=[*campus, "Weekday", "Hour"], on=value_cols, variable_name="Building", value_name="Value")
+        .drop_nulls(["Weekday", "Hour", "Value"])
+        .group_by(keys)
+        .agg(
+            pl.len().cast(pl.Int64).alias("Count"),
+            value.sum().alias("Sum"),
+            (value * value).sum().alias("SumSq"),
+            value.min().alias("Min"),
+            value.max().alias("Max"),
+        )
+        .sort([*campus, "Building", "Weekday", "Hour"])
+        .collect(engine="streaming")
+    )
+
+
+def _cube_schema(columns: Mapping[str, pl.DataType], keys: Sequence[str]) -> dict[str, pl.DataType]:
+    """キューブのスキーマ（Campus がある場合は入力の型のまま先頭に加える）"""
+    if CAMPUS_COLUMN in keys:
+        return {CAMPUS_COLUMN: columns[CAMPUS_COLUMN], **CUBE_SCHEMA}
+    return dict(CUBE_SCHEMA)
+
+
+def merge_occupancy_cubes(*cubes: pl.DataFrame) -> pl.DataFrame:
+    """
+    複数のキューブを合算します（件数・合計・二乗和は和、最小・最大はそれぞれの最小・最大）。
+    Campus カラムを持つキューブはキャンパスごとに合算します。
+
+    Args:
+        *cubes: `build_occupancy_cube` で作成したキューブ
+
+    Returns:
+        pl.DataFrame: 合算したキューブ
+    """
+    cubes = [c for c in cubes if not c.is_empty()]
+    if not cubes:
+        return pl.DataFrame(schema=CUBE_SCHEMA)
+    if len(cubes) == 1:
+        return cubes[0]
+
+    return _merge_cells(pl.concat([c.cast(CUBE_SCHEMA) for c in cubes]), _cell_keys(cubes[0].columns))
+
+
+def _merge_cells(cube: pl.DataFrame, keys: list[str]) -> pl.DataFrame:
+    """同じ `keys` のセルを合算します。"""
+    campus = [k for k in keys if k == CAMPUS_COLUMN]
+    return (
+        cube
+        .group_by(keys)
+        .agg(
+            pl.col("Count").sum(),
+            pl.col("Sum").sum(),
+            pl.col("SumSq").sum(),
+            pl.col("Min").min(),
+            pl.col("Max").max(),
+        )
+        .sort([*campus, "Building", "Weekday", "Hour"])
+    )
+
+
+def campus_cube(cube: pl.DataFrame, campus: Optional[str] = None) -> pl.DataFrame:
+    """
+    キャンパスごとのキューブから1つのキャンパス分を取り出します。
+
+    Args:
+        cube: 集計キューブ
+        campus: キャンパス名。None の場合は全キャンパスを合算する（Campus カラムがなければそのまま）
+
+    Returns:
+        pl.DataFrame: Campus カラムのない `CUBE_SCHEMA` のキューブ
+
+    Raises:
+        ValueError: Campus カラムのないキューブに `campus` を指定した場合
+    """
+    if CAMPUS_COLUMN not in cube.columns:
+        if campus is not None:
+            raise ValueError("Campus カラムのないキューブです（キャンパスごとに集計したキューブに指定してください）")
+        return cube
+    if campus is None:
+        return _merge_cells(cube.drop(CAMPUS_COLUMN), _cell_keys([]))
+    return cube.filter(pl.col(CAMPUS_COLUMN) == campus).drop(CAMPUS_COLUMN)
+
+
+def _stat_expr(stat: str) -> pl.Expr:
+    mean = pl.col("Sum") / pl.col("Count")
+    # 母分散（E[x^2] - E[x]^2）。丸め誤差で負にならないよう0で下限を切る
+    var = (pl.col("SumSq") / pl.col("Count") - mean * mean).clip(lower_bound=0.0)
+    exprs = {
+        "count": pl.col("Count").cast(pl.Float64),
+        "mean": mean,
+        "var": var,
+        "std": var.sqrt(),
+        "min": pl.col("Min"),
+        "max": pl.col("Max"),
+    }
+    if stat not in exprs:
+        raise ValueError(f"未対応の統計量です: {stat}（{', '.join(CUBE_STATS)} のいずれか）")
+    return exprs[stat]
+
+
+def summarize_cube(cube: pl.DataFrame, stats: Sequence[str] = ("mean", "std", "max")) -> pl.DataFrame:
+    """
+    キューブから (曜日, 時間, 建物) ごとの統計量の表を作成します。
+
+    Args:
+        cube: 集計キューブ
+        stats: 求める統計量（`CUBE_STATS` のいずれか）
+
+    Returns:
+        pl.DataFrame: [Weekday, Hour, Building, <stats>...] の表（Campus がある場合は先頭に Campus）
+    """
+    return cube.select(
+        *_cell_keys(cube.columns),
+        *[_stat_expr(stat).alias(stat) for stat in stats],
+    )
+
+
+def cube_matrix(
+    cube: pl.DataFrame,
+    stat: str = "mean",
+    building: str = "Total",
+    hours: Sequence[int] = range(7, 23),
+    fill_value: float = 0.0,
+    campus: Optional[str] = None
+) -> np.ndarray:
+    """
+    キューブから曜日×時間の行列（ヒートマップ用）を取り出します。
+
+    Args:
+        cube: 集計キューブ
+        stat: 統計量（`CUBE_STATS` のいずれか）
+        building: 建物（Building1, Building2, Total のいずれか）
+        hours: 列に並べる時間
+        fill_value: データのないセルの値
+        campus: キャンパス名（Campus カラムを持つキューブの場合。None の場合は全キャンパスの合算）
+
+    Returns:
+        np.ndarray: 形状 (7, len(hours)) の行列。行は月〜日
+    """
+    import numpy as np
+
+    hours = list(hours)
+    cube = campus_cube(cube, campus)
+    matrix = np.full((7, len(hours)), fill_value, dtype=np.float64)
+    if cube.is_empty() or not hours:
+        return matrix
+
+    cells = (
+        cube
+        .filter((pl.col("Building") == building) & pl.col("Hour").is_in(hours))
+        .select(
+            (pl.col("Weekday").cast(pl.Int64) - 1).alias("row"),
+            (pl.col("Hour").cast(pl.Int64) - hours[0]).alias("col"),
+            _stat_expr(stat).alias("value"),
+        )
+    )
+    matrix[cells["row"].to_numpy(), cells["col"].to_numpy()] = cells["value"].to_numpy()
+    return matrix
+
+
+def refresh_occupancy_cube(
+    df: pl.DataFrame,
+    spreadsheet_id: Optional[str] = None,
+    rebuild: bool = False
+) -> pl.DataFrame:
+    """
+    保存済みのキューブに、前回以降の新しい行だけを加算して保存します。
+
+    前回集計した最新の Timestamp をウォーターマークとして保存し、
+    それより新しい行だけを集計してマージするため、履歴全体を走査し直しません。
+    過去の行を修正した場合は `rebuild=True` で作り直してください。
+    ウォーターマークはスプレッドシートごとのため、`load_campuses()` の結果はキャンパスごとに
+    分けて（それぞれのスプレッドシートIDで）呼び出してください。
+
+    Args:
+        df: 在室状況ログ（`load_data()` の df_occupancy）
+        spreadsheet_id: 保存先を決めるスプレッドシートID（省略時は `config.SPREADSHEET_ID`）
+        rebuild: Trueの場合は保存済みのキューブを使わずに全件から作り直す
+
+    Returns:
+        pl.DataFrame: 更新後のキューブ
+    """
+    spreadsheet_id = spreadsheet_id or config.SPREADSHEET_ID
+    if df.is_empty():
+        return pl.DataFrame(schema=CUBE_SCHEMA)
+    if CAMPUS_COLUMN in df.columns and df[CAMPUS_COLUMN].n_unique() > 1:
+        raise ValueError("複数のキャンパスを含むデータです。キャンパスごとに分けて呼び出してください")
+
+    saved = None if rebuild else snapshot.read_derived(spreadsheet_id, _CUBE_NAME)
+    if saved is not None:
+        cube, meta = saved
+        watermark = datetime.fromisoformat(meta["watermark"])
+        df_new = timeindex.slice_between(df, "Timestamp", lower=watermark, closed="right")
+        if df_new.is_empty():
+            return cube
+        cube = merge_occupancy_cubes(cube, build_occupancy_cube(df_new))
+    else:
+        df_new = df
+        cube = build_occupancy_cube(df)
+
+    snapshot.write_derived(spreadsheet_id, _CUBE_NAME, cube, {
+        "watermark": df_new["Timestamp"].max().isoformat(),
+    })
+    return cube
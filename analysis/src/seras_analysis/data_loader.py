@@ -1,103 +1,653 @@
-from typing import Optional, Tuple
-import gspread
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Mapping, Optional, Tuple, Union
+from datetime import date, datetime, timedelta
 import polars as pl
-from . import auth, config
+from . import config, history, profiling, schema, snapshot, timeindex
+from .schema import pad_row
+from .scheduler import is_quota_error
+from .sources import DataSource, LocalSource, absolute_range_name, column_letter, default_source
 
-def _fetch_sheet_as_df(
-    client: gspread.Client, 
-    spreadsheet_id: str, 
+def _values_to_df(spec: "SheetSpec", header: list[str], rows: list[list]) -> pl.DataFrame:
+    """
+    シートの生の値（2次元リスト）をスキーマに従ってDataFrameに変換します。
+    パースできなかった行がある場合は件数を警告として表示します。
+    """
+    if spec.columns:
+        header = list(spec.columns) + list(header[len(spec.columns):])
+    with profiling.span(f"parse:{spec.name}", "parse", rows_in=len(rows)) as sp:
+        df, n_failed = schema.parse_values(header, rows, spec.schema)
+        sp.set(rows=df.height, bytes=df.estimated_size(), failed=n_failed)
+    if n_failed:
+        profiling.log(f"警告: '{spec.name}' の {n_failed} 行に型変換できない値がありました（null として読み込みました）。")
+    return df
+
+
+def _values_bytes(results: list[list[list]]) -> int:
+    """取得した値の文字列としてのデータ量（UTF-8 のバイト数）の目安を返します。"""
+    return sum(len(str(cell).encode()) for values in results for row in values for cell in row)
+
+
+def _fetch(source: DataSource, ranges: list[str], label: str) -> list[list[list[str]]]:
+    """`source.batch_get` を計測区間（fetch）付きで呼び出します。"""
+    with profiling.span(label, "fetch", ranges=len(ranges)) as sp:
+        results = source.batch_get(ranges)
+        if sp.enabled:
+            sp.set(rows=sum(len(values) for values in results), bytes=_values_bytes(results))
+    return results
+
+
+def _column_letter(width: int) -> str:
+    """列数から最終列の列記号（例: 5 → 'E'）を返します。"""
+    return column_letter(width)
+
+
+def _tail_range(start_row: int, width: int) -> str:
+    """`start_row` 行目から最終行までを指すA1表記（例: 'A120:E'）を返します。"""
+    return f"A{start_row}:{_column_letter(width)}"
+
+
+@dataclass(frozen=True)
+class SheetSpec:
+    """
+    読み込むワークシートの定義。
+
+    Attributes:
+        name: ワークシート名
+        schema: カラム名 → Polarsの型（記載のないカラムは文字列のまま）
+        append_only: 行が追記されるだけのシートかどうか。
+            Trueの場合のみローカルスナップショットによる差分取得を行う
+        columns: シート上のヘッダーの代わりに使うカラム名（先頭の列から位置で対応）。
+            None の場合はシートの1行目をそのまま使う
+        history: スナップショットの同期時に、追記分の行を月別パーティション
+            （`history.write_history`）にも書き込むかどうか（Timestamp が行ごとに一意なシートのみ）
+    """
+    name: str
+    schema: Mapping[str, pl.DataType] = field(default_factory=dict)
+    append_only: bool = True
+    columns: Optional[Tuple[str, ...]] = None
+    history: bool = False
+
+
+OCCUPANCY_LOGS = SheetSpec('occupancy_logs', schema=schema.OCCUPANCY_SCHEMA, history=True)
+OPEN_LOGS = SheetSpec('open_logs', schema=schema.OPEN_SCHEMA)
+# 退室時刻が後から書き込まれる・VIEWシートであるため、差分取得の対象外
+ENTRY_EXIT_LOGS = SheetSpec(
+    '入退室記録', schema=schema.ENTRY_EXIT_SCHEMA, append_only=False, columns=tuple(schema.ENTRY_EXIT_SCHEMA)
+)
+
+
+def _build_full(spec: SheetSpec, spreadsheet_id: str, values: list[list], use_cache: bool) -> pl.DataFrame:
+    """
+    ワークシート全体の値からDataFrameを作成し、必要に応じてスナップショットを保存します。
+    シートが空の場合はスキーマのカラムだけを持つ空のDataFrameを返します。
+    """
+    if not values:
+        return pl.DataFrame(schema=spec.schema)
+
+    header, rows = values[0], values[1:]
+    df = _values_to_df(spec, header, rows)
+
+    if use_cache and spec.append_only:
+        with profiling.span(f"snapshot:{spec.name}", "io", rows=df.height):
+            snapshot.write_snapshot(df, snapshot.SnapshotMeta(
+                spreadsheet_id=spreadsheet_id,
+                worksheet=spec.name,
+                columns=header,
+                rows=len(rows),
+                last_row=pad_row(rows[-1], len(header)) if rows else [],
+            ))
+        if spec.history:
+            # 全件を取得し直した場合は、過去の行の修正・削除も反映されるよう作り直す
+            with profiling.span(f"history:{spec.name}", "io", rows=df.height):
+                history.write_history(df, spreadsheet_id, spec.name, replace=True)
+
+    return df
+
+
+def _merge_tail(
+    spec: SheetSpec,
+    values: list[list],
+    df_cached: pl.DataFrame,
+    meta: snapshot.SnapshotMeta
+) -> Optional[pl.DataFrame]:
+    """
+    スナップショットに追記分の行をマージします。
+
+    `values` の先頭はスナップショットの最終行と重なる行です（整合性チェック用）。
+
+    Returns:
+        マージ後のDataFrame。既存行の変更を検知した場合は None（全件の再取得が必要）
+    """
+    width = len(meta.columns)
+    overlap = 1 if meta.rows > 0 else 0
+
+    if overlap and (not values or pad_row(values[0], width) != meta.last_row):
+        profiling.log(f"警告: '{spec.name}' の既存行が変更されています。全件を再取得します。")
+        return None
+
+    new_rows = values[overlap:]
+    if not new_rows:
+        return df_cached
+
+    df_new = _values_to_df(spec, meta.columns, new_rows)
+    df = pl.concat([df_cached, df_new], how="diagonal_relaxed")
+
+    meta.rows += len(new_rows)
+    meta.last_row = pad_row(new_rows[-1], width)
+    with profiling.span(f"snapshot:{spec.name}", "io", rows=df.height):
+        snapshot.write_snapshot(df, meta)
+    if spec.history:
+        # 履歴がまだない場合（この機能より前に作ったスナップショット）は全件を書き込む
+        backfill = not history.list_partitions(meta.spreadsheet_id, spec.name)
+        rows = df if backfill else df_new
+        with profiling.span(f"history:{spec.name}", "io", rows=rows.height):
+            history.write_history(rows, meta.spreadsheet_id, spec.name)
+    return df
+
+
+class PartialResultError(Exception):
+    """
+    一部のワークシートを取得できなかった場合のエラー（`strict=True` のときに送出）。
+
+    Attributes:
+        frames: 取得できた分の結果（`load_sheets` の戻り値と同じ形）
+        missing: 取得できず、空のDataFrameになったワークシート名
+        stale: 取得できず、ローカルスナップショット時点のデータで代用したワークシート名
+        cause: 原因となった例外
+    """
+
+    def __init__(
+        self,
+        message: str,
+        frames: dict[str, pl.DataFrame],
+        missing: list[str],
+        stale: list[str],
+        cause: Optional[BaseException] = None
+    ):
+        super().__init__(message)
+        self.frames = frames
+        self.missing = missing
+        self.stale = stale
+        self.cause = cause
+
+
+def _describe_error(e: BaseException) -> str:
+    """読み込みに失敗した原因を、上限超過とそれ以外で区別して表します。"""
+    if is_quota_error(e):
+        return f"読み取りリクエストの上限に達したため取得できませんでした（{e}）"
+    return f"ワークシートの読み込みエラー: {e}"
+
+
+def load_sheets(
+    specs: list[SheetSpec],
+    use_cache: bool = True,
+    refresh: bool = False,
+    spreadsheet_id: Optional[str] = None,
+    source: Optional[DataSource] = None,
+    strict: bool = False
+) -> dict[str, pl.DataFrame]:
+    """
+    複数のワークシートをまとめて読み込みます。
+
+    スプレッドシートのメタデータ取得（シート一覧）を1回、値の取得を
+    `values_batch_get` の1回にまとめるため、シート数に関わらず往復は2回で済みます。
+    スナップショットがあるシートは、前回同期した行以降の範囲だけを同じリクエストで取得します。
+
+    読み取りリクエストの上限超過などで取得できなかった場合、スナップショットがあるシートは
+    その時点のデータを、ないシートは空のDataFrameを返し、どのシートが不完全かを
+    エラーとして出力します（`strict=True` の場合は `PartialResultError` を送出）。
+    ワークシートが存在しない場合は「データなし」として警告のみ出力します。
+
+    Args:
+        specs: 読み込むワークシートの定義のリスト
+        use_cache: ローカルスナップショットを利用するかどうか
+        refresh: Trueの場合はスナップショットを破棄して全件を再取得する
+        spreadsheet_id: スプレッドシートID（省略時は `config.SPREADSHEET_ID`）
+        source: 読み込み元（省略時は `sources.default_source(spreadsheet_id)`）
+        strict: Trueの場合、一部でも取得できなかったら `PartialResultError` を送出する
+
+    Returns:
+        dict[str, pl.DataFrame]: ワークシート名 → DataFrame。
+        見つからない・読み込めなかったシートは `spec.schema` のカラムだけを持つ空のDataFrame
+
+    Raises:
+        PartialResultError: `strict=True` で、取得できなかったシートがある場合
+    """
+    frames = {spec.name: pl.DataFrame(schema=spec.schema) for spec in specs}
+    # まだ取得できていないシート（存在しないシートは「データなし」として除く）
+    pending = {spec.name for spec in specs}
+    cached = {}
+    error = None
+
+    try:
+        source = source or default_source(spreadsheet_id)
+        spreadsheet_id = source.spreadsheet_id
+
+        # スナップショットは取得に失敗したときの代わりにも使うため、リクエストより先に読む
+        for spec in specs:
+            if use_cache and not refresh and spec.append_only:
+                with profiling.span(f"snapshot:{spec.name}", "io") as sp:
+                    hit = snapshot.read_snapshot(spreadsheet_id, spec.name)
+                    sp.set(rows=hit[0].height if hit is not None else 0)
+                if hit is not None:
+                    cached[spec.name] = hit
+
+        with profiling.span("titles", "fetch"):
+            titles = set(source.titles())
+
+        targets = []
+        for spec in specs:
+            if spec.name not in titles:
+                profiling.log(f"警告: ワークシート '{spec.name}' が見つかりませんでした。")
+                pending.discard(spec.name)
+                continue
+            targets.append(spec)
+
+        # スナップショットがあるシートは追記分の範囲だけ、それ以外はシート全体を要求する
+        ranges = []
+        for spec in targets:
+            if spec.name in cached:
+                _, meta = cached[spec.name]
+                # 整合性チェックのため、最終キャッシュ行も1行重ねて取得する
+                overlap = 1 if meta.rows > 0 else 0
+                ranges.append(absolute_range_name(spec.name, _tail_range(meta.next_row - overlap, len(meta.columns))))
+            else:
+                ranges.append(absolute_range_name(spec.name))
+
+        changed = []
+        if ranges:
+            for spec, values in zip(targets, _fetch(source, ranges, "batch_get")):
+                if spec.name in cached:
+                    df_cached, meta = cached[spec.name]
+                    df = _merge_tail(spec, values, df_cached, meta)
+                    if df is None:
+                        changed.append(spec)
+                        continue
+                    frames[spec.name] = df
+                else:
+                    frames[spec.name] = _build_full(spec, spreadsheet_id, values, use_cache)
+                pending.discard(spec.name)
+
+        if changed:
+            refetch = _fetch(source, [absolute_range_name(spec.name) for spec in changed], "batch_get:refetch")
+            for spec, values in zip(changed, refetch):
+                frames[spec.name] = _build_full(spec, spreadsheet_id, values, use_cache)
+                pending.discard(spec.name)
+
+    except Exception as e:
+        error = e
+
+    if error is None and not pending:
+        return frames
+
+    # 取得できなかったシートは、スナップショットがあればその時点のデータで代用する
+    stale = sorted(name for name in pending if name in cached)
+    missing = sorted(name for name in pending if name not in cached)
+    for name in stale:
+        frames[name] = cached[name][0]
+
+    message = _describe_error(error) if error is not None else "ワークシートの読み込みエラー"
+    if stale:
+        message += f"\n  スナップショット時点のデータを返します（最新の行は含まれません）: {', '.join(stale)}"
+    if missing:
+        message += f"\n  空のDataFrameを返します: {', '.join(missing)}"
+    if strict and pending:
+        raise PartialResultError(message, frames, missing, stale, error) from error
+    profiling.log(message, level="error")
+    return frames
+
+
+# 二分探索で1往復あたりに調べる行数（1回の batch_get にまとめる）
+_PROBES_PER_ROUND = 32
+
+
+def _parse_probe(value: str) -> Optional[datetime]:
+    """プローブしたセルの値を日時に変換します。解釈できない場合は None"""
+    for fmt in ("%Y/%m/%d %H:%M:%S", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _probe_timestamps(source: DataSource, worksheet_name: str, rows: list[int]) -> list[Optional[datetime]]:
+    """指定した各行のA列（Timestamp）を1回のリクエストでまとめて取得します。"""
+    ranges = _fetch(source, [absolute_range_name(worksheet_name, f"A{row}") for row in rows], "probe")
+    return [
+        _parse_probe(str(r[0][0])) if r and r[0] else None
+        for r in ranges
+    ]
+
+
+def _search_first_row(
+    source: DataSource,
     worksheet_name: str,
-    datetime_cols: Optional[list[str]] = None,
-    date_cols: Optional[list[str]] = None
-) -> pl.DataFrame:
+    target: datetime,
+    lo: int,
+    hi: int,
+    unknown_is_after: bool
+) -> int:
+    """
+    時刻順に追記されているシートから、Timestamp が `target` 以上になる最初の行を探します。
+
+    1往復で最大 `_PROBES_PER_ROUND` 行を調べる多分探索のため、
+    数万行でも数回のリクエストで範囲が確定します。
+
+    Args:
+        source: 読み込み元
+        worksheet_name: 対象ワークシート名
+        target: 探索する日時
+        lo: 探索範囲の先頭行（シート上の行番号）
+        hi: 探索範囲の末尾行（シート上の行番号）
+        unknown_is_after: 空欄・解釈不能なセルを `target` 以降とみなすかどうか。
+            範囲が狭まりすぎないよう、開始行の探索では True、終了行の探索では False を指定する
+
+    Returns:
+        int: 条件を満たす最初の行番号。見つからない場合は `hi + 1`
+    """
+    while lo <= hi:
+        size = hi - lo + 1
+        if size <= _PROBES_PER_ROUND:
+            probes = list(range(lo, hi + 1))
+        else:
+            step = size / _PROBES_PER_ROUND
+            probes = sorted({lo + int(step * (i + 1)) - 1 for i in range(_PROBES_PER_ROUND)})
+
+        stamps = _probe_timestamps(source, worksheet_name, probes)
+        hit = next(
+            (i for i, ts in enumerate(stamps)
+             if (ts is None and unknown_is_after) or (ts is not None and ts >= target)),
+            None
+        )
+
+        if size <= _PROBES_PER_ROUND:
+            return probes[hit] if hit is not None else hi + 1
+        if hit is None:
+            lo = probes[-1] + 1
+        else:
+            lo = probes[hit - 1] + 1 if hit > 0 else lo
+            hi = probes[hit]
+            if lo == hi:
+                return hi
+
+    return hi + 1
+
+
+def _to_date(value: Optional[Union[str, date]]) -> Optional[date]:
+    if isinstance(value, str):
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    return value
+
+
+def _empty_occupancy(compact: bool) -> pl.LazyFrame:
+    """
+    行のない在室状況ログ（`load_data_lazy` の結果と同じカラム・型）。
+    期間外・取得失敗の場合もカラムを参照する後続の処理がそのまま動くようにする
+    """
+    df = pl.DataFrame(schema=schema.OCCUPANCY_SCHEMA)
+    return (schema.compact_frame(df) if compact else df).lazy()
+
+
+def load_data_lazy(
+    start_date: Union[str, date],
+    end_date: Optional[Union[str, date]] = None,
+    use_cache: bool = True,
+    source: Optional[DataSource] = None,
+    strict: bool = False,
+    compact: bool = True
+) -> pl.LazyFrame:
     """
-    指定されたワークシートを取得し、Polars DataFrameに変換して型キャストを行います。
-    
+    指定期間の在室状況ログだけを取得し、LazyFrameとして返します。
+
+    `occupancy_logs` が時刻順に追記されることを利用して、期間に対応する行範囲を
+    二分探索で特定し、そのA1範囲だけをダウンロード・パースします。
+    直近数週間だけを分析する場合、全件取得に比べて転送量・パース時間が大きく減ります。
+    ローカルスナップショットが既にある場合は、そちら（差分同期済み）を使います。
+
     Args:
-        client: gspreadクライアント
-        spreadsheet_id: スプレッドシートID
-        worksheet_name: ワークシート名
-        datetime_cols: 日時型（Datetime）に変換するカラム名のリスト
-        date_cols: 日付型（Date）に変換するカラム名のリスト
-        
+        start_date: 開始日（この日を含む）。'YYYY-MM-DD' 文字列も可
+        end_date: 終了日（この日を含む）。Noneの場合は最新行まで
+        use_cache: ローカルスナップショットがあれば利用するかどうか
+        source: 読み込み元（省略時は `sources.default_source()`）
+        strict: Trueの場合、取得できなかったときに空の LazyFrame を返さず `PartialResultError` を送出する
+        compact: Trueの場合は省メモリの型（`schema.compact_frame`）に変換する
+
     Returns:
-        pl.DataFrame: 読み込まれたデータフレーム
+        pl.LazyFrame: 期間でフィルタリングされた在室状況ログ。期間に行がない・取得できなかった場合も
+        `schema.OCCUPANCY_SCHEMA` のカラムを持つ（行のない）LazyFrame
     """
+    start = _to_date(start_date)
+    end = _to_date(end_date)
+
+    date_filter = pl.col("Date") >= start
+    if end is not None:
+        date_filter &= pl.col("Date") <= end
+
+    worksheet_name = OCCUPANCY_LOGS.name
+
     try:
-        sh = client.open_by_key(spreadsheet_id)
-        worksheet = sh.worksheet(worksheet_name)
-        records = worksheet.get_all_records()
-        
-        df = pl.DataFrame(records)
-        
-        if df.is_empty():
-            return df
-            
-        conversions = []
-        if datetime_cols:
-            conversions.extend([
-                pl.col(col).str.strptime(pl.Datetime, format="%Y/%m/%d %H:%M:%S", strict=False)
-                for col in datetime_cols if col in df.columns
-            ])
-        
-        # 修正: 定義した変換を適用する
-        if conversions:
-            df = df.with_columns(conversions)
-            
-        if date_cols:
-            for col in date_cols:
-                if col in df.columns:
-                    # 複数のフォーマットを試行
-                    df = df.with_columns(
-                        pl.coalesce([
-                            pl.col(col).str.strptime(pl.Date, format="%Y/%m/%d", strict=False),
-                            pl.col(col).str.strptime(pl.Date, format="%Y-%m-%d", strict=False),
-                            # ISO8601へのフォールバック
-                            pl.col(col).cast(pl.Date, strict=False)
-                        ]).alias(col)
-                    )
-            
-        return df
+        source = source or default_source()
+        if use_cache and snapshot.read_snapshot(source.spreadsheet_id, worksheet_name) is not None:
+            df = load_sheets([OCCUPANCY_LOGS], source=source, strict=strict)[worksheet_name]
+            if compact:
+                df = schema.compact_frame(df)
+            return df.lazy().filter(date_filter)
+
+        header = _fetch(source, [absolute_range_name(worksheet_name, "1:1")], "header")[0]
+        header = header[0] if header else []
+        with profiling.span("row_count", "fetch"):
+            last_row = source.row_count(worksheet_name)
 
-    except gspread.exceptions.WorksheetNotFound:
-        print(f"警告: ワークシート '{worksheet_name}' が見つかりませんでした。")
-        return pl.DataFrame()
+        first = _search_first_row(
+            source, worksheet_name, datetime.combine(start, datetime.min.time()), 2, last_row, unknown_is_after=True
+        )
+        stop = last_row + 1
+        if end is not None:
+            stop = _search_first_row(
+                source, worksheet_name, datetime.combine(end + timedelta(days=1), datetime.min.time()),
+                first, last_row, unknown_is_after=False
+            )
+
+        if first >= stop:
+            return _empty_occupancy(compact)
+
+        a1 = f"A{first}:{_column_letter(len(header))}{stop - 1}"
+        rows = _fetch(source, [absolute_range_name(worksheet_name, a1)], "batch_get")[0]
+        df = _values_to_df(OCCUPANCY_LOGS, header, rows)
+
+    except PartialResultError:
+        raise
     except Exception as e:
-        print(f"'{worksheet_name}' の読み込みエラー: {e}")
-        return pl.DataFrame()
+        message = f"'{worksheet_name}' の範囲読み込みエラー: {e}"
+        if is_quota_error(e):
+            message = f"'{worksheet_name}' は{_describe_error(e)}"
+        if strict:
+            raise PartialResultError(message, {}, [worksheet_name], [], e) from e
+        profiling.log(message, level="error")
+        return _empty_occupancy(compact)
+
+    if df.is_empty():
+        return _empty_occupancy(compact)
+    if compact:
+        df = schema.compact_frame(df)
 
+    # 範囲の境界は行単位で決めているため、最後に日付で厳密に絞り込む
+    return df.lazy().filter(date_filter)
 
-def load_data() -> Tuple[pl.DataFrame, pl.DataFrame]:
+
+def load_data(
+    use_cache: bool = True,
+    refresh: bool = False,
+    source: Optional[DataSource] = None,
+    strict: bool = False,
+    compact: bool = True
+) -> Tuple[pl.DataFrame, pl.DataFrame]:
     """
     分析用データをロードするメインエントリーポイント。
-    
+
+    2回目以降はローカルスナップショットに対して新しい行だけを追記するため、
+    履歴が増えても読み込み時間はほぼ一定です。
+    過去の行を手動で修正した場合は `refresh=True` で全件を取り直してください。
+
+    Args:
+        use_cache: ローカルスナップショットを利用するかどうか
+        refresh: Trueの場合はスナップショットを破棄して全件を再取得する
+        source: 読み込み元（省略時は `sources.default_source()`。
+            `sources.LocalSource` を渡すとネットワークなしで実行できる）
+        strict: Trueの場合、一部でも取得できなかったら `PartialResultError` を送出する
+            （Falseの場合はスナップショット時点のデータ・空のDataFrameで続行し、エラーを出力する）
+        compact: Trueの場合は人数を UInt16、時刻を UInt8、曜日・操作を Enum、建物名・操作者名を
+            Categorical にした省メモリの型（`schema.compact_frame`）で返す。
+            Falseの場合はスキーマどおり（Int64・文字列）の型で返す
+
     Returns:
         Tuple[pl.DataFrame, pl.DataFrame]: (df_occupancy, df_open)
         - df_occupancy: 在室状況ログ
         - df_open: 開館記録ログ（Dateカラム追加済み）
+        どちらも Timestamp 順に並べ、ソート済みのフラグ（`timeindex.mark_sorted`）を付けて返す
     """
-    client = auth.get_google_client()
-    spreadsheet_id = config.SPREADSHEET_ID
-
-    df_occupancy = _fetch_sheet_as_df(
-        client, 
-        spreadsheet_id, 
-        'occupancy_logs',
-        datetime_cols=['Timestamp'],
-        date_cols=['Date']
-    )
-
-    df_open = _fetch_sheet_as_df(
-        client, 
-        spreadsheet_id, 
-        'open_logs',
-        datetime_cols=['Timestamp']
-    )
-
-    if not df_open.is_empty() and "Timestamp" in df_open.columns:
+    with profiling.span("load_data", "load") as sp:
+        frames = load_sheets(
+            [OCCUPANCY_LOGS, OPEN_LOGS], use_cache=use_cache, refresh=refresh, source=source, strict=strict
+        )
+        sp.set(rows=sum(df.height for df in frames.values()))
+    df_occupancy = frames[OCCUPANCY_LOGS.name]
+    df_open = frames[OPEN_LOGS.name]
+
+    if "Timestamp" in df_open.columns:
         # TimestampからDateを抽出
         df_open = df_open.with_columns(
             pl.col("Timestamp").dt.date().alias("Date")
         )
 
-    return df_occupancy, df_open
+    if compact:
+        df_occupancy = schema.compact_frame(df_occupancy)
+        df_open = schema.compact_frame(df_open)
+
+    # Timestamp 順に並んでいることを保証し、ソート済みのフラグを付ける
+    # （期間の絞り込みを二分探索のスライスにするため。`timeindex` を参照）
+    return timeindex.mark_sorted(df_occupancy), timeindex.mark_sorted(df_open)
+
+
+# load_campuses で同時に読み込むキャンパス数の上限
+_MAX_CAMPUS_WORKERS = 8
+
+
+def _campus_source(name: str, spreadsheet_id: str) -> DataSource:
+    """
+    キャンパスの読み込み元。`SERAS_DATA_DIR` を指定している場合は `<SERAS_DATA_DIR>/<キャンパス名>/`
+    （なければ `SERAS_DATA_DIR` 直下）のファイルを読みます。
+    """
+    if config.DATA_DIR and (Path(config.DATA_DIR) / name).is_dir():
+        return LocalSource(Path(config.DATA_DIR) / name, spreadsheet_id=spreadsheet_id)
+    return default_source(spreadsheet_id)
+
+
+def _with_campus(df: pl.DataFrame, name: str, dtype: pl.DataType) -> pl.DataFrame:
+    """先頭に Campus カラムを追加します（空のDataFrameはそのまま）。"""
+    if df.width == 0:
+        return df
+    return df.select(pl.lit(name, dtype).alias(schema.CAMPUS_COLUMN), pl.all())
+
+
+def load_campuses(
+    campuses: Optional[Mapping[str, str]] = None,
+    sources: Optional[Mapping[str, DataSource]] = None,
+    use_cache: bool = True,
+    refresh: bool = False,
+    strict: bool = False,
+    compact: bool = True,
+    max_workers: Optional[int] = None
+) -> Tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    複数のキャンパス（それぞれ別のスプレッドシート）を並行して読み込み、1つのDataFrameにまとめます。
+
+    キャンパスごとの `load_data()` をスレッドで同時に実行します。スプレッドシートへの
+    リクエストは全キャンパスで1つの読み取り上限（`SERAS_READ_QUOTA`）を分け合うため
+    （`sources.default_source` を参照）、キャンパス数が増えても上限を超えて送ることはありません。
+    スナップショットはスプレッドシートごとに保存され、キャンパスごとに差分取得します。
+
+    集計関数（`cube.build_occupancy_cube`、`preprocessing.compute_daily_trend_profile`、
+    `preprocessing.extract_daily_opening_times`）は Campus カラムがあればキャンパスごとに
+    1回のクエリで集計し、描画関数は `campus` 引数でキャンパスを選びます。
+
+    Args:
+        campuses: キャンパス名 → スプレッドシートID（省略時は `config.CAMPUSES`）
+        sources: キャンパス名 → 読み込み元（指定した場合は `campuses` より優先。
+            `sources.LocalSource` を渡すとネットワークなしで実行できる）
+        use_cache: ローカルスナップショットを利用するかどうか
+        refresh: Trueの場合はスナップショットを破棄して全件を再取得する
+        strict: Trueの場合、いずれかのキャンパスで一部でも取得できなかったら `PartialResultError` を送出する
+        compact: Trueの場合は省メモリの型で返す（`load_data` を参照。Campus は Enum）
+        max_workers: 同時に読み込むキャンパス数（省略時はキャンパス数と8の小さい方）
+
+    Returns:
+        Tuple[pl.DataFrame, pl.DataFrame]: (df_occupancy, df_open)。
+        どちらも先頭に Campus カラムを持ち、Timestamp 順に並べてソート済みのフラグを付ける
+
+    Raises:
+        ValueError: キャンパスが1つも指定されていない場合
+        PartialResultError: `strict=True` で、取得できなかったシートがある場合（メッセージにキャンパス名を含む）
+    """
+    if sources is None:
+        campuses = dict(config.CAMPUSES if campuses is None else campuses)
+        sources = {name: _campus_source(name, spreadsheet_id) for name, spreadsheet_id in campuses.items()}
+    names = list(sources)
+    if not names:
+        raise ValueError("読み込むキャンパスが指定されていません")
+
+    campus_type = pl.Enum(names) if compact else pl.Utf8
+    workers = max_workers or min(len(names), _MAX_CAMPUS_WORKERS)
+    with profiling.span("load_campuses", "load", campuses=len(names)) as sp:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="seras-campus") as pool:
+            futures = {
+                name: pool.submit(load_data, use_cache, refresh, sources[name], strict, compact)
+                for name in names
+            }
+            results = {}
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except PartialResultError as e:
+                    raise PartialResultError(f"[{name}] {e}", e.frames, e.missing, e.stale, e.cause) from e
+
+        frames = []
+        for i in range(2):
+            parts = [_with_campus(results[name][i], name, campus_type) for name in names]
+            parts = [df for df in parts if df.width > 0]
+            merged = pl.concat(parts, how="diagonal_relaxed") if parts else pl.DataFrame()
+            frames.append(timeindex.mark_sorted(merged))
+        sp.set(rows=sum(df.height for df in frames))
+
+    return frames[0], frames[1]
+
+
+def load_entry_exit(
+    source: Optional[DataSource] = None,
+    strict: bool = False
+) -> pl.DataFrame:
+    """
+    入退室記録（`入退室記録` シート）を読み込みます。
+
+    入室・退室時刻の組をそのまま持つため、`headcount.sweep_headcount` で
+    任意の時刻の在室人数を正確に求められます（occupancy_logs の定期サンプリングと違い、
+    記録間隔の間の出入りも失われません）。
+    退室時刻が後から書き込まれるシートのため、スナップショットは使わず毎回全件を取得します。
+
+    Args:
+        source: 読み込み元（省略時は `sources.default_source()`）
+        strict: Trueの場合、取得できなかったら `PartialResultError` を送出する
+
+    Returns:
+        pl.DataFrame: [Entry, Exit, Building, Name]。Exit が null の行は在室中
+    """
+    df = load_sheets([ENTRY_EXIT_LOGS], use_cache=False, source=source, strict=strict)[ENTRY_EXIT_LOGS.name]
+    if df.is_empty():
+        return pl.DataFrame(schema=schema.ENTRY_EXIT_SCHEMA)
+    return df.select(list(schema.ENTRY_EXIT_SCHEMA))
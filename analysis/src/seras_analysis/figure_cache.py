@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Optional, Sequence, Union
+import polars as pl
+
+# 既定のキャッシュ上限（200MB）
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+# キャッシュキーに含めるソース。描画コードだけでなく、描画関数がキーを作った後に通す
+# 集計（トレンド・キューブ・期間の切り出し）も変われば画像が変わるため、すべて含める
+_CODE_MODULES = ("plotting.py", "cube.py", "preprocessing.py", "timeindex.py", "figure_cache.py")
+# 描画結果に影響するパッケージ（バージョンをキーに含める）
+_RENDER_PACKAGES = ("polars", "matplotlib", "seaborn", "japanize-matplotlib")
+
+
+def _frame_digest(df: pl.DataFrame) -> str:
+    """DataFrameの内容（スキーマ＋全行のハッシュ）からダイジェストを作成します。"""
+    h = hashlib.sha256()
+    h.update(repr(df.schema).encode("utf-8"))
+    if not df.is_empty():
+        h.update(df.hash_rows(seed=0).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class FigureCache:
+    """
+    描画済みチャート画像のキャッシュ。
+
+    入力データのスライスと描画パラメータから内容ハッシュを作り、同じキーの画像があれば
+    描画せずにそれを使います。容量が上限を超えたら最終利用が古いものから削除します（LRU）。
+
+    キーには描画・集計コード（`_CODE_MODULES`）のハッシュと描画に関わるパッケージ
+    （`_RENDER_PACKAGES`）のバージョンも含めるため、見た目や集計を変更した場合・
+    matplotlib などを更新した場合に古い画像が使われることはありません。
+    """
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            cache_dir: キャッシュの保存先（省略時は `<CACHE_DIR>/figures`）
+            max_bytes: キャッシュ全体の上限バイト数
+        """
+        if cache_dir is None:
+            from . import config
+            cache_dir = Path(config.CACHE_DIR) / "figures"
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._code_digest = self._code_digest_of(_CODE_MODULES)
+        self._versions = self._package_versions(_RENDER_PACKAGES)
+
+    @staticmethod
+    def _code_digest_of(modules: Sequence[str]) -> str:
+        """パッケージ内のモジュールのソースをまとめたハッシュ"""
+        h = hashlib.sha256()
+        for name in modules:
+            source = Path(__file__).with_name(name)
+            h.update(name.encode("utf-8"))
+            h.update(source.read_bytes() if source.exists() else b"")
+        return h.hexdigest()
+
+    @staticmethod
+    def _package_versions(packages: Sequence[str]) -> dict[str, str]:
+        """
+        パッケージのバージョン（インストールされていないものは空文字）。
+        matplotlib 等を import せずにメタデータから読むため、キャッシュの作成は軽いまま
+        """
+        from importlib.metadata import PackageNotFoundError, version
+
+        versions = {}
+        for name in packages:
+            try:
+                versions[name] = version(name)
+            except PackageNotFoundError:
+                versions[name] = ""
+        return versions
+
+    def key(self, chart: str, frames: Sequence[pl.DataFrame], params: dict[str, Any]) -> str:
+        """
+        チャート名・入力データ・描画パラメータからキャッシュキーを作成します。
+
+        Args:
+            chart: チャート名（関数名など）
+            frames: 描画に使う入力データ（絞り込み後のスライス）
+            params: 描画パラメータ（JSONに変換できる値。日付などは文字列化されます）
+
+        Returns:
+            str: キャッシュキー（16進文字列）
+        """
+        h = hashlib.sha256()
+        h.update(json.dumps({
+            "chart": chart,
+            "params": params,
+            "code": self._code_digest,
+            "packages": self._versions,
+        }, sort_keys=True, default=str).encode("utf-8"))
+        for df in frames:
+            h.update(_frame_digest(df).encode("ascii"))
+        return h.hexdigest()
+
+    def path_for(self, key: str, suffix: str) -> Path:
+        """キーと拡張子（'.png' など）に対応するキャッシュファイルのパスを返します。"""
+        return self.cache_dir / f"{key}{suffix}"
+
+    def lookup(self, key: str, suffix: str) -> Optional[Path]:
+        """
+        キャッシュされた画像を探します。見つかった場合は最終利用日時を更新します。
+
+        Returns:
+            キャッシュファイルのパス。ない場合は None
+        """
+        path = self.path_for(key, suffix)
+        if not path.exists():
+            return None
+        os.utime(path)
+        return path
+
+    def restore(self, key: str, dest: Union[str, Path]) -> bool:
+        """
+        キャッシュされた画像を `dest` にコピーします。
+
+        Returns:
+            bool: キャッシュがあった場合 True
+        """
+        dest = Path(dest)
+        cached = self.lookup(key, dest.suffix)
+        if cached is None:
+            return False
+        shutil.copyfile(cached, dest)
+        return True
+
+    def store(self, key: str, src: Union[str, Path]) -> Path:
+        """
+        描画した画像をキャッシュに保存し、上限を超えた分を削除します。
+
+        Returns:
+            Path: キャッシュファイルのパス
+        """
+        src = Path(src)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(key, src.suffix)
+        if src != path:
+            shutil.copyfile(src, path)
+        self.evict()
+        return path
+
+    def evict(self) -> None:
+        """合計サイズが上限以下になるまで、最終利用が古い画像から削除します。"""
+        if not self.cache_dir.exists():
+            return
+        entries = [(p.stat().st_mtime, p.stat().st_size, p) for p in self.cache_dir.iterdir() if p.is_file()]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,220 @@
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Union
+import polars as pl
+from . import profiling
+
+STEPS_SCHEMA = {"Building": pl.UInt8, "Time": pl.Datetime("us"), "Headcount": pl.Int64}
+STAYS_SCHEMA = {
+    "Name": pl.Utf8, "Building": pl.UInt8, "Entry": pl.Datetime("us"), "Exit": pl.Datetime("us"),
+    "DurationMinutes": pl.Float64, "Open": pl.Boolean,
+}
+PEAKS_SCHEMA = {"Date": pl.Date, "Building": pl.UInt8, "Peak": pl.Int64, "PeakTime": pl.Datetime("us")}
+
+
+@dataclass
+class SweepResult:
+    """
+    `sweep_headcount` の結果。
+
+    Attributes:
+        steps: 建物ごとの在室人数の階段関数 [Building, Time, Headcount]。
+            Headcount は Time から同じ建物の次の行の Time の直前まで続く値
+        stays: 滞在ごとの時間 [Name, Building, Entry, Exit, DurationMinutes, Open]。
+            Open は在室中（退室時刻が空欄）で、`until` までの時間を DurationMinutes とした行
+        peaks: 日・建物ごとの最大同時在室人数 [Date, Building, Peak, PeakTime]。
+            PeakTime は最大値に初めて達した時刻
+    """
+    steps: pl.DataFrame
+    stays: pl.DataFrame
+    peaks: pl.DataFrame
+
+
+def _events(intervals: pl.LazyFrame, first: date, last: date) -> pl.LazyFrame:
+    """
+    区間を入室（+1）・退室（-1）のイベントに分解し、建物ごとの累積で在室人数を求めます。
+
+    同時刻では退室を入室より先に処理し（区間は [入室, 退室)）、各日の 0:00 には
+    人数の変わらないイベント（0）を挟んで、日をまたいだ在室も日ごとのピークに含めます。
+    ソート1回（O(n log n)）と累積和だけで求まります。
+    """
+    buildings = intervals.select(pl.col("Building").unique())
+    midnights = (
+        pl.LazyFrame({"Time": pl.datetime_range(
+            datetime.combine(first, time()), datetime.combine(last, time()), "1d", time_unit="us", eager=True
+        )})
+        .join(buildings, how="cross")
+        .select("Building", "Time", pl.lit(0, pl.Int64).alias("Delta"))
+    )
+    return (
+        pl.concat([
+            intervals.select("Building", pl.col("Entry").alias("Time"), pl.lit(1, pl.Int64).alias("Delta")),
+            intervals.select("Building", pl.col("Exit").alias("Time"), pl.lit(-1, pl.Int64).alias("Delta")),
+            midnights,
+        ])
+        .sort(["Building", "Time", "Delta"])
+        .with_columns(pl.col("Delta").cum_sum().over("Building").alias("Headcount"))
+        # 同時刻のイベントはまとめて、処理後の人数だけを残す
+        .group_by(["Building", "Time"], maintain_order=True)
+        .agg(pl.col("Headcount").last())
+    )
+
+
+@profiling.profiled("aggregate")
+def sweep_headcount(df: pl.DataFrame, until: Optional[datetime] = None) -> SweepResult:
+    """
+    入退室記録から、建物ごとの同時在室人数の階段関数・滞在時間・日ごとのピークを求めます。
+
+    入室・退室をイベントとして時刻順に並べて累積する sweep-line 法のため、
+    結果はサンプリング間隔に依存しない正確な値です。階段関数・滞在時間・ピークは
+    同じイベント列から1回のクエリ（`collect_all`）で計算します。
+
+    退室時刻が空欄（在室中）の滞在は `until` で退室したものとみなします。
+    退室時刻が入室時刻より前の行は除外し、件数を警告として表示します。
+
+    Args:
+        df: `data_loader.load_entry_exit()` の [Entry, Exit, Building, Name]
+        until: 在室中の滞在を打ち切る時刻（省略時は現在時刻）
+
+    Returns:
+        SweepResult: 階段関数・滞在時間・日ごとのピーク
+    """
+    until = until or datetime.now()
+    valid = df.filter(pl.col("Entry").is_not_null() & pl.col("Building").is_not_null())
+    n_invalid = valid.filter(pl.col("Exit") < pl.col("Entry")).height
+    if n_invalid:
+        profiling.log(f"警告: 退室時刻が入室時刻より前の記録が {n_invalid} 件あります（除外しました）。")
+    valid = valid.filter(pl.col("Exit").is_null() | (pl.col("Exit") >= pl.col("Entry")))
+    # 打ち切り時刻より後に入室した在室中の記録は区間にならない
+    valid = valid.filter(pl.col("Exit").is_not_null() | (pl.col("Entry") <= until))
+
+    if valid.is_empty():
+        return SweepResult(
+            pl.DataFrame(schema=STEPS_SCHEMA), pl.DataFrame(schema=STAYS_SCHEMA), pl.DataFrame(schema=PEAKS_SCHEMA)
+        )
+
+    intervals = valid.lazy().select(
+        pl.col("Name"),
+        pl.col("Building").cast(pl.UInt8),
+        pl.col("Entry").cast(pl.Datetime("us")),
+        pl.col("Exit").cast(pl.Datetime("us")).fill_null(pl.lit(until, pl.Datetime("us"))),
+        pl.col("Exit").is_null().alias("Open"),
+    )
+    first, last = intervals.select(pl.col("Entry").min().dt.date(), pl.col("Exit").max().dt.date()).collect().row(0)
+    points = _events(intervals, first, last)
+
+    steps_lf = (
+        points
+        # 人数が変わらない点（0:00 の区切りなど）を除く
+        .filter(pl.col("Headcount") != pl.col("Headcount").shift(1, fill_value=0).over("Building"))
+        .sort(["Building", "Time"])
+    )
+    stays_lf = intervals.select(
+        "Name", "Building", "Entry", "Exit",
+        ((pl.col("Exit") - pl.col("Entry")).dt.total_seconds() / 60.0).alias("DurationMinutes"),
+        "Open",
+    ).sort(["Entry", "Building"])
+    peaks_lf = (
+        points
+        .with_columns(pl.col("Time").dt.date().alias("Date"))
+        .group_by(["Date", "Building"])
+        .agg(
+            pl.col("Headcount").max().alias("Peak"),
+            pl.col("Time").filter(pl.col("Headcount") == pl.col("Headcount").max()).min().alias("PeakTime"),
+        )
+        .sort(["Date", "Building"])
+    )
+
+    steps, stays, peaks = pl.collect_all([steps_lf, stays_lf, peaks_lf])
+    return SweepResult(
+        steps.select(list(STEPS_SCHEMA)), stays.select(list(STAYS_SCHEMA)), peaks.select(list(PEAKS_SCHEMA))
+    )
+
+
+def headcount_at(steps: pl.DataFrame, times: Union[datetime, list[datetime]]) -> pl.DataFrame:
+    """
+    指定した時刻の在室人数を階段関数から求めます（二分探索の as-of 結合）。
+
+    Args:
+        steps: `SweepResult.steps`
+        times: 時刻（複数可）
+
+    Returns:
+        pl.DataFrame: [Time, Building, Headcount]
+    """
+    times = [times] if isinstance(times, datetime) else list(times)
+    queries = (
+        pl.DataFrame({"Time": times}, schema={"Time": pl.Datetime("us")})
+        .join(steps.select(pl.col("Building").unique()), how="cross")
+        .sort("Time")
+    )
+    return (
+        queries
+        .join_asof(steps.sort("Time"), on="Time", by="Building", strategy="backward", check_sortedness=False)
+        .with_columns(pl.col("Headcount").fill_null(0))
+        .sort(["Time", "Building"])
+    )
+
+
+def headcount_grid(
+    steps: pl.DataFrame,
+    every: str = "15m",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> pl.DataFrame:
+    """
+    階段関数を任意の刻みのスロットに集計します。
+
+    各スロットの時間加重平均と最大・最小を、スロット境界で階段を区切って正確に求めます
+    （`occupancy_logs` のような時点のサンプルではなく、スロット内の全ての出入りを反映します）。
+
+    Args:
+        steps: `SweepResult.steps`
+        every: スロットの幅（'5m', '15m', '1h' など Polars の期間文字列）
+        start: 最初のスロットの開始時刻（省略時は最初の変化がある日の 0:00）
+        end: 最後のスロットの終了時刻（省略時は最後の変化がある日の翌日 0:00）
+
+    Returns:
+        pl.DataFrame: [Building, Slot, Mean, Max, Min]（Slot はスロットの開始時刻）
+    """
+    schema = {"Building": pl.UInt8, "Slot": pl.Datetime("us"), "Mean": pl.Float64, "Max": pl.Int64, "Min": pl.Int64}
+    if steps.is_empty():
+        return pl.DataFrame(schema=schema)
+
+    if start is None:
+        start = datetime.combine(steps["Time"].min().date(), time())
+    if end is None:
+        end = datetime.combine(steps["Time"].max().date() + timedelta(days=1), time())
+
+    slots = (
+        pl.DataFrame({"Slot": pl.datetime_range(start, end, every, closed="left", time_unit="us", eager=True)})
+        .join(steps.select(pl.col("Building").unique()), how="cross")
+    )
+    # スロット開始時点の人数（直前の階段の値）
+    at_start = (
+        slots.sort("Slot")
+        .join_asof(steps.sort("Time"), left_on="Slot", right_on="Time", by="Building", strategy="backward", check_sortedness=False)
+        .select("Building", pl.col("Slot").alias("Time"), pl.col("Headcount").fill_null(0))
+    )
+    inside = steps.filter((pl.col("Time") > start) & (pl.col("Time") < end))
+    segments = (
+        pl.concat([at_start, inside])
+        .sort(["Building", "Time"])
+        .unique(subset=["Building", "Time"], keep="last", maintain_order=True)
+        .join_asof(slots.sort("Slot"), left_on="Time", right_on="Slot", by="Building", strategy="backward", check_sortedness=False)
+        .with_columns(
+            (pl.col("Time").shift(-1).over("Building").fill_null(pl.lit(end, pl.Datetime("us"))) - pl.col("Time"))
+            .dt.total_microseconds().alias("_us")
+        )
+    )
+    return (
+        segments
+        .group_by(["Building", "Slot"])
+        .agg(
+            ((pl.col("Headcount") * pl.col("_us")).sum() / pl.col("_us").sum()).alias("Mean"),
+            pl.col("Headcount").max().alias("Max"),
+            pl.col("Headcount").min().alias("Min"),
+        )
+        .sort(["Building", "Slot"])
+        .select(list(schema))
+    )
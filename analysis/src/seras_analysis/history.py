@@ -0,0 +1,153 @@
+import shutil
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Optional, Union
+import polars as pl
+from . import config
+from .schema import OCCUPANCY_SCHEMA, OPEN_SCHEMA
+
+# パーティションディレクトリ名の接頭辞（例: month=2026-01）
+_PARTITION_PREFIX = "month="
+_PARTITION_FILE = "data.parquet"
+# 保存時の型（`compact_frame` の型のまま書くとパーティションごとに型が変わり、まとめて scan できないため）
+_STORAGE_TYPES = {**OCCUPANCY_SCHEMA, **OPEN_SCHEMA}
+
+
+def history_dir(spreadsheet_id: Optional[str] = None, worksheet_name: str = "occupancy_logs") -> Path:
+    """
+    月別パーティションの保存先ディレクトリを返します。
+
+    Args:
+        spreadsheet_id: スプレッドシートID（省略時は `config.SPREADSHEET_ID`）
+        worksheet_name: ワークシート名
+
+    Returns:
+        Path: `<CACHE_DIR>/<spreadsheet_id>/history/<worksheet_name>`
+    """
+    spreadsheet_id = spreadsheet_id or config.SPREADSHEET_ID
+    return Path(config.CACHE_DIR) / spreadsheet_id / "history" / worksheet_name
+
+
+def _partition_path(base: Path, month: str) -> Path:
+    return base / f"{_PARTITION_PREFIX}{month}" / _PARTITION_FILE
+
+
+def _as_date(d: Union[str, date]) -> date:
+    return date.fromisoformat(d) if isinstance(d, str) else d
+
+
+def _month_key(d: Union[str, date]) -> str:
+    """日付から 'YYYY-MM' 形式の月キーを返します。"""
+    d = _as_date(d)
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+def list_partitions(spreadsheet_id: Optional[str] = None, worksheet_name: str = "occupancy_logs") -> list[str]:
+    """
+    保存済みの月キー（'YYYY-MM'）を古い順に返します。
+    """
+    base = history_dir(spreadsheet_id, worksheet_name)
+    if not base.exists():
+        return []
+    return sorted(
+        p.name[len(_PARTITION_PREFIX):]
+        for p in base.iterdir()
+        if p.name.startswith(_PARTITION_PREFIX) and (p / _PARTITION_FILE).exists()
+    )
+
+
+def write_history(
+    df: pl.DataFrame,
+    spreadsheet_id: Optional[str] = None,
+    worksheet_name: str = "occupancy_logs",
+    key: str = "Timestamp",
+    replace: bool = False
+) -> list[str]:
+    """
+    行を月別パーティション（Parquet）に書き込みます。
+
+    `df` に含まれる月のパーティションだけを読み直し、既存の行とマージして置き換えます
+    （同じ `key` の行は新しい値で上書き）。履歴全体をメモリに載せる必要はなく、
+    新しく取得した行だけを渡せば追記になります。
+    `data_loader.load_sheets` がスナップショットを同期するたびに、追記分の行をここに書き込みます。
+
+    Args:
+        df: 書き込む行（'Timestamp' カラムが必要）
+        spreadsheet_id: スプレッドシートID（省略時は `config.SPREADSHEET_ID`）
+        worksheet_name: ワークシート名
+        key: 重複判定に使うカラム
+        replace: Trueの場合は既存のパーティションを全て削除してから書き込む（全件を取得し直した場合）
+
+    Returns:
+        list[str]: 書き込んだ月キー
+    """
+    base = history_dir(spreadsheet_id, worksheet_name)
+    if replace and base.exists():
+        shutil.rmtree(base)
+
+    df = df.filter(pl.col("Timestamp").is_not_null())
+    if df.is_empty():
+        return []
+    df = df.cast({name: dtype for name, dtype in _STORAGE_TYPES.items() if name in df.columns})
+
+    df = df.with_columns(pl.col("Timestamp").dt.strftime("%Y-%m").alias("_month"))
+
+    written = []
+    for part in df.partition_by("_month", maintain_order=True):
+        month = part["_month"][0]
+        part = part.drop("_month")
+        path = _partition_path(base, month)
+        if path.exists():
+            existing = pl.read_parquet(path)
+            part = pl.concat([existing, part], how="diagonal_relaxed")
+        part = part.unique(subset=[key], keep="last", maintain_order=True).sort("Timestamp")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".parquet.tmp")
+        part.write_parquet(tmp, statistics=True)
+        tmp.replace(path)
+        written.append(month)
+
+    return written
+
+
+def scan_history(
+    start_date: Optional[Union[str, date]] = None,
+    end_date: Optional[Union[str, date]] = None,
+    spreadsheet_id: Optional[str] = None,
+    worksheet_name: str = "occupancy_logs"
+) -> pl.LazyFrame:
+    """
+    月別パーティションを LazyFrame として読み込みます。
+
+    期間外の月のファイルはパスの段階で除外し（パーティションプルーニング）、
+    残りのファイル内も Parquet の統計情報で行グループ単位に読み飛ばします。
+    `collect(engine="streaming")` で実行すれば、全期間がメモリに載らない場合でも集計できます。
+
+    Args:
+        start_date: 開始日（この日を含む）
+        end_date: 終了日（この日を含む）
+        spreadsheet_id: スプレッドシートID（省略時は `config.SPREADSHEET_ID`）
+        worksheet_name: ワークシート名
+
+    Returns:
+        pl.LazyFrame: 期間内の行。パーティションがない場合は空の LazyFrame
+    """
+    months = list_partitions(spreadsheet_id, worksheet_name)
+    if start_date is not None:
+        months = [m for m in months if m >= _month_key(start_date)]
+    if end_date is not None:
+        months = [m for m in months if m <= _month_key(end_date)]
+
+    if not months:
+        return pl.LazyFrame(schema=OCCUPANCY_SCHEMA if worksheet_name == "occupancy_logs" else None)
+
+    base = history_dir(spreadsheet_id, worksheet_name)
+    lf = pl.scan_parquet([_partition_path(base, m) for m in months])
+
+    # 月の途中の日付は行単位で絞り込む（Timestamp の範囲にすると統計情報で読み飛ばせる）
+    if start_date is not None:
+        lf = lf.filter(pl.col("Timestamp") >= datetime.combine(_as_date(start_date), time()))
+    if end_date is not None:
+        lf = lf.filter(pl.col("Timestamp") < datetime.combine(_as_date(end_date) + timedelta(days=1), time()))
+    return lf
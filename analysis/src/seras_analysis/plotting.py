@@ -1,17 +1,22 @@
-from typing import Optional, Union, List, Tuple
+from __future__ import annotations
+from typing import TYPE_CHECKING, Optional, Union, List, Tuple
 from datetime import date, datetime
+from pathlib import Path
+import functools
 import math
-import polars as pl
-import matplotlib.pyplot as plt
-from matplotlib.ticker import MaxNLocator, FuncFormatter
-import seaborn as sns
-import numpy as np
-from matplotlib.lines import Line2D
-from matplotlib.colors import LinearSegmentedColormap
-import japanize_matplotlib
-japanize_matplotlib.japanize()
 import warnings
-warnings.filterwarnings("ignore")
+import polars as pl
+from . import profiling, timeindex
+from .cube import build_occupancy_cube, campus_cube, cube_matrix
+from .figure_cache import FigureCache
+from .preprocessing import compute_daily_trend_profile
+from .schema import CAMPUS_COLUMN
+
+# matplotlib / seaborn / japanize_matplotlib / numpy は import が重く、
+# rcParams も書き換えるため、描画するときに初めて読み込む
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+    import numpy as np
 
 # ==========================================
 # Seras Design System Colors (ブランドカラー定義)
@@ -30,47 +35,138 @@ COLORS = {
     "yellow": "#fdcb6e",     # Yellow
 }
 
-# テーマ設定: モダンでフラットなデザイン ("paper" context, white style)
-sns.set_theme(style="white", context="paper", font_scale=1.1)
-plt.rcParams.update({
-    "font.family": ["Hiragino Sans", "sans-serif"],
-    "text.color": COLORS["text_main"],
-    "axes.labelcolor": COLORS["text_main"],
-    "xtick.color": COLORS["text_sub"],
-    "ytick.color": COLORS["text_sub"],
-    "axes.spines.top": False,
-    "axes.spines.right": False,
-    "axes.linewidth": 0.0, # 軸の境界線を消してクリーンに
-    "grid.color": "#dfe6e9",
-    "grid.linestyle": ":",
-    "grid.linewidth": 0.8,
-    "figure.facecolor": "#ffffff", # 背景は完全な白
-    "axes.facecolor": "#ffffff",
-    "figure.constrained_layout.use": True,
-})
+_theme_applied = False
+
+def apply_theme() -> None:
+    """
+    Seras のテーマ（配色・フォント・日本語表示）を matplotlib に設定します。
+
+    各 `plot_*` 関数の初回呼び出し時に自動で適用されます。
+    このモジュールを import しただけでは matplotlib のグローバル設定は変わりません。
+    """
+    global _theme_applied
+    if _theme_applied:
+        return
+
+    import japanize_matplotlib
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    japanize_matplotlib.japanize()
+
+    # テーマ設定: モダンでフラットなデザイン ("paper" context, white style)
+    sns.set_theme(style="white", context="paper", font_scale=1.1)
+    plt.rcParams.update({
+        # Hiragino Sans がない環境では japanize_matplotlib の IPAexGothic で日本語を表示する
+        "font.family": ["Hiragino Sans", "IPAexGothic", "sans-serif"],
+        "text.color": COLORS["text_main"],
+        "axes.labelcolor": COLORS["text_main"],
+        "xtick.color": COLORS["text_sub"],
+        "ytick.color": COLORS["text_sub"],
+        "axes.spines.top": False,
+        "axes.spines.right": False,
+        "axes.linewidth": 0.0, # 軸の境界線を消してクリーンに
+        "grid.color": "#dfe6e9",
+        "grid.linestyle": ":",
+        "grid.linewidth": 0.8,
+        "figure.facecolor": "#ffffff", # 背景は完全な白
+        "axes.facecolor": "#ffffff",
+        "figure.constrained_layout.use": True,
+    })
+    _theme_applied = True
+
+def _plot_function(func):
+    """
+    描画関数の共通処理。初回にテーマを適用し、描画中に出る警告（フォントの代替など）を
+    その関数の実行中だけ抑制します（プロセス全体の警告設定は変更しない）。
+    計測が有効な場合は関数全体を render 区間として記録します。
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profiling.span(func.__name__, "render") as sp:
+            if args and isinstance(args[0], pl.DataFrame):
+                sp.set(rows_in=args[0].height)
+            apply_theme()
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                return func(*args, **kwargs)
+    return wrapper
+
+def _filter_dates(
+    df: Union[pl.DataFrame, pl.LazyFrame],
+    start_date: Optional[Union[str, date]] = None,
+    end_date: Optional[Union[str, date]] = None,
+) -> Union[pl.DataFrame, pl.LazyFrame]:
+    """
+    期間で絞り込むヘルパー関数。
+    'Date' がソート済みのDataFrameはスライスで、それ以外は filter で絞り込む
+    （LazyFrame の場合は実行せずにクエリに追加する）
+    """
+    if isinstance(start_date, str):
+        start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+    if isinstance(end_date, str):
+        end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+    return timeindex.slice_dates(df, start_date or None, end_date or None)
+
+def _select_campus(
+    df: Union[pl.DataFrame, pl.LazyFrame],
+    campus: Optional[str] = None,
+) -> Union[pl.DataFrame, pl.LazyFrame]:
+    """
+    `campus` の行だけを取り出し、Campus カラムを除くヘルパー関数。
+    Campus カラムのないデータはそのまま返します（1キャンパスだけの場合は `campus` を省略できる）。
+    """
+    if CAMPUS_COLUMN not in df.collect_schema():
+        if campus is not None:
+            raise ValueError("Campus カラムのないデータです（campus は load_campuses() の結果に指定してください）")
+        return df
+    if campus is None:
+        if isinstance(df, pl.LazyFrame):
+            return df
+        campuses = df[CAMPUS_COLUMN].unique()
+        if campuses.len() > 1:
+            raise ValueError(f"複数のキャンパスを含むデータです。campus を指定してください: {', '.join(map(str, campuses.sort()))}")
+        return df.drop(CAMPUS_COLUMN)
+    return df.filter(pl.col(CAMPUS_COLUMN) == campus).drop(CAMPUS_COLUMN)
 
 def _prepare_data(
-    df: pl.DataFrame,
+    df: Union[pl.DataFrame, pl.LazyFrame],
     start_date: Optional[Union[str, date]] = None,
     end_date: Optional[Union[str, date]] = None,
+    campus: Optional[str] = None,
 ) -> Tuple[pl.DataFrame, pl.Series]:
-    """日時フィルタリングとソートを行うヘルパー関数"""
-    if start_date:
-        if isinstance(start_date, str):
-            start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
-        df = df.filter(pl.col("Date") >= start_date)
-
-    if end_date:
-        if isinstance(end_date, str):
-            end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
-        df = df.filter(pl.col("Date") <= end_date)
-
-    df_sorted = df.sort("Timestamp")
-    unique_dates = df_sorted["Date"].unique().sort()
+    """
+    日時フィルタリングとソートを行うヘルパー関数。
+
+    ソート済みのフラグがあるDataFrame（`load_data()` の既定）は並べ替えずにスライスで絞り込み、
+    日付の一覧も日付オフセットの索引（`timeindex.day_index`）から求めます。
+    複数キャンパスのデータは `campus` の行だけにします。
+    """
+    if isinstance(df, pl.LazyFrame):
+        # 描画する期間だけをストリーミング実行で読み込む
+        df = _filter_dates(_select_campus(df, campus), start_date, end_date).collect(engine="streaming")
+        df_sorted = timeindex.mark_sorted(_select_campus(df))
+    else:
+        df_sorted = _filter_dates(timeindex.mark_sorted(_select_campus(df, campus)), start_date, end_date)
+
+    if timeindex.is_sorted(df_sorted, "Date"):
+        unique_dates = timeindex.day_index(df_sorted)["Date"]
+    else:
+        unique_dates = df_sorted["Date"].drop_nulls().unique().sort()
     return df_sorted, unique_dates
 
+def _split_days(df: pl.DataFrame) -> List[Tuple[date, pl.DataFrame]]:
+    """日ごとのDataFrameに分けます（ソート済みの場合は索引の位置でスライスするためコピーしない）"""
+    if timeindex.is_sorted(df, "Date"):
+        return [(day, df.slice(offset, length)) for day, offset, length in timeindex.day_index(df).iter_rows()]
+    days = [(day_df["Date"][0], day_df) for day_df in df.drop_nulls("Date").partition_by("Date", maintain_order=False)]
+    days.sort(key=lambda item: item[0])
+    return days
+
 def _setup_axis(ax: plt.Axes, title: str, xlabel: str = "Hour", ylabel: str = "Occupancy") -> None:
     """軸のフォーマット（整数メモリ、グリッドなど）を設定するヘルパー関数"""
+    from matplotlib.ticker import MaxNLocator
+
     ax.set_title(title, fontsize=12, fontweight="bold", color=COLORS["text_main"], pad=12)
     ax.set_xlabel(xlabel, fontsize=10, color=COLORS["text_sub"], weight="bold")
     
@@ -83,50 +179,143 @@ def _setup_axis(ax: plt.Axes, title: str, xlabel: str = "Hour", ylabel: str = "O
     ax.grid(True, axis='y', linestyle=":", alpha=0.6)
     ax.tick_params(axis='both', colors=COLORS["text_sub"], labelsize=9)
 
-def plot_daily_trends(df: pl.DataFrame, start_date: Optional[Union[str, date]] = None, end_date: Optional[Union[str, date]] = None) -> None:
-    """日ごとの在室人数トレンド（合計）を重ね合わせてプロットします。"""
-    df_sorted, unique_dates = _prepare_data(df, start_date, end_date)
+def _show_or_save(
+    fig: plt.Figure,
+    save_path: Optional[Union[str, Path]],
+    cache: Optional[FigureCache] = None,
+    cache_key: Optional[str] = None,
+) -> None:
+    """
+    図を表示、または `save_path` に保存します。
+    保存する場合は拡張子（.png / .svg など）から形式を決め、図を閉じてメモリを解放します。
+    キャッシュキーが渡された場合は保存した画像をキャッシュにも登録します。
+    """
+    import matplotlib.pyplot as plt
+
+    if save_path is None:
+        plt.show()
+        return
+    with profiling.span("savefig", "render", path=str(save_path)) as sp:
+        fig.savefig(save_path)
+        plt.close(fig)
+        if sp.enabled and isinstance(save_path, (str, Path)):
+            sp.set(bytes=Path(save_path).stat().st_size)
+    if cache is not None and cache_key is not None:
+        cache.store(cache_key, save_path)
+
+def _cache_key(
+    cache: Optional[FigureCache],
+    save_path: Optional[Union[str, Path]],
+    chart: str,
+    frames: List[pl.DataFrame],
+    params: dict,
+) -> Optional[str]:
+    """ファイルに保存する場合に限り、図のキャッシュキーを返します（表示のみの場合は None）。"""
+    if cache is None or save_path is None:
+        return None
+    return cache.key(chart, frames, params)
+
+def _padded_day_segments(df_days: pl.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    日ごとの系列を (日数, 最大サンプル数, 2) の配列にまとめます（LineCollection 用）。
+    サンプル数が足りない日は最後の点を繰り返して埋めます（長さ0の線分は描画されない）。
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (segments, is_weekend)
+    """
+    import numpy as np
+
+    per_day = df_days.group_by("Date", maintain_order=True).agg(
+        pl.len().alias("n"), pl.col("IsWeekend").first()
+    )
+    lengths = per_day["n"].cast(pl.Int64).to_numpy()
+    offsets = np.cumsum(lengths) - lengths
+
+    # 各日・各位置が参照する元の行番号（末尾は最後の行で埋める）
+    positions = np.minimum(np.arange(lengths.max())[None, :], (lengths - 1)[:, None])
+    idx = offsets[:, None] + positions
+
+    times = df_days["Time"].to_numpy()
+    totals = df_days["Total"].cast(pl.Float64).to_numpy()
+    segments = np.stack([times[idx], totals[idx]], axis=-1)
+    return segments, per_day["IsWeekend"].to_numpy()
+
+@_plot_function
+def plot_daily_trends(
+    df: Union[pl.DataFrame, pl.LazyFrame],
+    start_date: Optional[Union[str, date]] = None,
+    end_date: Optional[Union[str, date]] = None,
+    density_threshold_days: Optional[int] = 120,
+    save_path: Optional[Union[str, Path]] = None,
+    cache: Optional[FigureCache] = None,
+    campus: Optional[str] = None,
+) -> None:
+    """
+    日ごとの在室人数トレンド（合計）を重ね合わせてプロットします。
+
+    個別の日の線はまとめて1つの LineCollection として描画します。
+    日数が `density_threshold_days` を超える場合は、線の代わりに
+    時刻×人数の2次元ヒストグラム（密度）で表示し、描画時間が履歴の長さに依存しないようにします。
+
+    Args:
+        df: 在室状況ログ（LazyFrame の場合は指定期間だけを読み込む）
+        start_date: 開始日
+        end_date: 終了日
+        density_threshold_days: 密度表示に切り替える日数。None の場合は常に線で描画
+        save_path: 指定した場合は表示せずにこのパスへ保存する
+        cache: 図のキャッシュ（`save_path` 指定時のみ有効）。入力と設定が同じなら描画せずに再利用する
+        campus: 描画するキャンパス（`load_campuses()` の結果を渡す場合）
+    """
+    import matplotlib.pyplot as plt
+    import numpy as np
+    import seaborn as sns
+    from matplotlib.collections import LineCollection
+    from matplotlib.colors import LinearSegmentedColormap
+    from matplotlib.lines import Line2D
+
+    df_sorted, unique_dates = _prepare_data(df, start_date, end_date, campus)
     
     if len(unique_dates) == 0:
         print("プロットするデータがありません。")
         return
 
-    plt.figure(figsize=(10, 6), dpi=120)
+    cache_key = _cache_key(cache, save_path, "daily_trends", [df_sorted], {"density_threshold_days": density_threshold_days})
+    if cache_key is not None and cache.restore(cache_key, save_path):
+        return
+
+    df_days, df_profile = compute_daily_trend_profile(df_sorted)
+
+    fig = plt.figure(figsize=(10, 6), dpi=120)
     ax = plt.gca()
     
     c_weekday = COLORS["blue"] 
     c_weekend = COLORS["status_high"]
     
-    weekday_totals = {} 
-    weekend_totals = {}
-    
-    for d in unique_dates:
-        day_df = df_sorted.filter(pl.col("Date") == d)
-        
-        hours = day_df["Timestamp"].dt.hour()
-        minutes = day_df["Timestamp"].dt.minute()
-        decimal_time = hours + minutes / 60.0
-        # 15分刻みに丸める（集計用）
-        normalized_time = np.round(decimal_time * 4) / 4 
-        values = day_df["Total"]
-        
-        is_weekend = d.weekday() >= 5
-        color = c_weekend if is_weekend else c_weekday
-        
-        # 個別の日を非常に薄くプロット
-        sns.lineplot(x=decimal_time, y=values, linewidth=0.8, color=color, alpha=0.1, ax=ax, legend=False)
-        
-        target_dict = weekend_totals if is_weekend else weekday_totals
-        for t, v in zip(normalized_time, values):
-            t_key = float(t)
-            if t_key not in target_dict: target_dict[t_key] = []
-            target_dict[t_key].append(v)
+    use_density = density_threshold_days is not None and len(unique_dates) > density_threshold_days
+
+    if use_density:
+        # 時刻（15分刻み）× 人数 の2次元ヒストグラム
+        time_edges = np.arange(6, 23.25, 0.25)
+        max_total = int(df_days["Total"].max() or 0)
+        total_edges = np.arange(0, max_total + 2) - 0.5
+        counts, _, _ = np.histogram2d(
+            df_days["Time"].to_numpy(), df_days["Total"].to_numpy(), bins=[time_edges, total_edges]
+        )
+        density_cmap = LinearSegmentedColormap.from_list("seras_density", ["#ffffff", COLORS["text_sub"]], N=100)
+        ax.pcolormesh(time_edges, total_edges, np.ma.masked_equal(counts.T, 0), cmap=density_cmap, shading="flat", zorder=0)
+    else:
+        # 個別の日を非常に薄くプロット（全日を1つのアーティストで描画）
+        segments, is_weekend = _padded_day_segments(df_days)
+        colors = np.where(is_weekend, c_weekend, c_weekday)
+        ax.add_collection(LineCollection(segments, colors=colors, linewidths=0.8, alpha=0.1))
+        ax.autoscale_view()
 
     # 平均線をプロット
-    for label, data_dict, color in [("Weekday Mean", weekday_totals, c_weekday), ("Weekend Mean", weekend_totals, c_weekend)]:
-        if not data_dict: continue
-        sorted_times = sorted(data_dict.keys())
-        means = [np.mean(data_dict[t]) for t in sorted_times]
+    for label, is_weekend, color in [("Weekday Mean", False, c_weekday), ("Weekend Mean", True, c_weekend)]:
+        curve = df_profile.filter(pl.col("IsWeekend") == is_weekend)
+        if curve.is_empty(): continue
+        sorted_times = curve["Slot"].to_numpy()
+        means = curve["MeanTotal"].to_numpy()
         
         # 光彩効果（太い薄い線）
         ax.plot(sorted_times, means, color=color, linewidth=4, alpha=0.2) 
@@ -141,15 +330,156 @@ def plot_daily_trends(df: pl.DataFrame, start_date: Optional[Union[str, date]] =
     legend_elements = [
         Line2D([0], [0], color=c_weekday, lw=2, label='平日 (平均)'),
         Line2D([0], [0], color=c_weekend, lw=2, label='土日 (平均)'),
+        Line2D([0], [0], color=COLORS["text_sub"], lw=4, alpha=0.6, label='分布（サンプル数）')
+        if use_density else
         Line2D([0], [0], color=c_weekday, lw=0.8, alpha=0.4, label='個別の日')
     ]
     ax.legend(handles=legend_elements, loc='upper left', frameon=False, fontsize=9, labelcolor=COLORS["text_main"])
     sns.despine(left=True)
-    plt.show()
+    _show_or_save(fig, save_path, cache, cache_key)
+
+# 日次内訳の1パネルあたりのサイズ（インチ）と解像度
+_PANEL_SIZE = (4, 3)
+_PANEL_DPI = 110
+# パネル単位でキャッシュできる（画像を並べて合成できる）形式
+_RASTER_SUFFIXES = {".png", ".jpg", ".jpeg"}
+
+def _panel_arrays(day_df: pl.DataFrame) -> Tuple[np.ndarray, ...]:
+    """
+    日次内訳の1パネル分の (時刻（時の小数）, 1号館, 2号館, 合計) を1回の select で求めます。
+    人数の列は null がなければコピーせずに NumPy 配列として渡します。
+    """
+    ts = pl.col("Timestamp")
+    arrays = day_df.select(
+        (ts.dt.hour() + ts.dt.minute() / 60.0).alias("DecimalTime"),
+        "Building1",
+        "Building2",
+        # 省メモリの型（UInt16）どうしの和が桁あふれしないよう広げてから足す
+        (pl.col("Building1").cast(pl.Int64) + pl.col("Building2")).alias("Total"),
+    )
+    return tuple(arrays[name].to_numpy() for name in arrays.columns)
 
-def plot_daily_breakdown(df: pl.DataFrame, start_date: Optional[Union[str, date]] = None, end_date: Optional[Union[str, date]] = None) -> None:
-    """日ごとの詳細（積み上げ面グラフ）をスモールマルチプルでプロットします。"""
-    df_sorted, unique_dates = _prepare_data(df, start_date, end_date)
+def _draw_day_data(ax: plt.Axes, day_df: pl.DataFrame) -> None:
+    """日次内訳の1日分のデータ（積み上げ面グラフと合計線）だけを描画します。"""
+    decimal_time, b1, b2, total = _panel_arrays(day_df)
+    
+    ax.stackplot(decimal_time, b1, b2, 
+                 colors=[COLORS["brand"], COLORS["status_low"]], alpha=0.85, linewidth=0)
+    
+    # 合計線（薄く）
+    ax.plot(decimal_time, total, color=COLORS["text_sub"], linewidth=0.8, alpha=0.5)
+
+def _decorate_day_panel(ax: plt.Axes, day_df: pl.DataFrame, d: date, ylabel: str, show_legend: bool) -> None:
+    """日次内訳の1パネルの軸・タイトル・凡例を設定します（データは描画しない）。"""
+    from matplotlib.patches import Patch
+
+    day_name = day_df["Day"][0] if "Day" in day_df.columns else ""
+    _setup_axis(ax, title=f"{d} ({day_name})", ylabel=ylabel)
+    
+    ax.set_xlim(6, 23)
+    ax.set_xticks(range(6, 24, 6))
+
+    if show_legend:
+        handles = [
+            Patch(color=COLORS["brand"], alpha=0.85, label="1号館"),
+            Patch(color=COLORS["status_low"], alpha=0.85, label="2号館"),
+        ]
+        ax.legend(handles=handles, loc='upper right', fontsize=8, frameon=False, labelcolor=COLORS["text_main"])
+
+def _day_ylim(day_df: pl.DataFrame) -> Tuple[float, float]:
+    """1日分のデータの Y 範囲（合計人数の最大値に上下5%の余白）"""
+    ymax = day_df.select((pl.col("Building1").cast(pl.Int64) + pl.col("Building2")).max()).item()
+    ymax = max(float(ymax or 0), 1.0)
+    return (-0.05 * ymax, 1.05 * ymax)
+
+def _cached_day_layer(cache: FigureCache, d: date, day_df: pl.DataFrame) -> Path:
+    """
+    1日分のデータ部分だけを描いた透過PNG（X: 6〜23時、Y: `_day_ylim`）をキャッシュから返します。
+    なければ描画して保存します。軸・タイトル・凡例や期間全体の Y 範囲は含めないため、
+    キーはその日のデータだけで決まり、表示期間をずらしても過去の日は描き直しません。
+    """
+    import matplotlib.pyplot as plt
+
+    key = cache.key("daily_breakdown_panel", [day_df], {"date": d})
+    layer_path = cache.lookup(key, ".png")
+    if layer_path is not None:
+        return layer_path
+
+    layer_fig = plt.figure(figsize=_PANEL_SIZE, dpi=_PANEL_DPI)
+    layer_ax = layer_fig.add_axes((0, 0, 1, 1))
+    _draw_day_data(layer_ax, day_df)
+    layer_ax.set_xlim(6, 23)
+    layer_ax.set_ylim(*_day_ylim(day_df))
+    layer_ax.axis('off')
+    layer_path = cache.path_for(key, ".png")
+    layer_path.parent.mkdir(parents=True, exist_ok=True)
+    layer_fig.savefig(layer_path, transparent=True)
+    plt.close(layer_fig)
+    cache.store(key, layer_path)
+    return layer_path
+
+def _compose_cached_panels(
+    days: List[Tuple[date, pl.DataFrame]],
+    n_rows: int,
+    n_cols: int,
+    cache: FigureCache,
+    ymax: float,
+) -> plt.Figure:
+    """
+    日ごとのデータ部分をキャッシュから取り出して（なければ描画して保存し）1枚の図に並べます。
+    過去の日の画像は内容が変わらないため、通常は最新日だけが描画されます。
+    共通の Y 範囲・左端列の Y 軸ラベル・凡例は、合成するときに軸へ設定します。
+    """
+    import matplotlib.pyplot as plt
+    import numpy as np
+    import seaborn as sns
+
+    # 全パネルでY軸を揃える（sharey=True と同じ見た目）
+    ymax = max(ymax, 1.0)
+    ylim = (-0.05 * ymax, 1.05 * ymax)
+
+    fig, axes = plt.subplots(n_rows, n_cols, figsize=(n_cols * _PANEL_SIZE[0], n_rows * _PANEL_SIZE[1]), sharey=True, dpi=_PANEL_DPI)
+    axes = np.atleast_1d(axes).flatten()
+    for i, (d, day_df) in enumerate(days):
+        ax = axes[i]
+        # 画像はその日の Y 範囲で描いてあるため、同じ範囲に配置すれば共通の Y 軸上で正しい位置になる
+        ax.imshow(plt.imread(_cached_day_layer(cache, d, day_df)),
+                  extent=(6, 23, *_day_ylim(day_df)), aspect='auto', interpolation='antialiased')
+        _decorate_day_panel(ax, day_df, d, "在室人数" if i % n_cols == 0 else "", show_legend=(i == 0))
+        ax.set_ylim(*ylim)
+
+    for j in range(len(days), len(axes)):
+        axes[j].axis('off')
+
+    sns.despine(left=True)
+    fig.tight_layout()
+    return fig
+
+@_plot_function
+def plot_daily_breakdown(
+    df: Union[pl.DataFrame, pl.LazyFrame],
+    start_date: Optional[Union[str, date]] = None,
+    end_date: Optional[Union[str, date]] = None,
+    save_path: Optional[Union[str, Path]] = None,
+    cache: Optional[FigureCache] = None,
+    campus: Optional[str] = None,
+) -> None:
+    """
+    日ごとの詳細（積み上げ面グラフ）をスモールマルチプルでプロットします。
+
+    Args:
+        df: 在室状況ログ（LazyFrame の場合は指定期間だけを読み込む）
+        start_date: 開始日
+        end_date: 終了日
+        save_path: 指定した場合は表示せずにこのパスへ保存する
+        cache: 図のキャッシュ（`save_path` 指定時のみ有効）。
+            PNG/JPEG の場合は日ごとのパネル単位でキャッシュし、変わった日のパネルだけを描画する
+        campus: 描画するキャンパス（`load_campuses()` の結果を渡す場合）
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    df_sorted, unique_dates = _prepare_data(df, start_date, end_date, campus)
     
     if len(unique_dates) == 0:
         print("プロットするデータがありません。")
@@ -158,143 +488,180 @@ def plot_daily_breakdown(df: pl.DataFrame, start_date: Optional[Union[str, date]
     n_cols = 3
     n_rows = math.ceil(len(unique_dates) / n_cols)
     if n_rows == 0: n_rows = 1
+
+    days = _split_days(df_sorted)
+
+    if cache is not None and save_path is not None and Path(save_path).suffix.lower() in _RASTER_SUFFIXES:
+        ymax = df_sorted.select((pl.col("Building1").cast(pl.Int64) + pl.col("Building2")).max()).item()
+        fig = _compose_cached_panels(days, n_rows, n_cols, cache, float(ymax or 0))
+        _show_or_save(fig, save_path)
+        return
+
+    cache_key = _cache_key(cache, save_path, "daily_breakdown", [df_sorted], {})
+    if cache_key is not None and cache.restore(cache_key, save_path):
+        return
     
-    c_b1 = COLORS["brand"] # Building 1
-    c_b2 = COLORS["status_low"]      # Building 2
-    
-    fig, axes = plt.subplots(n_rows, n_cols, figsize=(n_cols * 4, n_rows * 3), sharey=True, dpi=110)
+    fig, axes = plt.subplots(n_rows, n_cols, figsize=(n_cols * _PANEL_SIZE[0], n_rows * _PANEL_SIZE[1]), sharey=True, dpi=_PANEL_DPI)
     if n_rows * n_cols > 1:
         axes = axes.flatten()
     else:
         axes = [axes]
 
-    for i, d in enumerate(unique_dates):
-        ax = axes[i]
-        day_df = df_sorted.filter(pl.col("Date") == d)
-        
-        hours = day_df["Timestamp"].dt.hour()
-        minutes = day_df["Timestamp"].dt.minute()
-        decimal_time = hours + minutes / 60.0
-        
-        b1 = day_df["Building1"].to_numpy()
-        b2 = day_df["Building2"].to_numpy()
-        
-        ax.stackplot(decimal_time, b1, b2, labels=["1号館", "2号館"], 
-                     colors=[c_b1, c_b2], alpha=0.85, linewidth=0)
-        
-        # 合計線（薄く）
-        total = b1 + b2
-        ax.plot(decimal_time, total, color=COLORS["text_sub"], linewidth=0.8, alpha=0.5)
-
-        day_name = day_df["Day"][0] if "Day" in day_df.columns else ""
+    for i, (d, day_df) in enumerate(days):
         ylabel = "在室人数" if i % n_cols == 0 else ""
-        _setup_axis(ax, title=f"{d} ({day_name})", ylabel=ylabel)
-        
-        ax.set_xlim(6, 23)
-        ax.set_xticks(range(6, 24, 6))
-
-        if i == 0:
-            ax.legend(loc='upper right', fontsize=8, frameon=False, labelcolor=COLORS["text_main"])
+        _draw_day_data(axes[i], day_df)
+        _decorate_day_panel(axes[i], day_df, d, ylabel, show_legend=(i == 0))
 
     for j in range(i + 1, len(axes)):
         axes[j].axis('off')
 
     sns.despine(left=True)
     plt.tight_layout()
-    plt.show()
+    _show_or_save(fig, save_path, cache, cache_key)
+
+# ISO の曜日番号（1=月）→ 表示ラベル
+_WEEKDAY_LABELS = {1: "月", 2: "火", 3: "水", 4: "木", 5: "金", 6: "土", 7: "日"}
+
+# ヒートマップの統計量ごとのタイトル・凡例ラベル
+_HEATMAP_LABELS = {
+    "mean": ("平均混雑度", "平均人数"),
+    "max": ("ピーク人数", "最大人数"),
+    "min": ("最小人数", "最小人数"),
+    "std": ("混雑度のばらつき", "標準偏差"),
+    "var": ("混雑度のばらつき", "分散"),
+    "count": ("サンプル数", "件数"),
+}
+_BUILDING_LABELS = {"Building1": "1号館", "Building2": "2号館", "Total": ""}
 
-def plot_average_occupancy_heatmap(df: pl.DataFrame, start_date: Optional[Union[str, date]] = None, end_date: Optional[Union[str, date]] = None) -> None:
+@_plot_function
+def plot_average_occupancy_heatmap(
+    df: Optional[Union[pl.DataFrame, pl.LazyFrame]],
+    start_date: Optional[Union[str, date]] = None,
+    end_date: Optional[Union[str, date]] = None,
+    stat: str = "mean",
+    building: str = "Total",
+    cube: Optional[pl.DataFrame] = None,
+    save_path: Optional[Union[str, Path]] = None,
+    cache: Optional[FigureCache] = None,
+    campus: Optional[str] = None,
+) -> None:
     """
     曜日×時間の平均在室ヒートマップをプロットします。
     「いつ混んでいるか？」を直感的に可視化します。
+
+    集計は (曜日, 時間, 建物) キューブから読み出します。`cube.refresh_occupancy_cube` で
+    保存・差分更新したキューブを `cube` に渡すと、生ログを走査せずに描画できます。
+
+    Args:
+        df: 在室状況ログ（`cube` を渡す場合は None でも可）。
+            `history.scan_history()` の LazyFrame を渡すと、全期間を読み込まずにストリーミングで集計する
+        start_date: 開始日（`cube` を渡した場合は無視）
+        end_date: 終了日（`cube` を渡した場合は無視）
+        stat: 表示する統計量（mean, max, min, std, var, count）
+        building: 建物（Building1, Building2, Total）
+        cube: 集計済みキューブ
+        save_path: 指定した場合は表示せずにこのパスへ保存する
+        cache: 図のキャッシュ（`save_path` 指定時のみ有効）
+        campus: 描画するキャンパス。Campus 付きのデータ・キューブ（`load_campuses()`）では
+            全キャンパスを1回で集計したキューブから取り出す。None の場合は全キャンパスの合算
     """
-    df_sorted, _ = _prepare_data(df, start_date, end_date)
-    
-    # Hour/Weekdayカラムがない場合の補完
-    if "Hour" not in df_sorted.columns:
-        df_sorted = df_sorted.with_columns(pl.col("Timestamp").dt.hour().alias("Hour"))
-    if "Weekday" not in df_sorted.columns:
-        df_sorted = df_sorted.with_columns(pl.col("Timestamp").dt.weekday().alias("Weekday")) # 1=Mon
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.colors import LinearSegmentedColormap
+
+    if cube is None:
+        # 並べ替えは不要なので、期間の絞り込みだけをして集計する（LazyFrame はストリーミング実行）
+        cube = build_occupancy_cube(_filter_dates(df, start_date, end_date))
+
+    cube = campus_cube(cube, campus)
+    cache_key = _cache_key(cache, save_path, "heatmap", [cube], {"stat": stat, "building": building})
+    if cache_key is not None and cache.restore(cache_key, save_path):
+        return
 
-    # 集計: 曜日・時間ごとの平均人数
     # 時間帯フィルタ (例: 7時〜22時)
-    df_agg = (
-        df_sorted
-        .filter((pl.col("Hour") >= 7) & (pl.col("Hour") <= 22))
-        .group_by(["Weekday", "Hour"])
-        .agg(pl.col("Total").mean().alias("AvgOccupancy"))
-        .sort(["Weekday", "Hour"])
-    )
-    
-    weekday_map = {1: "月", 2: "火", 3: "水", 4: "木", 5: "金", 6: "土", 7: "日"}
     hours = list(range(7, 23))
-    matrix = np.zeros((7, len(hours)))
-    
-    for row in df_agg.iter_rows(named=True):
-        w_idx = row["Weekday"] - 1 # 0-6
-        h_idx = row["Hour"] - 7    # 0-15
-        if 0 <= w_idx < 7 and 0 <= h_idx < len(hours):
-            matrix[w_idx, h_idx] = row["AvgOccupancy"]
+    matrix = cube_matrix(cube, stat=stat, building=building, hours=hours)
 
-    plt.figure(figsize=(10, 5), dpi=120)
+    fig = plt.figure(figsize=(10, 5), dpi=120)
     ax = plt.gca()
     
     # ホワイト -> ブランドカラー -> 濃色 のグラデーション
     colors = ["#ffffff", COLORS["brand"], "#d35400"] 
     cmap = LinearSegmentedColormap.from_list("seras_heat", colors, N=100)
     
+    title, cbar_label = _HEATMAP_LABELS.get(stat, (stat, stat))
+    building_label = _BUILDING_LABELS.get(building, building)
+    if building_label:
+        title = f"{title}（{building_label}）"
+
     sns.heatmap(matrix, annot=True, fmt=".1f", cmap=cmap, cbar=True,
-                xticklabels=hours, yticklabels=list(weekday_map.values()),
+                xticklabels=hours, yticklabels=list(_WEEKDAY_LABELS.values()),
                 linewidths=1, linecolor='white', square=True, ax=ax,
-                cbar_kws={'label': '平均人数'})
+                cbar_kws={'label': cbar_label})
     
-    ax.set_title("曜日・時間帯別 平均混雑度", fontsize=13, fontweight="bold", pad=15, color=COLORS["text_main"])
+    ax.set_title(f"曜日・時間帯別 {title}", fontsize=13, fontweight="bold", pad=15, color=COLORS["text_main"])
     ax.set_xlabel("時間", fontsize=10, color=COLORS["text_sub"], weight="bold")
     ax.set_ylabel("曜日", fontsize=10, color=COLORS["text_sub"], weight="bold")
     
-    plt.show()
+    _show_or_save(fig, save_path, cache, cache_key)
 
-def plot_opening_time_stats(df_pairs: pl.DataFrame) -> None:
+@_plot_function
+def plot_opening_time_stats(
+    df_pairs: pl.DataFrame,
+    save_path: Optional[Union[str, Path]] = None,
+    cache: Optional[FigureCache] = None,
+) -> None:
     """
     曜日ごとの開館時間の分布をプロットします。
+
+    Args:
+        df_pairs: `extract_daily_opening_times` の結果
+        save_path: 指定した場合は表示せずにこのパスへ保存する
+        cache: 図のキャッシュ（`save_path` 指定時のみ有効）
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.ticker import FuncFormatter, MaxNLocator
+
     if df_pairs.is_empty():
         print("分析対象の開閉ログがありません。")
         return
 
-    data_list = []
-    weekday_map = {1: "月", 2: "火", 3: "水", 4: "木", 5: "金", 6: "土", 7: "日"}
-    
-    for row in df_pairs.iter_rows(named=True):
-        dt = row["OpenTime"] 
-        weekday = dt.isoweekday() 
-        decimal_hour = dt.hour + dt.minute / 60.0
-        
-        data_list.append({
-            "WeekdayNum": weekday,
-            "Weekday": weekday_map.get(weekday, str(weekday)),
-            "OpenHour": decimal_hour
-        })
-        
-    plot_df = pl.DataFrame(data_list)
-    plot_df = plot_df.sort("WeekdayNum")
+    cache_key = _cache_key(cache, save_path, "opening_times", [df_pairs], {})
+    if cache_key is not None and cache.restore(cache_key, save_path):
+        return
+
+    # 曜日・時刻（時の小数）を列の演算でまとめて求める
+    open_time = pl.col("OpenTime")
+    plot_df = (
+        df_pairs
+        .select(
+            open_time.dt.weekday().alias("WeekdayNum"),
+            (open_time.dt.hour() + open_time.dt.minute() / 60.0).alias("OpenHour"),
+        )
+        .sort("WeekdayNum", maintain_order=True)
+        .with_columns(pl.col("WeekdayNum").replace_strict(_WEEKDAY_LABELS, return_dtype=pl.Utf8).alias("Weekday"))
+    )
+    order = plot_df["Weekday"].unique(maintain_order=True).to_list()
+    # seaborn は long-form のデータを pandas で扱うため、変換は図ごとに1回だけにして両方のプロットで共有する
+    data = plot_df.select("Weekday", "OpenHour").to_pandas()
     
-    plt.figure(figsize=(8, 5), dpi=120)
+    fig = plt.figure(figsize=(8, 5), dpi=120)
     ax = plt.gca()
     
     # 1. Strip plot (散布図)
     sns.stripplot(
-        data=plot_df.to_pandas(), 
-        x="Weekday", y="OpenHour", 
-        hue="Weekday", palette="husl", legend=False,
+        data=data, 
+        x="Weekday", y="OpenHour", order=order,
+        hue="Weekday", hue_order=order, palette="husl", legend=False,
         size=8, jitter=0.15, alpha=0.7, ax=ax, zorder=3,
         edgecolor='white', linewidth=1
     )
     
     # 2. Box plot (箱ひげ図)
     sns.boxplot(
-        data=plot_df.to_pandas(),
-        x="Weekday", y="OpenHour",
+        data=data,
+        x="Weekday", y="OpenHour", order=order,
         boxprops=dict(facecolor='#f7f7f7', edgecolor=COLORS["text_sub"], alpha=0.5),
         whiskerprops=dict(color=COLORS["text_sub"]),
         capprops=dict(color=COLORS["text_sub"]),
@@ -321,4 +688,4 @@ def plot_opening_time_stats(df_pairs: pl.DataFrame) -> None:
     plt.figtext(0.5, 0.01, "点は個々の日付を表します。箱は典型的な範囲を示します。", 
                 ha="center", fontsize=8, color=COLORS["text_sub"])
     
-    plt.show()
+    _show_or_save(fig, save_path, cache, cache_key)
@@ -1,141 +1,344 @@
 import polars as pl
-from datetime import date, timedelta
-from typing import Optional
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Sequence, Tuple, Union
+from . import config, profiling, snapshot, timeindex
+from .schema import CAMPUS_COLUMN
 
+@profiling.profiled("filter")
 def filter_occupancy_data(
-    df: pl.DataFrame,
+    df: Union[pl.DataFrame, pl.LazyFrame],
     start_date: date,
     end_date: Optional[date] = None,
     exclude_today: bool = True,
-) -> pl.DataFrame:
+) -> Union[pl.DataFrame, pl.LazyFrame]:
     """
     在室状況データを開始日・終了日に基づいてフィルタリングし、オプションで当日（最新日）を除外します。
 
+    `load_data()` のDataFrameのように 'Date' がソート済み（`timeindex.mark_sorted`）の場合は、
+    二分探索で求めた行範囲のスライス（コピーなし）で絞り込み、最新日も末尾の行から求めます。
+    ソート済みでない場合は各行を比較する `filter` で絞り込みます（結果は同じ）。
+
+    LazyFrame（`history.scan_history()` など）を渡した場合は LazyFrame を返します。
+    最新日の判定だけはストリーミングエンジンで実行し、行全体はメモリに読み込みません。
+
     Args:
-        df: 'Date'カラムを含むPolars DataFrame
+        df: 'Date'カラムを含むPolars DataFrame または LazyFrame
         start_date: フィルタリングの開始日（この日を含む）
         end_date: フィルタリングの終了日（この日を含む）。Noneの場合は全日付を含む
         exclude_today: データセット内の最新日（当日と仮定）を除外するかどうか
 
     Returns:
-        フィルタリングされたPolars DataFrame
+        フィルタリングされたPolars DataFrame（入力が LazyFrame の場合は LazyFrame）
     """
-    if df.is_empty():
+    is_lazy = isinstance(df, pl.LazyFrame)
+    if not is_lazy and df.is_empty():
         return df
 
-    # DateカラムをDate型にキャスト
-    df = df.with_columns(pl.col("Date").cast(pl.Date))
+    # DateカラムをDate型にキャスト（既にDate型の場合はソート済みのフラグを保つため何もしない）
+    if df.collect_schema()["Date"] != pl.Date:
+        df = df.with_columns(pl.col("Date").cast(pl.Date))
+        if not is_lazy:
+            df = timeindex.mark_sorted(df)
 
-    # 開始日でフィルタリング
-    df_clean = df.filter(pl.col("Date") >= start_date)
+    # 開始日・終了日で絞り込み
+    df_clean = timeindex.slice_dates(df, start_date, end_date)
 
-    # 終了日でフィルタリング
-    if end_date is not None:
-        df_clean = df_clean.filter(pl.col("Date") <= end_date)
-    
     # 当日/最新日の除外
-    if exclude_today and not df_clean.is_empty():
-        max_date = df_clean["Date"].max()
+    if exclude_today:
+        max_date = timeindex.last_date(df_clean)
         if max_date is not None:
             # データセット内の最大日付を「今日」と仮定して除外する
             # （リアルタイムデータ収集の不完全性を考慮するため）
             print(f"除外対象の日付（最新日）: {max_date}")
-            df_clean = df_clean.filter(pl.col("Date") < max_date)
+            df_clean = timeindex.slice_between(df_clean, "Date", upper=max_date, closed="left")
             
     return df_clean
 
+def _minute_of_day(ts: pl.Expr) -> pl.Expr:
+    """日時から 0:00 からの経過分を求める式"""
+    return ts.dt.hour().cast(pl.Int32) * 60 + ts.dt.minute()
+
+# resample_occupancy で集計する人数カラム
+_RESAMPLE_COLUMNS = ["Building1", "Building2", "Total"]
+# resample_occupancy の欠損補完方法
+RESAMPLE_FILLS = ("forward", "interpolate", "zero", None)
+
+@profiling.profiled("aggregate")
+def resample_occupancy(
+    df: pl.DataFrame,
+    every: str = "15m",
+    fill: Optional[str] = "forward",
+    fill_value: Optional[float] = None,
+    hours: Optional[Tuple[int, int]] = None,
+) -> pl.DataFrame:
+    """
+    不規則な間隔の在室状況ログを、日付×時刻スロットの等間隔グリッドに揃えます。
+
+    各スロット [t, t + every) に入ったサンプルの平均をその値とし、サンプルのないスロットは
+    `fill` で補完します。全ての日付が同じスロット列を持つため、
+    日数×スロット数の行列としてそのまま扱えます。
+
+    Args:
+        df: 'Timestamp', 'Date' と人数カラム（Building1, Building2, Total）を含むDataFrame
+        every: スロットの幅（Polarsの期間表記。例: '15m', '1h'）
+        fill: 欠損スロットの補完方法
+            - 'forward': 同じ日の直前の値を引き継ぐ
+            - 'interpolate': 同じ日の前後の値から線形補間
+            - 'zero': 0 とする
+            - None: 補完しない（null のまま）
+        fill_value: `fill` で補完できなかったスロット（その日の最初のサンプルより前など）に入れる値
+        hours: グリッドにする時間帯 (開始時, 終了時)。終了時は含まない。
+            None の場合はデータ中の最も早いスロットから最も遅いスロットまで
+
+    Returns:
+        pl.DataFrame: [Date, Slot, Building1, Building2, Total] を Date, Slot 順に並べたグリッド
+        （Slot はスロット開始時刻の Time 型、人数は Float64）
+    """
+    if fill not in RESAMPLE_FILLS:
+        raise ValueError(f"未対応の補完方法です: {fill}（{', '.join(map(str, RESAMPLE_FILLS))} のいずれか）")
+
+    value_cols = [c for c in _RESAMPLE_COLUMNS if c in df.columns]
+    schema = {"Date": pl.Date, "Slot": pl.Time, **{c: pl.Float64 for c in value_cols}}
+    df = df.filter(pl.col("Timestamp").is_not_null())
+    if df.is_empty():
+        return pl.DataFrame(schema=schema)
+    time_unit = df.schema["Timestamp"].time_unit
+
+    # スロットごとの平均（スロット開始時刻をキーにする）
+    binned = (
+        df.lazy()
+        .select(pl.col("Timestamp").dt.truncate(every).alias("SlotStart"), *value_cols)
+        .group_by("SlotStart")
+        .agg(pl.col(c).cast(pl.Float64).mean() for c in value_cols)
+    )
+
+    # 全日付共通のスロット列
+    if hours is None:
+        first, last = binned.select(
+            pl.col("SlotStart").dt.time().min().alias("first"),
+            pl.col("SlotStart").dt.time().max().alias("last"),
+        ).collect().row(0)
+    else:
+        first = time(hours[0])
+        last = time(hours[1] - 1, 59, 59, 999999)
+    slots = pl.time_range(first, last, interval=every, eager=True).alias("Slot")
+
+    dates = df.lazy().select(pl.col("Timestamp").dt.date().unique().alias("Date"))
+    grid = (
+        dates
+        .join(pl.LazyFrame(slots), how="cross")
+        # 結合キーの精度を入力の Timestamp に合わせる（load_data の既定ではミリ秒）
+        .with_columns(pl.col("Date").dt.combine(pl.col("Slot"), time_unit=time_unit).alias("SlotStart"))
+        .join(binned, on="SlotStart", how="left")
+        .sort(["Date", "Slot"])
+    )
+
+    if fill == "forward":
+        grid = grid.with_columns(pl.col(c).forward_fill().over("Date") for c in value_cols)
+    elif fill == "interpolate":
+        grid = grid.with_columns(pl.col(c).interpolate().over("Date") for c in value_cols)
+    elif fill == "zero":
+        grid = grid.with_columns(pl.col(c).fill_null(0.0) for c in value_cols)
+    if fill_value is not None:
+        grid = grid.with_columns(pl.col(c).fill_null(fill_value) for c in value_cols)
+
+    return grid.select(list(schema)).collect()
+
+def refresh_resampled_occupancy(
+    df: pl.DataFrame,
+    every: str = "15m",
+    fill: Optional[str] = "forward",
+    fill_value: Optional[float] = None,
+    hours: Tuple[int, int] = (0, 24),
+    spreadsheet_id: Optional[str] = None,
+    rebuild: bool = False,
+) -> pl.DataFrame:
+    """
+    `resample_occupancy` のグリッドを保存し、次回以降は新しい日だけを作り直します。
+
+    補完は日付ごとに閉じているため、保存済みグリッドの最終日以降だけを再計算して
+    それより前の日はそのまま使います。設定（every, fill など）が保存時と異なる場合は作り直します。
+
+    Args:
+        df: 在室状況ログ（`load_data()` の df_occupancy）
+        every: スロットの幅
+        fill: 欠損スロットの補完方法
+        fill_value: 補完できなかったスロットに入れる値
+        hours: グリッドにする時間帯（保存するため固定の範囲を指定する）
+        spreadsheet_id: 保存先を決めるスプレッドシートID（省略時は `config.SPREADSHEET_ID`）
+        rebuild: Trueの場合は保存済みのグリッドを使わずに全件から作り直す
+
+    Returns:
+        pl.DataFrame: 全期間のグリッド
+    """
+    spreadsheet_id = spreadsheet_id or config.SPREADSHEET_ID
+    params = {"every": every, "fill": fill, "fill_value": fill_value, "hours": list(hours)}
+    name = f"occupancy_grid_{every}"
+    if df.is_empty():
+        return resample_occupancy(df, every, fill, fill_value, hours)
+
+    saved = None if rebuild else snapshot.read_derived(spreadsheet_id, name)
+    if saved is not None and saved[1].get("params") == params and not saved[0].is_empty():
+        grid, _ = saved
+        # 最終日は途中までのデータで作られている可能性があるため作り直す
+        last_date = grid["Date"].max()
+        df_new = timeindex.slice_between(df, "Timestamp", lower=datetime.combine(last_date, time()))
+        grid = pl.concat([
+            grid.filter(pl.col("Date") < last_date),
+            resample_occupancy(df_new, every, fill, fill_value, hours),
+        ])
+    else:
+        grid = resample_occupancy(df, every, fill, fill_value, hours)
+
+    snapshot.write_derived(spreadsheet_id, name, grid, {"params": params})
+    return grid
+
+def quantile_column(q: float) -> str:
+    """分位点のカラム名（例: 0.1 → 'P10'、0.25 → 'P25'）"""
+    return f"P{round(q * 100):d}"
+
+@profiling.profiled("aggregate")
+def compute_daily_trend_profile(
+    df: Union[pl.DataFrame, pl.LazyFrame],
+    every_minutes: int = 15,
+    quantiles: Sequence[float] = (),
+) -> Tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    日次トレンド（日ごとの推移と、平日・土日別の平均カーブ）を集計します。
+
+    時刻を `every_minutes` 分刻みに丸めたスロット列を作り、1回のクエリで
+    日ごとの系列とスロット別平均をまとめて求めます（日付ごとのフィルタリングは行いません）。
+    クエリはストリーミングエンジンで実行します。
+    Campus カラムがある場合（`data_loader.load_campuses()`）は、全キャンパスを同じクエリで
+    キャンパスごとに集計し、どちらの結果にも先頭に Campus を付けます。
+
+    Args:
+        df: 'Timestamp', 'Date', 'Total' カラムを含むDataFrame または LazyFrame（期間の絞り込みは呼び出し側で行う）
+        every_minutes: 平均を取るスロットの幅（分）
+        quantiles: 平均カーブと一緒に求めるスロットごとの分位点（例: (0.1, 0.9)。線形補間）
+
+    Returns:
+        Tuple[pl.DataFrame, pl.DataFrame]: (df_days, df_profile)
+        - df_days: 日ごとの系列 [Date, IsWeekend, Time, Total]（Time は小数の時刻。例: 13.5 = 13:30）
+        - df_profile: 平均カーブ [IsWeekend, Slot, MeanTotal, P10, ...]（Slot は丸めた小数の時刻。
+          P<百分位> は `quantiles` を指定した場合のみ）
+    """
+    schema = df.collect_schema()
+    campus = [CAMPUS_COLUMN] if CAMPUS_COLUMN in schema else []
+    if isinstance(df, pl.DataFrame) and df.is_empty():
+        campus_schema = {c: schema[c] for c in campus}
+        return (
+            pl.DataFrame(schema={**campus_schema, "Date": pl.Date, "IsWeekend": pl.Boolean, "Time": pl.Float64, "Total": pl.Int64}),
+            pl.DataFrame(schema={
+                **campus_schema, "IsWeekend": pl.Boolean, "Slot": pl.Float64, "MeanTotal": pl.Float64,
+                **{quantile_column(q): pl.Float64 for q in quantiles},
+            }),
+        )
+
+    minutes = _minute_of_day(pl.col("Timestamp"))
+
+    base = (
+        df.lazy()
+        .select(
+            *campus,
+            pl.col("Date"),
+            (pl.col("Date").dt.weekday() >= 6).alias("IsWeekend"),
+            (minutes / 60.0).alias("Time"),
+            # スロットに丸める（例: 15分刻み → 13:07 は 13:00、13:08 は 13:15）
+            ((minutes / every_minutes).round() * every_minutes / 60.0).alias("Slot"),
+            pl.col("Total"),
+            pl.col("Timestamp"),
+        )
+    )
+
+    # ソート済みのフラグがあれば並べ替えは省く（キャンパスごとに並べる場合は安定ソート）
+    if campus:
+        days_lf = base.sort([*campus, "Timestamp"], maintain_order=True)
+    else:
+        days_lf = base if timeindex.is_sorted(df) else base.sort("Timestamp")
+    days_lf = days_lf.select(*campus, "Date", "IsWeekend", "Time", "Total")
+    profile_lf = (
+        base
+        .group_by([*campus, "IsWeekend", "Slot"])
+        .agg(
+            pl.col("Total").mean().alias("MeanTotal"),
+            *[pl.col("Total").quantile(q, interpolation="linear").alias(quantile_column(q)) for q in quantiles],
+        )
+        .sort([*campus, "IsWeekend", "Slot"])
+    )
+
+    df_days, df_profile = pl.collect_all([days_lf, profile_lf], engine="streaming")
+    return df_days, df_profile
+
+# extract_daily_opening_times の出力スキーマ
+_OPENING_TIMES_SCHEMA = {
+    "Date": pl.Date, "Building": pl.Utf8,
+    "OpenTime": pl.Datetime, "CloseTime": pl.Datetime,
+    "DurationHours": pl.Float64,
+    "Opener": pl.Utf8, "Closer": pl.Utf8
+}
+
+@profiling.profiled("aggregate")
 def extract_daily_opening_times(df: pl.DataFrame) -> pl.DataFrame:
     """
     各建物の有効な開館時間を抽出します。
     
     ロジック:
-    1. タイムスタンプでソート
-    2. イベントを走査して有効な OPEN -> CLOSE のペアを見つける
-    3. 二重押下（OPEN-OPEN, CLOSE-CLOSE）を処理
+    1. 建物・タイムスタンプでソート
+    2. 直前のイベントと同じ操作（OPEN-OPEN, CLOSE-CLOSE の二重押下）と、
+       OPENより前のCLOSEは状態を変えないので除外する
+    3. 残ったイベントは OPEN, CLOSE が交互に並ぶため、各 OPEN を直後の CLOSE と組にする
     4. 期間（Duration）を計算
     5. 1時間未満のデータを誤操作として除外
     
+    行ごとのループを使わず、全建物をまとめて式だけで処理します。
+    Campus カラムがある場合は (キャンパス, 建物) ごとに組にします。
+    
     Returns:
         以下のカラムを持つDataFrame: [Date, Building, OpenTime, CloseTime, DurationHours, Opener, Closer]
+        （Campus がある場合は先頭に Campus）
     """
+    campus = [CAMPUS_COLUMN] if CAMPUS_COLUMN in df.columns else []
     if df.is_empty():
-        return pl.DataFrame(schema={
-            "Date": pl.Date, "Building": pl.Utf8, 
-            "OpenTime": pl.Datetime, "CloseTime": pl.Datetime, 
-            "DurationHours": pl.Float64,
-            "Opener": pl.Utf8, "Closer": pl.Utf8
-        })
-
-    # ソート
-    df = df.sort(["Building", "Timestamp"])
-    
-    results = []
-    
-    # 建物ごとに処理
-    buildings = df["Building"].unique()
-    
-    for building in buildings:
-        subset = df.filter(pl.col("Building") == building)
-        subset = subset.sort("Timestamp")
-        
-        # 状態追跡
-        current_open = None # (timestamp, actor, date)
-        
-        # 行をイテレート
-        rows = subset.select(["Timestamp", "Date", "Action", "Actor Name"]).iter_rows(named=True)
-        
-        for row in rows:
-            action = row["Action"].upper()
-            ts = row["Timestamp"]
-            actor = row["Actor Name"]
-            Date = row["Date"]
-            
-            if action == "OPEN":
-                if current_open is None:
-                    # 新しいセッション開始
-                    current_open = (ts, actor, Date)
-                else:
-                    # 既にOPEN状態でOPEN -> 無視（二重押下？）
-                    pass
-            elif action == "CLOSE":
-                if current_open is not None:
-                    # 有効なペア検出
-                    open_ts, open_actor, open_date = current_open
-                    close_ts = ts
-                    close_actor = actor
-                    
-                    # 期間計算
-                    duration_seconds = (close_ts - open_ts).total_seconds()
-                    duration_hours = duration_seconds / 3600.0
-                    
-                    # 候補として追加
-                    results.append({
-                        "Date": open_date,
-                        "Building": building,
-                        "OpenTime": open_ts,
-                        "CloseTime": close_ts,
-                        "DurationHours": duration_hours,
-                        "Opener": open_actor,
-                        "Closer": close_actor
-                    })
-                    
-                    # 状態リセット
-                    current_open = None
-                else:
-                    # OPENなしでCLOSE -> 無視
-                    pass
-        
-    if not results:
-         return pl.DataFrame(schema={
-            "Date": pl.Date, "Building": pl.Utf8, 
-            "OpenTime": pl.Datetime, "CloseTime": pl.Datetime, 
-            "DurationHours": pl.Float64,
-            "Opener": pl.Utf8, "Closer": pl.Utf8
-        })
-
-    df_results = pl.DataFrame(results)
-    
-    # 1時間未満のデータを除外（誤操作とみなす）
-    df_clean = df_results.filter(pl.col("DurationHours") >= 1.0)
-    
+        return pl.DataFrame(schema={**{c: df.schema[c] for c in campus}, **_OPENING_TIMES_SCHEMA})
+    keys = [*campus, "Building"]
+
+    # load_data の既定（compact）では Enum / Categorical のため、文字列に戻してから正規化する
+    action = pl.col("Action").cast(pl.Utf8).str.to_uppercase()
+
+    df_clean = (
+        df.lazy()
+        .filter(
+            pl.col("Building").is_not_null()
+            & pl.col("Timestamp").is_not_null()
+            & action.is_in(["OPEN", "CLOSE"])
+        )
+        .with_columns(action.alias("Action"))
+        .sort([*keys, "Timestamp"], maintain_order=True)
+        # 状態が変わるイベントだけを残す（初期状態は閉館 = 直前を CLOSE とみなす）
+        .filter(
+            pl.col("Action") != pl.col("Action").shift(1, fill_value="CLOSE").over(keys)
+        )
+        # 各 OPEN の直後のイベントが対応する CLOSE
+        .with_columns(
+            pl.col("Timestamp").shift(-1).over(keys).alias("CloseTime"),
+            pl.col("Actor Name").shift(-1).over(keys).alias("Closer"),
+        )
+        .filter((pl.col("Action") == "OPEN") & pl.col("CloseTime").is_not_null())
+        .select(
+            *campus,
+            pl.col("Date"),
+            pl.col("Building"),
+            pl.col("Timestamp").alias("OpenTime"),
+            pl.col("CloseTime"),
+            ((pl.col("CloseTime") - pl.col("Timestamp")).dt.total_microseconds() / 3_600_000_000)
+            .alias("DurationHours"),
+            pl.col("Actor Name").alias("Opener"),
+            pl.col("Closer"),
+        )
+        # 1時間未満のデータを除外（誤操作とみなす）
+        .filter(pl.col("DurationHours") >= 1.0)
+        .collect()
+    )
+
     return df_clean
@@ -0,0 +1,274 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, ClassVar, Iterator, Optional, Union
+import polars as pl
+
+# 計測の有効・無効（None の場合は最初の計測時に環境変数 SERAS_PROFILE から決める）
+_enabled: Optional[bool] = None
+_records: list["Span"] = []
+_lock = threading.Lock()
+# 診断メッセージの出力先（None の場合は print）
+_log_handler: Optional[Callable[[str, str], None]] = None
+
+
+@dataclass
+class Span:
+    """
+    1つの処理区間の計測結果。
+
+    Attributes:
+        name: 区間名（例: 'load_sheets', 'parse:occupancy_logs'）
+        stage: 処理の段階（fetch, parse, io, filter, aggregate, render など）。
+            診断メッセージの場合は 'log'
+        start: 開始時刻（`time.perf_counter()` の秒。Linux ではプロセス間で共通）
+        duration: 所要時間（秒）。診断メッセージは 0
+        rows: 処理した行数（出力側）
+        bytes: 処理したデータ量の目安（バイト）
+        attrs: その他の属性（入力行数、メッセージなど）
+        pid: プロセスID
+        tid: スレッドID
+    """
+    name: str
+    stage: str
+    start: float
+    duration: float = 0.0
+    rows: Optional[int] = None
+    bytes: Optional[int] = None
+    attrs: dict[str, Any] = field(default_factory=dict)
+    pid: int = field(default_factory=os.getpid)
+    tid: int = field(default_factory=threading.get_ident)
+    enabled: ClassVar[bool] = True
+
+    def set(self, rows: Optional[int] = None, bytes: Optional[int] = None, **attrs: Any) -> None:
+        """行数・データ量・属性を記録します。"""
+        if rows is not None:
+            self.rows = rows
+        if bytes is not None:
+            self.bytes = bytes
+        self.attrs.update(attrs)
+
+
+class _NullSpan:
+    """計測が無効なときに返す、何も記録しない区間"""
+    enabled = False
+
+    def set(self, rows: Optional[int] = None, bytes: Optional[int] = None, **attrs: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def is_enabled() -> bool:
+    """計測が有効かどうかを返します。"""
+    global _enabled
+    if _enabled is None:
+        _enabled = os.getenv("SERAS_PROFILE", "") not in ("", "0", "false")
+    return _enabled
+
+
+def enable(on: bool = True) -> None:
+    """
+    計測を有効（または無効）にします。
+
+    既定では無効で、環境変数 `SERAS_PROFILE=1` でも有効にできます。
+    無効の間の `span` はほぼ何もしません。
+    """
+    global _enabled
+    _enabled = on
+
+
+def reset() -> None:
+    """記録した区間を全て消去します。"""
+    with _lock:
+        _records.clear()
+
+
+def records() -> list[Span]:
+    """記録した区間を開始順に返します。"""
+    with _lock:
+        return sorted(_records, key=lambda s: s.start)
+
+
+def add_records(spans: list[Union[Span, dict]]) -> None:
+    """他のプロセス（レポートのワーカーなど）で記録した区間を取り込みます。"""
+    with _lock:
+        _records.extend(s if isinstance(s, Span) else Span(**s) for s in spans)
+
+
+@contextlib.contextmanager
+def span(name: str, stage: str, **attrs: Any) -> Iterator[Union[Span, _NullSpan]]:
+    """
+    処理区間の所要時間を計測します。
+
+    使い方:
+        with profiling.span("parse:occupancy_logs", "parse") as sp:
+            df = ...
+            sp.set(rows=df.height, bytes=df.estimated_size())
+
+    データ量の計算自体が重い場合は `sp.enabled` を確認してから計算してください。
+
+    Args:
+        name: 区間名
+        stage: 処理の段階
+        **attrs: 記録する属性
+    """
+    if not is_enabled():
+        yield _NULL_SPAN
+        return
+
+    sp = Span(name=name, stage=stage, start=time.perf_counter(), attrs=dict(attrs))
+    try:
+        yield sp
+    finally:
+        sp.duration = time.perf_counter() - sp.start
+        with _lock:
+            _records.append(sp)
+
+
+def _frame_stats(value: Any) -> tuple[Optional[int], Optional[int]]:
+    """戻り値に含まれる DataFrame の行数とサイズの合計を返します。"""
+    frames = value if isinstance(value, (tuple, list)) else (value,)
+    frames = [f for f in frames if isinstance(f, pl.DataFrame)]
+    if not frames:
+        return None, None
+    return sum(f.height for f in frames), sum(f.estimated_size() for f in frames)
+
+
+def profiled(stage: str, name: Optional[str] = None) -> Callable:
+    """
+    関数全体を1つの区間として計測するデコレーター。
+
+    第1引数が DataFrame の場合は入力行数（rows_in）を、戻り値が DataFrame
+    （またはそのタプル）の場合は出力の行数とサイズを記録します。
+
+    Args:
+        stage: 処理の段階
+        name: 区間名（省略時は関数名）
+    """
+    def decorator(func: Callable) -> Callable:
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return func(*args, **kwargs)
+            with span(label, stage) as sp:
+                if args and isinstance(args[0], pl.DataFrame):
+                    sp.set(rows_in=args[0].height)
+                result = func(*args, **kwargs)
+                rows, size = _frame_stats(result)
+                sp.set(rows=rows, bytes=size)
+                return result
+        return wrapper
+    return decorator
+
+
+def set_log_handler(handler: Optional[Callable[[str, str], None]]) -> None:
+    """
+    診断メッセージの出力先を変更します。
+
+    Args:
+        handler: (メッセージ, レベル) を受け取る関数。None の場合は print に戻す
+    """
+    global _log_handler
+    _log_handler = handler
+
+
+def log(message: str, level: str = "warning") -> None:
+    """
+    診断メッセージ（警告・エラー）を出力します。
+
+    出力先は既定では print で、`set_log_handler` で変更できます。
+    計測が有効な場合はトレースにも記録します（Chrome trace では瞬間イベントとして表示）。
+
+    Args:
+        message: メッセージ
+        level: 'info', 'warning', 'error' のいずれか
+    """
+    if is_enabled():
+        with _lock:
+            _records.append(Span(name=message, stage="log", start=time.perf_counter(), attrs={"level": level}))
+    if _log_handler is not None:
+        _log_handler(message, level)
+    else:
+        print(message)
+
+
+def summary() -> pl.DataFrame:
+    """
+    区間名ごとの集計を返します（所要時間の合計が大きい順）。
+
+    Returns:
+        pl.DataFrame: [stage, name, calls, total_ms, max_ms, rows, bytes]
+    """
+    spans = [s for s in records() if s.stage != "log"]
+    schema = {"stage": pl.Utf8, "name": pl.Utf8, "calls": pl.UInt32, "total_ms": pl.Float64,
+              "max_ms": pl.Float64, "rows": pl.Int64, "bytes": pl.Int64}
+    if not spans:
+        return pl.DataFrame(schema=schema)
+
+    return (
+        pl.DataFrame(
+            [(s.stage, s.name, s.duration * 1000, s.rows, s.bytes) for s in spans],
+            schema=["stage", "name", "ms", "rows", "bytes"],
+            orient="row",
+        )
+        .group_by(["stage", "name"])
+        .agg(
+            pl.len().alias("calls"),
+            pl.col("ms").sum().alias("total_ms"),
+            pl.col("ms").max().alias("max_ms"),
+            # 記録のない区間は 0 ではなく null にする
+            *(
+                pl.when(pl.col(c).is_not_null().any()).then(pl.col(c).sum()).cast(pl.Int64).alias(c)
+                for c in ("rows", "bytes")
+            ),
+        )
+        .sort("total_ms", descending=True)
+        .select(list(schema))
+    )
+
+
+def export_json(path: Union[str, Path]) -> Path:
+    """記録した区間を JSON（区間のリスト）として書き出します。"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps([asdict(s) for s in records()], ensure_ascii=False, indent=2, default=str),
+        encoding="utf-8",
+    )
+    return path
+
+
+def export_chrome_trace(path: Union[str, Path]) -> Path:
+    """
+    記録した区間を Chrome trace 形式で書き出します。
+    chrome://tracing や https://ui.perfetto.dev で開くと、段階ごとのタイムラインを確認できます。
+    """
+    spans = records()
+    origin = spans[0].start if spans else 0.0
+    events = []
+    for s in spans:
+        args = {k: v for k, v in {"rows": s.rows, "bytes": s.bytes, **s.attrs}.items() if v is not None}
+        event = {
+            "name": s.name, "cat": s.stage,
+            "ts": (s.start - origin) * 1e6,
+            "pid": s.pid, "tid": s.tid, "args": args,
+        }
+        if s.stage == "log":
+            event.update(ph="i", s="t")
+        else:
+            event.update(ph="X", dur=s.duration * 1e6)
+        events.append(event)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"traceEvents": events}, ensure_ascii=False, default=str), encoding="utf-8")
+    return path
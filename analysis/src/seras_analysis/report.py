@@ -0,0 +1,188 @@
+import os
+import tempfile
+from dataclasses import asdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Optional, Sequence, Union
+import polars as pl
+from . import profiling
+from .constants import REPORT_CHARTS
+
+# ワーカープロセスごとに一度だけ読み込むデータ（全キャンパス分の集計結果もここに置く）
+_worker_frames: dict[str, pl.DataFrame] = {}
+# ワーカープロセスで使う図のキャッシュ（無効の場合は None）
+_worker_cache = None
+
+
+def _init_worker(
+    occupancy_path: str,
+    open_path: str,
+    use_figure_cache: bool,
+    profile: bool = False,
+    cube_path: Optional[str] = None
+) -> None:
+    """
+    ワーカープロセスの初期化。
+
+    描画を画面なし（Agg）に切り替え、親プロセスが書き出した Arrow IPC ファイルを
+    メモリマップで読み込みます（スプレッドシートへの再アクセスは行いません）。
+    `profile` が True の場合はワーカーでも計測を有効にします。
+    `cube_path` がある場合は、ヒートマップのキューブを生ログから集計せずにそれを使います。
+    """
+    global _worker_cache
+    profiling.enable(profile)
+    import matplotlib
+    matplotlib.use("Agg")
+
+    _worker_frames["occupancy"] = pl.read_ipc(occupancy_path, memory_map=True)
+    _worker_frames["open"] = pl.read_ipc(open_path, memory_map=True)
+    if cube_path is not None:
+        _worker_frames["cube"] = pl.read_ipc(cube_path, memory_map=True)
+
+    if use_figure_cache:
+        from .figure_cache import FigureCache
+        _worker_cache = FigureCache()
+
+
+def _worker_aggregate(name: str, compute) -> pl.DataFrame:
+    """
+    全キャンパス分の集計結果をワーカー内で1回だけ計算して使い回します
+    （キャンパスごとのチャートは、この結果からキャンパスを選んで描画する）。
+    """
+    if name not in _worker_frames:
+        _worker_frames[name] = compute()
+    return _worker_frames[name]
+
+
+def _render_chart(
+    chart: str,
+    out_path: str,
+    start_date: Optional[date],
+    end_date: Optional[date],
+    building: str,
+    campus: Optional[str] = None
+) -> tuple[str, list[dict]]:
+    """
+    1つのチャートを描画して保存します（ワーカープロセス内で実行）。
+
+    Returns:
+        (保存したパス, このチャートで記録した計測区間)。計測区間は親プロセスで取り込む
+    """
+    from . import plotting
+    from .cube import build_occupancy_cube
+    from .preprocessing import extract_daily_opening_times
+    from .schema import CAMPUS_COLUMN
+
+    df_occupancy = _worker_frames["occupancy"]
+    if chart == "daily_trends":
+        plotting.plot_daily_trends(df_occupancy, start_date, end_date, save_path=out_path, cache=_worker_cache, campus=campus)
+    elif chart == "daily_breakdown":
+        plotting.plot_daily_breakdown(df_occupancy, start_date, end_date, save_path=out_path, cache=_worker_cache, campus=campus)
+    elif chart == "heatmap":
+        cube = _worker_aggregate(
+            "cube", lambda: build_occupancy_cube(plotting._filter_dates(df_occupancy, start_date, end_date))
+        )
+        plotting.plot_average_occupancy_heatmap(None, cube=cube, save_path=out_path, cache=_worker_cache, campus=campus)
+    elif chart == "opening_times":
+        df_pairs = _worker_aggregate("pairs", lambda: extract_daily_opening_times(_worker_frames["open"]))
+        df_pairs = df_pairs.filter(pl.col("Building") == building)
+        if campus is not None:
+            df_pairs = df_pairs.filter(pl.col(CAMPUS_COLUMN) == campus).drop(CAMPUS_COLUMN)
+        plotting.plot_opening_time_stats(df_pairs, save_path=out_path, cache=_worker_cache)
+    else:
+        raise ValueError(f"未対応のチャートです: {chart}")
+
+    spans = [asdict(s) for s in profiling.records()]
+    profiling.reset()
+    return out_path, spans
+
+
+def render_report(
+    df_occupancy: pl.DataFrame,
+    df_open: pl.DataFrame,
+    out_dir: Union[str, Path],
+    fmt: str = "png",
+    charts: Sequence[str] = REPORT_CHARTS,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    building: str = "2号館",
+    workers: Optional[int] = None,
+    use_figure_cache: bool = True,
+    cube: Optional[pl.DataFrame] = None
+) -> list[Path]:
+    """
+    チャートを画面なしで描画し、画像ファイルとして書き出します。
+
+    独立したチャートはプロセスプールで並列に描画します。データは一度だけ
+    Arrow IPC として一時ディレクトリに書き出し、各ワーカーはそれをメモリマップで共有します。
+    入力データと設定が前回と同じチャートは、描画せずに図のキャッシュからコピーします。
+
+    Campus カラムを持つデータ（`data_loader.load_campuses()`）の場合は、キャンパスごとの
+    チャートを `out_dir/<キャンパス名>/` に書き出します。ヒートマップのキューブと開館時間の
+    集計は、各ワーカーで全キャンパス分を1回だけ求めてから、キャンパスごとに取り出します。
+
+    Args:
+        df_occupancy: 在室状況ログ
+        df_open: 開館記録ログ
+        out_dir: 出力先ディレクトリ
+        fmt: 画像形式（png, svg など matplotlib が対応する拡張子）
+        charts: 描画するチャート（`REPORT_CHARTS` のサブセット）
+        start_date: 在室状況チャートの開始日
+        end_date: 在室状況チャートの終了日
+        building: 開館時刻分布の対象建物
+        workers: ワーカープロセス数（省略時はチャート数とCPU数の小さい方）
+        use_figure_cache: Falseの場合は図のキャッシュを使わずに全て描画する
+        cube: ヒートマップに使う集計キューブ（`cube.refresh_occupancy_cube` で差分更新したもの）。
+            指定した場合は生ログを集計しない。`df_occupancy` の全期間を描画する場合にのみ渡すこと
+
+    Returns:
+        list[Path]: 書き出したファイルのパス（キャンパスごとに `charts` の順）
+    """
+    unknown = set(charts) - set(REPORT_CHARTS)
+    if unknown:
+        raise ValueError(f"未対応のチャートです: {', '.join(sorted(unknown))}")
+
+    from .schema import CAMPUS_COLUMN
+
+    out_dir = Path(out_dir)
+    campuses = [None]
+    if CAMPUS_COLUMN in df_occupancy.columns:
+        campuses = df_occupancy[CAMPUS_COLUMN].unique().sort().to_list()
+    tasks = [
+        (chart, campus, (out_dir if campus is None else out_dir / str(campus)) / f"{chart}.{fmt}")
+        for campus in campuses
+        for chart in charts
+    ]
+    for _, _, path in tasks:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    workers = workers or min(len(tasks), os.cpu_count() or 1)
+
+    with tempfile.TemporaryDirectory(prefix="seras-report-") as tmp:
+        occupancy_path = os.path.join(tmp, "occupancy.arrow")
+        open_path = os.path.join(tmp, "open.arrow")
+        df_occupancy.write_ipc(occupancy_path)
+        df_open.write_ipc(open_path)
+        cube_path = None
+        if cube is not None:
+            cube_path = os.path.join(tmp, "cube.arrow")
+            cube.write_ipc(cube_path)
+
+        # Polarsのスレッドプールと fork の相性が悪いため spawn で起動する
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(occupancy_path, open_path, use_figure_cache, profiling.is_enabled(), cube_path),
+        ) as pool:
+            futures = [
+                pool.submit(_render_chart, chart, str(path), start_date, end_date, building, campus)
+                for chart, campus, path in tasks
+            ]
+            paths = []
+            for f in futures:
+                out_path, spans = f.result()
+                profiling.add_records(spans)
+                paths.append(Path(out_path))
+            return paths
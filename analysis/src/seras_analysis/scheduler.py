@@ -0,0 +1,264 @@
+import contextlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Iterator, Optional, TypeVar, Union
+from . import profiling
+from .sources import DataSource, QuotaExceededError
+
+try:
+    import fcntl
+except ImportError:  # Windows では共有しない（プロセス内だけで制限する）
+    fcntl = None
+
+T = TypeVar("T")
+
+# 再試行する HTTP ステータス（429: 上限超過、5xx: 一時的なサーバーエラー）
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """例外から HTTP ステータスを取り出します（gspread の APIError は `code` を持つ）。"""
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(exc, "response", None)
+    code = getattr(response, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_quota_error(exc: BaseException) -> bool:
+    """読み取りリクエストの上限超過（429）による例外かどうかを返します。"""
+    return isinstance(exc, QuotaExceededError) or _status_code(exc) == 429
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """レスポンスの Retry-After ヘッダー（秒）を返します。ない場合は None"""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    トークンバケットによるリクエスト数の制限。
+
+    容量 `burst` のバケットに1分あたり `rate_per_minute - burst` 個のトークンを補充するため、
+    どの60秒間でもリクエスト数は `rate_per_minute` を超えません
+    （Sheets API の「1分あたりの読み取りリクエスト数」の上限に合わせた形）。
+
+    `state_path` を指定すると、残りトークン数をファイルに置いてファイルロックで共有するため、
+    同じマシン上の複数のプロセス（並行して開いた Notebook など）で1つの上限を分け合えます。
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: int,
+        burst: Optional[int] = None,
+        state_path: Optional[Union[str, Path]] = None
+    ):
+        """
+        Args:
+            rate_per_minute: 1分あたりのリクエスト数の上限
+            burst: 連続して送れるリクエスト数（省略時は上限の1/4）
+            state_path: プロセス間で共有する状態ファイル（None の場合はプロセス内だけで制限）
+        """
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute は正の数を指定してください")
+        self.capacity = float(max(1, min(burst or rate_per_minute // 4, rate_per_minute)))
+        # バースト分を差し引いて補充する（補充が0になる場合は上限どおりの速度にする）
+        self.rate = max(rate_per_minute - self.capacity, 1.0) / 60.0
+        self.state_path = Path(state_path) if state_path is not None and fcntl is not None else None
+        self._tokens = self.capacity
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _state(self) -> Iterator[dict]:
+        """(tokens, updated) をロックした状態で読み書きします。"""
+        with self._lock:
+            if self.state_path is None:
+                state = {"tokens": self._tokens, "updated": self._updated}
+                yield state
+                self._tokens, self._updated = state["tokens"], state["updated"]
+                return
+
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.state_path, "a+", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read())
+                    except ValueError:
+                        state = {"tokens": self.capacity, "updated": time.time()}
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def acquire(self) -> float:
+        """
+        トークンを1つ取得します。足りない場合は補充されるまで待ちます。
+
+        Returns:
+            float: 待った時間（秒）
+        """
+        waited = 0.0
+        while True:
+            with self._state() as state:
+                now = time.time()
+                tokens = min(self.capacity, state["tokens"] + max(0.0, now - state["updated"]) * self.rate)
+                state["updated"] = now
+                if tokens >= 1.0:
+                    state["tokens"] = tokens - 1.0
+                    return waited
+                state["tokens"] = tokens
+                delay = (1.0 - tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def drain(self) -> None:
+        """残りのトークンを0にします（上限超過の応答を受けたときに、他の呼び出しも待たせる）。"""
+        with self._state() as state:
+            state["tokens"] = 0.0
+            state["updated"] = time.time()
+
+
+class RequestScheduler(DataSource):
+    """
+    読み込み元へのリクエストを制御するラッパー。
+
+    - トークンバケットで1分あたりのリクエスト数を上限内に抑える
+    - 上限超過（429）や一時的なエラー（5xx）は指数バックオフ＋ジッターで再試行する
+    - 同じ範囲への同時のリクエストは1回にまとめ、結果を共有する
+      （共有した値は読み取り専用として扱うこと）
+
+    再試行しても取得できなかった上限超過は `QuotaExceededError` として送出するため、
+    呼び出し側は「データがない」場合と区別できます。
+
+    Attributes:
+        source: 実際にリクエストを送る読み込み元
+        requests: 送ったリクエスト数（再試行を含む）
+        retries: 再試行した回数
+        coalesced: 他の呼び出しとまとめたリクエスト数
+        throttled: トークンバケットで待った合計時間（秒）
+    """
+
+    def __init__(
+        self,
+        source: DataSource,
+        quota_per_minute: Optional[int] = None,
+        burst: Optional[int] = None,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 32.0,
+        state_path: Optional[Union[str, Path]] = None,
+        bucket: Optional[TokenBucket] = None
+    ):
+        """
+        Args:
+            source: ラップする読み込み元
+            quota_per_minute: 1分あたりのリクエスト数の上限（省略時は `config.READ_QUOTA_PER_MINUTE`）
+            burst: 連続して送れるリクエスト数（省略時は上限の1/4）
+            max_retries: 再試行の最大回数
+            base_delay: バックオフの初期待ち時間（秒）
+            max_delay: バックオフの待ち時間の上限（秒）
+            state_path: プロセス間でトークンを共有する状態ファイル（`TokenBucket` を参照）
+            bucket: 他のスケジューラーと共有するトークンバケット（指定した場合は
+                `quota_per_minute` / `burst` / `state_path` より優先）。
+                上限はスプレッドシートごとではなくユーザーごとのため、複数のスプレッドシートを
+                読み込む場合は1つのバケットを共有する
+        """
+        if bucket is None:
+            if quota_per_minute is None:
+                from . import config
+                quota_per_minute = config.READ_QUOTA_PER_MINUTE
+            bucket = TokenBucket(quota_per_minute, burst, state_path)
+        self.source = source
+        self.spreadsheet_id = source.spreadsheet_id
+        self.bucket = bucket
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.requests = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.throttled = 0.0
+        self._lock = threading.Lock()
+        self._inflight: dict[tuple, Future] = {}
+
+    def _backoff(self, attempt: int, exc: BaseException) -> float:
+        """再試行までの待ち時間（full jitter。Retry-After があればそれ以上待つ）。"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, _retry_after(exc) or 0.0)
+
+    def _send(self, func: Callable[[], T]) -> T:
+        """上限内でリクエストを送り、再試行可能なエラーはバックオフして再送します。"""
+        attempt = 0
+        while True:
+            self.throttled += self.bucket.acquire()
+            self.requests += 1
+            try:
+                return func()
+            except Exception as e:
+                quota = is_quota_error(e)
+                if not quota and _status_code(e) not in RETRYABLE_STATUS:
+                    raise
+                if quota:
+                    self.bucket.drain()
+                if attempt >= self.max_retries:
+                    if quota and not isinstance(e, QuotaExceededError):
+                        raise QuotaExceededError(str(e)) from e
+                    raise
+                delay = self._backoff(attempt, e)
+                reason = "読み取りリクエストの上限に達しました" if quota else f"一時的なエラーです（{e}）"
+                profiling.log(f"警告: {reason}。{delay:.1f} 秒後に再試行します（{attempt + 1}/{self.max_retries}）。")
+                time.sleep(delay)
+                attempt += 1
+                self.retries += 1
+
+    def _coalesce(self, key: tuple, func: Callable[[], T]) -> T:
+        """同じ `key` のリクエストが実行中であれば、その結果を待って共有します。"""
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._send(func)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def titles(self) -> list[str]:
+        return self._coalesce(("titles",), self.source.titles)
+
+    def batch_get(self, ranges: list[str]) -> list[list[list[str]]]:
+        if not ranges:
+            return []
+        return self._coalesce(("batch_get", tuple(ranges)), lambda: self.source.batch_get(ranges))
+
+    def row_count(self, worksheet_name: str) -> int:
+        return self._coalesce(("row_count", worksheet_name), lambda: self.source.row_count(worksheet_name))
@@ -0,0 +1,257 @@
+from typing import Mapping, Optional, Tuple
+import polars as pl
+
+# ==========================================
+# ワークシートのスキーマ定義
+# （docs/database.md のカラム定義に対応）
+# ==========================================
+OCCUPANCY_SCHEMA: dict[str, pl.DataType] = {
+    "Timestamp": pl.Datetime("us"),
+    "Date": pl.Date(),
+    "Day": pl.Utf8(),
+    "Hour": pl.Int64(),
+    "Building1": pl.Int64(),
+    "Building2": pl.Int64(),
+    "Total": pl.Int64(),
+}
+
+OPEN_SCHEMA: dict[str, pl.DataType] = {
+    "Timestamp": pl.Datetime("us"),
+    "Actor Name": pl.Utf8(),
+    "Action": pl.Utf8(),
+    "Building": pl.Utf8(),
+}
+
+# 入退室記録（A〜D列）。シート上のヘッダーではなく列の位置でこの名前を付ける
+ENTRY_EXIT_SCHEMA: dict[str, pl.DataType] = {
+    "Entry": pl.Datetime("us"),
+    "Exit": pl.Datetime("us"),   # 空欄 = 在室中
+    "Building": pl.UInt8(),      # 1=本館, 2=2号館
+    "Name": pl.Utf8(),
+}
+
+# 入退室記録の場所コード → 建物名（occupancy_logs の Building1 / Building2 に対応）
+BUILDING_NAMES = {1: "本館", 2: "2号館"}
+
+# 複数キャンパスを1つにまとめたDataFrame（`data_loader.load_campuses()`）でキャンパス名を持つカラム。
+# 集計関数はこのカラムがあればキャンパスごとに集計する
+CAMPUS_COLUMN = "Campus"
+
+# 曜日（Day カラム）と開閉操作（Action カラム）の値
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+ACTIONS = ["OPEN", "CLOSE"]
+
+# `compact_frame` で変換する省メモリの型。
+# 人数は1館あたり数百人程度のため UInt16、時刻（時）は UInt8、値の種類が少ない文字列は
+# Enum（値が決まっているもの）または Categorical にする。
+# Timestamp はシート上で秒単位のため、ミリ秒精度で十分（サイズは同じだが精度を元データに合わせる）
+COMPACT_TYPES: dict[str, pl.DataType] = {
+    "Timestamp": pl.Datetime("ms"),
+    "Day": pl.Enum(DAY_NAMES),
+    "Hour": pl.UInt8(),
+    "Building1": pl.UInt16(),
+    "Building2": pl.UInt16(),
+    "Total": pl.UInt16(),
+    "Actor Name": pl.Categorical(),
+    "Action": pl.Enum(ACTIONS),
+    "Building": pl.Categorical(),
+}
+
+# 整数型の値の範囲
+_INT_RANGES = {pl.UInt8: (0, 2**8 - 1), pl.UInt16: (0, 2**16 - 1)}
+
+# 型ごとに試すフォーマット（先頭の値で1つに決め、列全体はそのフォーマットで1回だけパースする）
+DATETIME_FORMATS = [
+    "%Y/%m/%d %H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S%.f", "%Y/%m/%d %H:%M",
+    "%b %d %Y %H:%M:%S",  # JavaScript の Date 文字列（_JS_DATE で曜日・タイムゾーンを除いた形）
+]
+# GAS が書き込む JavaScript の Date 文字列（例: 'Thu Dec 14 2025 10:23:45 GMT+0900 (日本標準時)'）。
+# 時刻はシートのタイムゾーン（JST）のまま使い、他のシートと同じくタイムゾーンなしで扱う
+_JS_DATE = r"^[A-Za-z]{3} ([A-Za-z]{3} \d{1,2} \d{4} \d{1,2}:\d{2}:\d{2}).*$"
+DATE_FORMATS = ["%Y-%m-%d", "%Y/%m/%d"]
+
+
+def pad_row(row: list, width: int) -> list:
+    """行の長さをヘッダー幅に揃えます（末尾の空セルはAPIから返ってこないため）"""
+    return (list(row) + [""] * width)[:width]
+
+
+def _detect_format(raw: pl.Series, dtype: pl.DataType, formats: list[str]) -> Optional[str]:
+    """最初の空でない値をパースできるフォーマットを返します。"""
+    sample = raw.drop_nulls().head(1)
+    if sample.is_empty():
+        return None
+    for fmt in formats:
+        if sample.str.strptime(dtype, format=fmt, strict=False).null_count() == 0:
+            return fmt
+    return None
+
+
+def _parse_temporal(raw: pl.Series, dtype: pl.DataType, formats: list[str]) -> pl.Series:
+    """
+    日時・日付の文字列列をパースします。
+
+    検出したフォーマットで列全体を1回パースし、失敗した行がある場合に限り
+    残りのフォーマットで補完します（フォーマットが混在した古いデータ向け）。
+    """
+    fmt = _detect_format(raw, dtype, formats)
+    if fmt is None:
+        return raw.str.strptime(dtype, strict=False)
+
+    parsed = raw.str.strptime(dtype, format=fmt, strict=False)
+    if parsed.null_count() == raw.null_count():
+        return parsed
+
+    return pl.select(pl.coalesce(
+        [parsed] + [raw.str.strptime(dtype, format=f, strict=False) for f in formats if f != fmt]
+    )).to_series().alias(raw.name)
+
+
+def _parse_column(raw: pl.Series, dtype: pl.DataType) -> pl.Series:
+    """文字列列を宣言された型に変換します（変換できない値は null）。"""
+    if dtype == pl.Datetime:
+        return _parse_temporal(raw.str.replace(_JS_DATE, "${1}"), dtype, DATETIME_FORMATS)
+    if dtype == pl.Date:
+        return _parse_temporal(raw, dtype, DATE_FORMATS)
+    if dtype.is_numeric():
+        return raw.str.replace_all(",", "").cast(dtype, strict=False)
+    return raw.cast(dtype)
+
+
+def _compact_dtype(s: pl.Series, dtype: pl.DataType) -> Optional[pl.DataType]:
+    """
+    列 `s` を情報を失わずに変換できる型を返します。変換しない場合は None
+
+    値が範囲外の整数、Enum にない値を含む文字列（→ Categorical）、
+    ミリ秒未満の値を持つ日時は、それぞれ変換先を変える・変換しないことで値を保ちます。
+    """
+    if s.dtype == dtype:
+        return None
+    values = s.drop_nulls()
+    if dtype in _INT_RANGES:
+        if not s.dtype.is_integer():
+            return None
+        lo, hi = _INT_RANGES[dtype]
+        if values.is_empty() or (values.min() >= lo and values.max() <= hi):
+            return dtype
+        return None
+    if isinstance(dtype, pl.Enum):
+        if s.dtype != pl.Utf8:
+            return None
+        return dtype if values.is_in(dtype.categories.to_list()).all() else pl.Categorical()
+    if dtype == pl.Categorical:
+        return dtype if s.dtype == pl.Utf8 else None
+    if dtype == pl.Datetime:
+        if s.dtype != pl.Datetime:
+            return None
+        # ミリ秒未満の値がある場合は元の精度のまま
+        return dtype if (values.dt.microsecond() % 1000 == 0).all() else None
+    return None
+
+
+def compact_frame(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    `occupancy_logs` / `open_logs` のDataFrameを省メモリの型（`COMPACT_TYPES`）に変換します。
+
+    人数・時刻を小さい整数型に、曜日・操作を Enum に、建物名・操作者名を Categorical にします。
+    値が変換先に収まらない列（負の人数、想定外の曜日表記など）は値を保てる型にとどめるため、
+    変換によって値が変わることはありません。`COMPACT_TYPES` にない列はそのままです。
+
+    Args:
+        df: `parse_values` で読み込んだDataFrame
+
+    Returns:
+        pl.DataFrame: 変換後のDataFrame
+    """
+    casts = []
+    for name, dtype in COMPACT_TYPES.items():
+        if name not in df.columns:
+            continue
+        target = _compact_dtype(df[name], dtype)
+        if target is not None:
+            casts.append(pl.col(name).cast(target))
+    return df.with_columns(casts) if casts else df
+
+
+def memory_report(df: pl.DataFrame, compacted: Optional[pl.DataFrame] = None) -> pl.DataFrame:
+    """
+    列ごとのメモリ使用量（推定）を `compact_frame` の前後で比較します。
+
+    Args:
+        df: 変換前のDataFrame
+        compacted: 変換後のDataFrame（省略時は `compact_frame(df)`）
+
+    Returns:
+        pl.DataFrame: [column, dtype_before, bytes_before, dtype_after, bytes_after, ratio]。
+        最終行は合計（column = 'TOTAL'）
+    """
+    if compacted is None:
+        compacted = compact_frame(df)
+
+    rows = [
+        (name, str(df[name].dtype), df[name].estimated_size(),
+         str(compacted[name].dtype), compacted[name].estimated_size())
+        for name in df.columns
+    ]
+    rows.append(("TOTAL", "", df.estimated_size(), "", compacted.estimated_size()))
+    return pl.DataFrame(
+        rows,
+        schema={"column": pl.Utf8, "dtype_before": pl.Utf8, "bytes_before": pl.Int64,
+                "dtype_after": pl.Utf8, "bytes_after": pl.Int64},
+        orient="row",
+    ).with_columns(
+        (pl.col("bytes_after") / pl.col("bytes_before")).round(3).alias("ratio")
+    )
+
+
+def parse_values(
+    header: list[str],
+    rows: list[list],
+    schema: Mapping[str, pl.DataType]
+) -> Tuple[pl.DataFrame, int]:
+    """
+    シートの生の値（`get_values()` の2次元リスト）から列単位でDataFrameを作成します。
+
+    行ごとの dict を作らず、文字列の列としてまとめて読み込んでから
+    スキーマで宣言された型へ列ごとに1回だけ変換します。
+    スキーマにないカラムは文字列のまま残します。
+
+    Args:
+        header: ヘッダー行
+        rows: データ行（ヘッダー行を除く）
+        schema: カラム名 → Polarsの型
+
+    Returns:
+        Tuple[pl.DataFrame, int]: (DataFrame, パースに失敗した値を含む行数)
+    """
+    if not rows:
+        return pl.DataFrame(), 0
+
+    width = len(header)
+    padded = [row if len(row) == width else pad_row(row, width) for row in rows]
+    # 行リストを転置して列ごとに渡す（行ごとの dict を作らない）
+    df = pl.DataFrame(
+        dict(zip(header, map(list, zip(*padded)))),
+        schema={name: pl.Utf8 for name in header},
+        strict=False,
+    )
+    # 空セルは null として扱う
+    df = df.with_columns(
+        pl.when(pl.col(name).str.strip_chars() != "").then(pl.col(name)).alias(name)
+        for name in header
+    )
+
+    parsed = df.with_columns(
+        _parse_column(df[name], dtype) for name, dtype in schema.items() if name in df.columns
+    )
+
+    # 元の値があるのに変換後に null になったセルを「パース失敗」として数える
+    failed_masks = [
+        df[name].is_not_null() & parsed[name].is_null()
+        for name in schema if name in df.columns
+    ]
+    n_failed = 0
+    if failed_masks:
+        n_failed = int(pl.select(pl.any_horizontal(failed_masks)).to_series().sum())
+
+    return parsed, n_failed
@@ -0,0 +1,199 @@
+import json
+import shutil
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Tuple
+import polars as pl
+from . import config, profiling
+
+@dataclass
+class SnapshotMeta:
+    """
+    スナップショットのメタデータ。
+
+    Attributes:
+        spreadsheet_id: スプレッドシートID
+        worksheet: ワークシート名
+        columns: ヘッダー行（列の並び順）
+        rows: スナップショットに含まれるデータ行数（ヘッダー行を除く）
+        last_row: 最終データ行の生の値（追記時の整合性チェック用）
+        updated_at: 最終同期日時（ISO形式）
+    """
+    spreadsheet_id: str
+    worksheet: str
+    columns: list[str]
+    rows: int
+    last_row: list[str] = field(default_factory=list)
+    updated_at: str = ""
+
+    @property
+    def next_row(self) -> int:
+        """次に取得すべきシート上の行番号（1始まり、ヘッダーが1行目）"""
+        return self.rows + 2
+
+
+# メタデータを保存する Parquet のキー・バリューメタデータのキー。
+# データとメタデータを1つのファイルにまとめ、1回の置き換えで両方が同時に切り替わるようにする
+_META_KEY = "seras_meta"
+
+
+def _write_parquet(df: pl.DataFrame, path: Path, meta: dict) -> None:
+    """メタデータ（JSON）を埋め込んだ Parquet を一時ファイル経由で書き込みます。"""
+    tmp = path.with_suffix(".parquet.tmp")
+    df.write_parquet(tmp, metadata={_META_KEY: json.dumps(meta, ensure_ascii=False, default=str)})
+    tmp.replace(path)
+
+
+def _read_parquet(path: Path) -> Tuple[pl.DataFrame, Optional[dict]]:
+    """
+    Parquet と埋め込んだメタデータを読み込みます。
+
+    Returns:
+        (DataFrame, メタデータ)。メタデータを埋め込む前の形式（JSON を別ファイルに保存）の場合は None
+    """
+    embedded = pl.read_parquet_metadata(path).get(_META_KEY)
+    return pl.read_parquet(path), (json.loads(embedded) if embedded is not None else None)
+
+
+def _snapshot_dir(spreadsheet_id: str) -> Path:
+    return Path(config.CACHE_DIR) / spreadsheet_id
+
+
+def snapshot_path(spreadsheet_id: str, worksheet_name: str) -> Path:
+    """
+    スナップショット（Parquet）の保存先パスを返します。
+
+    Args:
+        spreadsheet_id: スプレッドシートID
+        worksheet_name: ワークシート名
+
+    Returns:
+        Path: `<CACHE_DIR>/<spreadsheet_id>/<worksheet_name>.parquet`
+    """
+    return _snapshot_dir(spreadsheet_id) / f"{worksheet_name}.parquet"
+
+
+def _meta_path(spreadsheet_id: str, worksheet_name: str) -> Path:
+    return _snapshot_dir(spreadsheet_id) / f"{worksheet_name}.json"
+
+
+def read_snapshot(spreadsheet_id: str, worksheet_name: str) -> Optional[Tuple[pl.DataFrame, SnapshotMeta]]:
+    """
+    保存済みのスナップショットを読み込みます。
+
+    Args:
+        spreadsheet_id: スプレッドシートID
+        worksheet_name: ワークシート名
+
+    Returns:
+        (DataFrame, メタデータ) のタプル。存在しない・壊れている場合は None
+    """
+    data_path = snapshot_path(spreadsheet_id, worksheet_name)
+    if not data_path.exists():
+        return None
+
+    try:
+        df, raw = _read_parquet(data_path)
+        if raw is None:
+            # 旧形式（メタデータは別ファイル）。下の行数の照合で食い違いを検出する
+            raw = json.loads(_meta_path(spreadsheet_id, worksheet_name).read_text(encoding="utf-8"))
+        meta = SnapshotMeta(**raw)
+    except Exception as e:
+        profiling.log(f"警告: スナップショット '{worksheet_name}' を読み込めませんでした（再取得します）: {e}")
+        return None
+
+    # 行数が合わない（旧形式でデータだけ置き換わった）スナップショットに追記すると行が重複するため使わない
+    if df.height != meta.rows:
+        profiling.log(
+            f"警告: スナップショット '{worksheet_name}' の行数（{df.height}）がメタデータ（{meta.rows}）と一致しません（再取得します）。"
+        )
+        return None
+    return df, meta
+
+
+def write_snapshot(df: pl.DataFrame, meta: SnapshotMeta) -> None:
+    """
+    スナップショットを書き込みます。
+
+    メタデータは Parquet のキー・バリューメタデータとして同じファイルに埋め込み、
+    一時ファイル経由の1回の置き換えで書き込むため、途中で中断してもデータとメタデータが
+    食い違う（古い行数のまま新しいデータに追記される）ことはありません。
+
+    Args:
+        df: 保存するDataFrame
+        meta: 保存するメタデータ（updated_at は上書きされます）
+    """
+    data_path = snapshot_path(meta.spreadsheet_id, meta.worksheet)
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+
+    meta.updated_at = datetime.now().isoformat(timespec="seconds")
+    _write_parquet(df, data_path, asdict(meta))
+    # 旧形式のメタデータ（別ファイル）は不要になる
+    _meta_path(meta.spreadsheet_id, meta.worksheet).unlink(missing_ok=True)
+
+
+def clear_snapshot(spreadsheet_id: str, worksheet_name: Optional[str] = None) -> None:
+    """
+    スナップショットを削除します。
+
+    Args:
+        spreadsheet_id: スプレッドシートID
+        worksheet_name: ワークシート名。Noneの場合はスプレッドシート単位で全て削除
+    """
+    if worksheet_name is None:
+        shutil.rmtree(_snapshot_dir(spreadsheet_id), ignore_errors=True)
+        return
+
+    snapshot_path(spreadsheet_id, worksheet_name).unlink(missing_ok=True)
+    _meta_path(spreadsheet_id, worksheet_name).unlink(missing_ok=True)
+
+
+def _derived_paths(spreadsheet_id: str, name: str) -> Tuple[Path, Path]:
+    base = _snapshot_dir(spreadsheet_id) / "derived"
+    return base / f"{name}.parquet", base / f"{name}.json"
+
+
+def read_derived(spreadsheet_id: str, name: str) -> Optional[Tuple[pl.DataFrame, dict]]:
+    """
+    集計結果など、ワークシートから派生したデータを読み込みます。
+
+    Args:
+        spreadsheet_id: 元データのスプレッドシートID
+        name: データ名（例: 'occupancy_cube'）
+
+    Returns:
+        (DataFrame, メタデータ) のタプル。存在しない・壊れている場合は None
+    """
+    data_path, _ = _derived_paths(spreadsheet_id, name)
+    if not data_path.exists():
+        return None
+
+    try:
+        df, meta = _read_parquet(data_path)
+    except Exception as e:
+        profiling.log(f"警告: '{name}' を読み込めませんでした（再作成します）: {e}")
+        return None
+    if meta is None:
+        # 旧形式（メタデータは別ファイル）はウォーターマークとデータが食い違っていても検出できないため作り直す
+        profiling.log(f"警告: '{name}' は旧形式のため作り直します。")
+        return None
+    return df, meta
+
+
+def write_derived(spreadsheet_id: str, name: str, df: pl.DataFrame, meta: dict) -> None:
+    """
+    派生データを書き込みます（`write_snapshot` と同じく、メタデータを埋め込んだ1つのファイルを
+    一時ファイル経由で置き換えるため、データとメタデータ（ウォーターマーク等）が食い違うことはありません）。
+
+    Args:
+        spreadsheet_id: 元データのスプレッドシートID
+        name: データ名
+        df: 保存するDataFrame
+        meta: JSONとして保存するメタデータ
+    """
+    data_path, meta_path = _derived_paths(spreadsheet_id, name)
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+
+    _write_parquet(df, data_path, {**meta, "updated_at": datetime.now().isoformat(timespec="seconds")})
+    meta_path.unlink(missing_ok=True)
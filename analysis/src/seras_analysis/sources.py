@@ -0,0 +1,322 @@
+import functools
+import json
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+from typing import Optional, Union
+import polars as pl
+from . import config
+
+
+class QuotaExceededError(Exception):
+    """読み取りリクエストの上限（1分あたり）を超えた場合のエラー（Sheets API の 429 に相当）"""
+
+
+def absolute_range_name(sheet_name: str, a1: Optional[str] = None) -> str:
+    """
+    シート名付きの範囲（"'シート名'!A2:E"）を作成します。
+    `gspread.utils.absolute_range_name` と同じ形式です（gspread を import せずに使えるように）。
+    """
+    quoted = "'{}'".format(sheet_name.replace("'", "''"))
+    return f"{quoted}!{a1}" if a1 else quoted
+
+
+def column_letter(column: int) -> str:
+    """列番号（1始まり）を列記号に変換します（例: 5 → 'E', 27 → 'AA'）。"""
+    letters = ""
+    while column > 0:
+        column, rem = divmod(column - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - ord("A") + 1
+    return index
+
+
+_A1_PATTERN = re.compile(r"^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$")
+
+
+def a1_bounds(a1: str) -> tuple[int, Optional[int], int, Optional[int]]:
+    """
+    A1範囲（'A2:E', 'A5', '1:1' など）を 0 始まり・終端を含まない行・列の範囲に変換します。
+
+    Returns:
+        (開始行, 終了行, 開始列, 終了列)。上限のない辺は None
+    """
+    match = _A1_PATTERN.match(a1.upper())
+    if match is None:
+        raise ValueError(f"A1形式ではない範囲です: {a1}")
+    col1, row1, col2, row2 = match.groups()
+    if col2 is None and row2 is None:
+        col2, row2 = col1, row1
+    return (
+        int(row1) - 1 if row1 else 0,
+        int(row2) if row2 else None,
+        _column_index(col1) - 1 if col1 else 0,
+        _column_index(col2) if col2 else None,
+    )
+
+
+def split_range_name(range_name: str) -> tuple[str, Optional[str]]:
+    """
+    "'シート名'!A2:E" 形式の範囲をシート名とA1範囲に分けます。
+
+    Returns:
+        (シート名, A1範囲) のタプル。シート全体の場合、A1範囲は None
+    """
+    if range_name.startswith("'"):
+        end = 1
+        while True:
+            end = range_name.index("'", end)
+            if range_name[end + 1:end + 2] == "'":
+                end += 2
+                continue
+            break
+        name = range_name[1:end].replace("''", "'")
+        rest = range_name[end + 1:]
+    else:
+        name, _, rest = range_name.partition("!")
+        rest = "!" + rest if rest else ""
+    return name, rest[1:] or None
+
+
+class DataSource(ABC):
+    """
+    ワークシートの値を読み込むバックエンドの共通インターフェース。
+
+    `data_loader` はこのインターフェースだけを使うため、スプレッドシート（`GspreadSource`）と
+    ローカルファイル（`LocalSource`）を切り替えて同じ処理を実行できます。
+    値はどちらも Sheets API と同じく文字列の2次元リスト（末尾の空セル・空行は省略）で返します。
+
+    Attributes:
+        spreadsheet_id: スナップショットの保存先などに使う識別子
+    """
+    spreadsheet_id: str
+
+    @abstractmethod
+    def titles(self) -> list[str]:
+        """ワークシート名の一覧を返します（1リクエスト）。"""
+
+    @abstractmethod
+    def batch_get(self, ranges: list[str]) -> list[list[list[str]]]:
+        """
+        複数の範囲の値をまとめて取得します（1リクエスト）。
+
+        Args:
+            ranges: "'シート名'!A1:E" 形式の範囲（`absolute_range_name` で作成）
+
+        Returns:
+            範囲ごとの値（`ranges` と同じ順）
+        """
+
+    @abstractmethod
+    def row_count(self, worksheet_name: str) -> int:
+        """ワークシートの行数（空行を含むグリッドの行数）を返します（1リクエスト）。"""
+
+
+class GspreadSource(DataSource):
+    """gspread で Google スプレッドシートから読み込むバックエンド"""
+
+    def __init__(self, spreadsheet_id: Optional[str] = None):
+        """
+        Args:
+            spreadsheet_id: スプレッドシートID（省略時は `config.SPREADSHEET_ID`）
+        """
+        self.spreadsheet_id = spreadsheet_id or config.SPREADSHEET_ID
+
+    def _http(self):
+        from . import auth
+        return auth.get_google_client().http_client
+
+    def titles(self) -> list[str]:
+        metadata = self._http().fetch_sheet_metadata(
+            self.spreadsheet_id, params={"fields": "sheets.properties.title"}
+        )
+        return [s["properties"]["title"] for s in metadata.get("sheets", [])]
+
+    def batch_get(self, ranges: list[str]) -> list[list[list[str]]]:
+        if not ranges:
+            return []
+        response = self._http().values_batch_get(self.spreadsheet_id, ranges)
+        return [value_range.get("values", []) for value_range in response.get("valueRanges", [])]
+
+    def row_count(self, worksheet_name: str) -> int:
+        metadata = self._http().fetch_sheet_metadata(
+            self.spreadsheet_id, params={"fields": "sheets.properties(title,gridProperties.rowCount)"}
+        )
+        for sheet in metadata.get("sheets", []):
+            if sheet["properties"]["title"] == worksheet_name:
+                return sheet["properties"]["gridProperties"]["rowCount"]
+        raise KeyError(f"ワークシートが見つかりません: {worksheet_name}")
+
+
+# LocalSource が読み込める拡張子（優先順）
+LOCAL_SUFFIXES = (".parquet", ".csv", ".json")
+
+
+def _frame_to_values(df: pl.DataFrame) -> list[list[str]]:
+    """DataFrameを Sheets API と同じ文字列の2次元リスト（ヘッダー行付き）に変換します。"""
+    as_text = []
+    for name, dtype in df.schema.items():
+        col = pl.col(name)
+        if dtype == pl.Datetime:
+            col = col.dt.strftime("%Y/%m/%d %H:%M:%S")
+        elif dtype == pl.Date:
+            col = col.dt.strftime("%Y-%m-%d")
+        as_text.append(col.cast(pl.Utf8).fill_null(""))
+    return [list(df.columns)] + [list(row) for row in df.select(as_text).iter_rows()]
+
+
+def _trim(values: list[list[str]]) -> list[list[str]]:
+    """Sheets API と同じく、行末の空セルと末尾の空行を取り除きます。"""
+    out = []
+    for row in values:
+        row = list(row)
+        while row and row[-1] == "":
+            row.pop()
+        out.append(row)
+    while out and not out[-1]:
+        out.pop()
+    return out
+
+
+class LocalSource(DataSource):
+    """
+    ワークシートと同じ形のローカルファイルから読み込むバックエンド（オフライン実行・計測用）。
+
+    `<root>/<ワークシート名>.parquet|.csv|.json` を1ファイル1ワークシートとして扱います。
+    JSON は値の2次元リスト（1行目がヘッダー）か、`get_all_records` と同じレコードのリストです。
+
+    ネットワーク越しの挙動を再現できるよう、1リクエストごとの遅延と
+    1分あたりのリクエスト数の上限（超過すると `QuotaExceededError`）を設定できます。
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        latency: float = 0.0,
+        quota_per_minute: Optional[int] = None,
+        spreadsheet_id: Optional[str] = None
+    ):
+        """
+        Args:
+            root: ワークシートファイルを置いたディレクトリ
+            latency: 1リクエストあたりに追加する待ち時間（秒）
+            quota_per_minute: 1分あたりのリクエスト数の上限（None の場合は無制限）
+            spreadsheet_id: スナップショットの保存先に使う識別子（省略時は `local-<ディレクトリ名>`）
+        """
+        self.root = Path(root)
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.spreadsheet_id = spreadsheet_id or f"local-{self.root.resolve().name}"
+        self.requests = 0
+        self._request_times: deque[float] = deque()
+        self._lock = threading.Lock()
+        self._values: dict[str, list[list[str]]] = {}
+
+    def _request(self) -> None:
+        """1リクエスト分の遅延とクォータを適用します。"""
+        with self._lock:
+            now = time.monotonic()
+            if self.quota_per_minute is not None:
+                while self._request_times and now - self._request_times[0] >= 60.0:
+                    self._request_times.popleft()
+                if len(self._request_times) >= self.quota_per_minute:
+                    raise QuotaExceededError(
+                        f"読み取りリクエストの上限（{self.quota_per_minute} 回/分）を超えました"
+                    )
+                self._request_times.append(now)
+            self.requests += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _path(self, worksheet_name: str) -> Optional[Path]:
+        for suffix in LOCAL_SUFFIXES:
+            path = self.root / f"{worksheet_name}{suffix}"
+            if path.exists():
+                return path
+        return None
+
+    def _sheet_values(self, worksheet_name: str) -> list[list[str]]:
+        """ワークシート全体の値を読み込みます（ファイルは一度だけ読み込んで保持）。"""
+        if worksheet_name in self._values:
+            return self._values[worksheet_name]
+
+        path = self._path(worksheet_name)
+        if path is None:
+            raise KeyError(f"ワークシートが見つかりません: {worksheet_name}")
+
+        if path.suffix == ".parquet":
+            values = _frame_to_values(pl.read_parquet(path))
+        elif path.suffix == ".csv":
+            values = _frame_to_values(pl.read_csv(path, infer_schema=False))
+        else:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data and isinstance(data[0], dict):
+                values = _frame_to_values(pl.DataFrame(data, infer_schema_length=None))
+            else:
+                values = [["" if v is None else str(v) for v in row] for row in data]
+
+        self._values[worksheet_name] = _trim(values)
+        return self._values[worksheet_name]
+
+    def titles(self) -> list[str]:
+        self._request()
+        if not self.root.exists():
+            return []
+        return sorted({p.stem for p in self.root.iterdir() if p.suffix in LOCAL_SUFFIXES})
+
+    def batch_get(self, ranges: list[str]) -> list[list[list[str]]]:
+        if not ranges:
+            return []
+        self._request()
+        results = []
+        for range_name in ranges:
+            name, a1 = split_range_name(range_name)
+            values = self._sheet_values(name)
+            if a1 is None:
+                results.append([list(row) for row in values])
+                continue
+            start_row, end_row, start_col, end_col = a1_bounds(a1)
+            rows = values[start_row:end_row]
+            results.append(_trim([row[start_col:end_col] for row in rows]))
+        return results
+
+    def row_count(self, worksheet_name: str) -> int:
+        self._request()
+        return len(self._sheet_values(worksheet_name))
+
+
+@functools.cache
+def _shared_bucket():
+    """全てのスプレッドシートで共有する読み取り上限のトークンバケット（上限はユーザーごとのため）"""
+    from .scheduler import TokenBucket
+    return TokenBucket(config.READ_QUOTA_PER_MINUTE, state_path=Path(config.CACHE_DIR) / "read_quota.json")
+
+
+@functools.cache
+def _scheduled_gspread_source(spreadsheet_id: str) -> DataSource:
+    from .scheduler import RequestScheduler
+    return RequestScheduler(GspreadSource(spreadsheet_id), bucket=_shared_bucket())
+
+
+def default_source(spreadsheet_id: Optional[str] = None) -> DataSource:
+    """
+    既定のバックエンドを返します。
+
+    環境変数 `SERAS_DATA_DIR` が設定されている場合はそのディレクトリの `LocalSource`、
+    それ以外はスプレッドシートの `GspreadSource` です。
+    スプレッドシートへのリクエストは `scheduler.RequestScheduler` を通し
+    （スプレッドシートごとに1つをプロセス内で共有）、1分あたりの上限
+    （`SERAS_READ_QUOTA`）を全てのスプレッドシートと同じマシン上のプロセス間で分け合います。
+    """
+    if config.DATA_DIR:
+        return LocalSource(config.DATA_DIR, spreadsheet_id=spreadsheet_id)
+    return _scheduled_gspread_source(spreadsheet_id or config.SPREADSHEET_ID)
@@ -0,0 +1,252 @@
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Sequence, Tuple, Union
+import numpy as np
+import polars as pl
+from .constants import SIZES
+from .schema import ENTRY_EXIT_SCHEMA, OCCUPANCY_SCHEMA
+
+_DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+# 長期休暇（利用者が少ない月）
+_VACATION_MONTHS = {2, 3, 8, 9}
+
+
+def _bump(hours: np.ndarray, center: float, width: float, height: float) -> np.ndarray:
+    return height * np.exp(-((hours - center) / width) ** 2)
+
+
+def _mean_curves(hours: np.ndarray, weekday: np.ndarray, month: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """時刻・曜日・月ごとの平均在室人数（1号館, 2号館）を返します。"""
+    b1 = _bump(hours, 11.0, 1.8, 18.0) + _bump(hours, 15.5, 2.5, 26.0) + 2.0
+    b2 = _bump(hours, 13.0, 3.0, 14.0) + _bump(hours, 19.0, 1.5, 8.0) + 1.0
+    # 土日は少なく、昼過ぎに寄る
+    weekend = weekday >= 6
+    b1 = np.where(weekend, 0.3 * _bump(hours, 14.0, 3.0, 20.0) + 1.0, b1)
+    b2 = np.where(weekend, 0.4 * _bump(hours, 15.0, 3.5, 12.0) + 0.5, b2)
+    scale = np.where(np.isin(month, list(_VACATION_MONTHS)), 0.5, 1.0)
+    return b1 * scale, b2 * scale
+
+
+def generate_occupancy_logs(
+    days: int,
+    start: date = date(2025, 4, 1),
+    interval_minutes: int = 5,
+    open_hours: Tuple[int, int] = (8, 22),
+    missing_rate: float = 0.02,
+    seed: int = 0
+) -> pl.DataFrame:
+    """
+    `occupancy_logs` と同じ形の合成データを作成します。
+
+    平日は午前・午後に山がある曲線、土日は低く平らな曲線を平均とし、
+    ポアソン分布で人数を生成します。記録間隔には揺らぎを入れ、一部の記録を欠落させます。
+
+    Args:
+        days: 日数
+        start: 開始日
+        interval_minutes: 記録間隔（分）
+        open_hours: 記録する時間帯 (開始時, 終了時)
+        missing_rate: 欠落させる記録の割合
+        seed: 乱数シード
+
+    Returns:
+        pl.DataFrame: `load_data()` の df_occupancy と同じスキーマのDataFrame
+    """
+    rng = np.random.default_rng(seed)
+    per_day = (open_hours[1] - open_hours[0]) * 60 // interval_minutes
+    if days <= 0 or per_day <= 0:
+        return pl.DataFrame(schema=OCCUPANCY_SCHEMA)
+
+    day_offsets = np.repeat(np.arange(days), per_day)
+    # 記録時刻（秒）: 開始時刻から等間隔 + 最大±40%の揺らぎ
+    seconds = open_hours[0] * 3600 + np.tile(np.arange(per_day) * interval_minutes * 60, days)
+    jitter = rng.uniform(-0.4, 0.4, size=seconds.size) * interval_minutes * 60
+    seconds = np.clip(seconds + jitter.astype(np.int64), open_hours[0] * 3600, open_hours[1] * 3600 - 1)
+
+    keep = rng.random(seconds.size) >= missing_rate
+    day_offsets, seconds = day_offsets[keep], seconds[keep]
+
+    base = np.datetime64(start, "us")
+    timestamps = base + day_offsets.astype("timedelta64[D]") + seconds.astype("timedelta64[s]")
+    dates = (base + day_offsets.astype("timedelta64[D]")).astype("datetime64[D]")
+    weekday = (dates.astype(np.int64) + 3) % 7 + 1  # 1970-01-01 は木曜
+    month = dates.astype("datetime64[M]").astype(np.int64) % 12 + 1
+
+    mean1, mean2 = _mean_curves(seconds / 3600.0, weekday, month)
+    b1 = rng.poisson(mean1)
+    b2 = rng.poisson(mean2)
+
+    return pl.DataFrame({
+        "Timestamp": timestamps,
+        "Date": dates,
+        "Day": np.array(_DAY_NAMES)[weekday - 1],
+        "Hour": seconds // 3600,
+        "Building1": b1,
+        "Building2": b2,
+        "Total": b1 + b2,
+    }).cast(OCCUPANCY_SCHEMA)
+
+
+def generate_open_logs(
+    days: int,
+    start: date = date(2025, 4, 1),
+    buildings: Sequence[str] = ("本館", "2号館"),
+    double_press_rate: float = 0.05,
+    orphan_close_rate: float = 0.03,
+    closed_day_rate: float = 0.05,
+    seed: int = 0
+) -> pl.DataFrame:
+    """
+    `open_logs` と同じ形の合成データを作成します。
+
+    建物ごとに1日1回の OPEN/CLOSE を基本とし、実データにある乱れとして
+    二重押下（OPEN の直後にもう一度 OPEN）、対応する OPEN のない CLOSE、
+    1時間未満で閉めた誤操作、休館日を混ぜます。
+
+    Args:
+        days: 日数
+        start: 開始日
+        buildings: 建物名
+        double_press_rate: OPEN を二重に押す割合
+        orphan_close_rate: 開館前に CLOSE だけが記録される割合
+        closed_day_rate: 開館しない日の割合
+        seed: 乱数シード
+
+    Returns:
+        pl.DataFrame: `load_data()` の df_open と同じカラム
+        [Timestamp, Actor Name, Action, Building, Date] を持つDataFrame
+    """
+    rng = np.random.default_rng(seed)
+    actors = ["佐藤", "鈴木", "高橋", "田中", "伊藤", "渡辺"]
+    events: list[Tuple[datetime, str, str, str]] = []
+
+    for offset in range(days):
+        day = datetime.combine(start + timedelta(days=offset), datetime.min.time())
+        weekend = day.isoweekday() >= 6
+        for building in buildings:
+            if rng.random() < closed_day_rate:
+                continue
+            open_at = day + timedelta(minutes=int(rng.normal(10.5 if weekend else 8.5, 0.5) * 60))
+            if rng.random() < 0.02:
+                # 誤操作（すぐに閉めた）
+                close_at = open_at + timedelta(minutes=int(rng.integers(1, 50)))
+            else:
+                close_at = day + timedelta(minutes=int(rng.normal(18.0 if weekend else 21.0, 0.7) * 60))
+            opener, closer = rng.choice(actors, size=2)
+
+            if rng.random() < orphan_close_rate:
+                events.append((open_at - timedelta(hours=2), str(rng.choice(actors)), "CLOSE", building))
+            events.append((open_at, str(opener), "OPEN", building))
+            if rng.random() < double_press_rate:
+                events.append((open_at + timedelta(seconds=int(rng.integers(5, 120))), str(opener), "OPEN", building))
+            events.append((close_at, str(closer), "CLOSE", building))
+
+    df = pl.DataFrame(
+        events,
+        schema={"Timestamp": pl.Datetime("us"), "Actor Name": pl.Utf8, "Action": pl.Utf8, "Building": pl.Utf8},
+        orient="row",
+    )
+    return df.sort("Timestamp").with_columns(pl.col("Timestamp").dt.date().alias("Date"))
+
+
+def generate_entry_exit_logs(
+    days: int,
+    start: date = date(2025, 4, 1),
+    students: int = 300,
+    open_hours: Tuple[int, int] = (8, 22),
+    visits_per_day: Tuple[float, float] = (80.0, 25.0),
+    seed: int = 0
+) -> pl.DataFrame:
+    """
+    `入退室記録` と同じ形の合成データを作成します。
+
+    建物・日ごとの来館数をポアソン分布（平日・土日で平均を変える）で決め、
+    入室時刻は昼過ぎを中心とした分布、滞在時間は対数正規分布（中央値およそ90分）で生成し、
+    閉館時刻で打ち切ります。最終日の一部の滞在は退室時刻が空欄（在室中）です。
+
+    Args:
+        days: 日数
+        start: 開始日
+        students: 生徒数（Name の種類）
+        open_hours: 開館時間帯 (開始時, 終了時)
+        visits_per_day: 1建物あたりの1日の平均来館数 (平日, 土日)
+        seed: 乱数シード
+
+    Returns:
+        pl.DataFrame: `load_entry_exit()` と同じスキーマ [Entry, Exit, Building, Name]
+    """
+    rng = np.random.default_rng(seed)
+    offsets = np.arange(max(days, 0))
+    weekday = np.array([(start + timedelta(days=int(d))).isoweekday() for d in offsets], dtype=np.int64)
+
+    day_list, building_list = [], []
+    for building in (1, 2):
+        lam = np.where(weekday >= 6, visits_per_day[1], visits_per_day[0])
+        counts = rng.poisson(lam)
+        day_list.append(np.repeat(offsets, counts))
+        building_list.append(np.full(counts.sum(), building))
+    day_offsets = np.concatenate(day_list) if day_list else np.array([], dtype=np.int64)
+    buildings = np.concatenate(building_list) if building_list else np.array([], dtype=np.int64)
+    n = day_offsets.size
+    if n == 0:
+        return pl.DataFrame(schema=ENTRY_EXIT_SCHEMA)
+
+    open_s, close_s = open_hours[0] * 3600, open_hours[1] * 3600
+    entry_s = np.clip(rng.normal(14.0 * 3600, 3.0 * 3600, n), open_s, close_s - 600).astype(np.int64)
+    stay_s = np.exp(rng.normal(np.log(90 * 60), 0.6, n)).astype(np.int64)
+    exit_s = np.minimum(entry_s + stay_s, close_s)
+
+    base = np.datetime64(start, "us")
+    day_start = base + day_offsets.astype("timedelta64[D]")
+    entries = day_start + entry_s.astype("timedelta64[s]")
+    exits = day_start + exit_s.astype("timedelta64[s]")
+
+    df = pl.DataFrame({
+        "Entry": entries,
+        "Exit": exits,
+        "Building": buildings,
+        "Name": np.char.add("生徒", np.char.zfill(rng.integers(1, students + 1, n).astype(str), 3)),
+    }).cast(ENTRY_EXIT_SCHEMA)
+    # 最終日の夕方以降に入室した滞在の一部はまだ在室中
+    last_day = start + timedelta(days=days - 1)
+    ongoing = (pl.col("Entry").dt.date() == last_day) & (pl.col("Entry").dt.hour() >= 17)
+    return df.with_columns(pl.when(ongoing).then(None).otherwise(pl.col("Exit")).alias("Exit")).sort("Entry")
+
+
+def write_fixtures(
+    root: Union[str, Path],
+    days: int,
+    fmt: str = "parquet",
+    seed: int = 0
+) -> Path:
+    """
+    合成データを `sources.LocalSource` で読み込める形で書き出します。
+
+    Args:
+        root: 出力先ディレクトリ
+        days: 日数
+        fmt: 'parquet' または 'csv'
+        seed: 乱数シード
+
+    Returns:
+        Path: 出力先ディレクトリ
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    frames = {
+        "occupancy_logs": generate_occupancy_logs(days, seed=seed),
+        # df_open の Date は読み込み時に追加されるため、シートには含めない
+        "open_logs": generate_open_logs(days, seed=seed).drop("Date"),
+        # 実際のシートと同じく JavaScript の Date 文字列で書き込む
+        "入退室記録": generate_entry_exit_logs(days, seed=seed).with_columns(
+            pl.col("Entry", "Exit").dt.strftime("%a %b %d %Y %H:%M:%S GMT+0900 (日本標準時)")
+        ),
+    }
+    for name, df in frames.items():
+        if fmt == "parquet":
+            df.write_parquet(root / f"{name}.parquet")
+        elif fmt == "csv":
+            df.with_columns(pl.col(pl.Datetime).dt.strftime("%Y/%m/%d %H:%M:%S")).write_csv(root / f"{name}.csv")
+        else:
+            raise ValueError(f"未対応の形式です: {fmt}（parquet, csv のいずれか）")
+    return root
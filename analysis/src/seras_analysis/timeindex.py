@@ -0,0 +1,175 @@
+from datetime import date
+from typing import Optional, Tuple, Union
+import polars as pl
+
+# slice_between の closed に指定できる値（`pl.Expr.is_between` と同じ）
+CLOSED = ("both", "left", "right", "none")
+
+
+def is_sorted(df: Union[pl.DataFrame, pl.LazyFrame], column: str = "Timestamp") -> bool:
+    """
+    `column` に昇順ソート済みのフラグが付いているかどうかを返します（値は走査しません）。
+
+    LazyFrame や `column` がない場合は False です。
+    """
+    return isinstance(df, pl.DataFrame) and column in df.columns and df[column].flags["SORTED_ASC"]
+
+
+def mark_sorted(df: pl.DataFrame, column: str = "Timestamp") -> pl.DataFrame:
+    """
+    `column` の昇順に並んだDataFrameを、ソート済みのフラグ付きで返します。
+
+    フラグが既にあればそのまま返し、ない場合は値が昇順かを1回だけ確認して
+    （並んでいなければソートして）フラグを付けます。null は先頭に置きます。
+    'Date' カラムが同じ順序で昇順に並んでいる場合は 'Date' にもフラグを付けるため、
+    `slice_dates` / `day_index` は二分探索で範囲を求められます。
+
+    Args:
+        df: 'Timestamp'（`column`）を含むDataFrame
+        column: 並び順の基準にするカラム
+
+    Returns:
+        pl.DataFrame: ソート済みのフラグ付きのDataFrame
+    """
+    if column not in df.columns:
+        return df
+    if not df[column].flags["SORTED_ASC"]:
+        if not df[column].is_sorted():
+            df = df.sort(column, maintain_order=True)
+        df = df.with_columns(pl.col(column).set_sorted())
+    if column != "Date" and "Date" in df.columns and not df["Date"].flags["SORTED_ASC"] and df["Date"].is_sorted():
+        df = df.with_columns(pl.col("Date").set_sorted())
+    return df
+
+
+def _bound_exprs(column: str, lower, upper, closed: str) -> list[pl.Expr]:
+    """`slice_between` と同じ範囲を表す filter の条件式（フォールバック用）"""
+    col = pl.col(column)
+    exprs = []
+    if lower is not None:
+        exprs.append(col >= lower if closed in ("both", "left") else col > lower)
+    if upper is not None:
+        exprs.append(col <= upper if closed in ("both", "right") else col < upper)
+    return exprs
+
+
+def row_bounds(
+    df: pl.DataFrame,
+    column: str,
+    lower=None,
+    upper=None,
+    closed: str = "both"
+) -> Optional[Tuple[int, int]]:
+    """
+    ソート済みの `column` が範囲に入る行の位置 [start, stop) を二分探索で求めます。
+
+    Args:
+        df: DataFrame
+        column: ソート済みのフラグが付いたカラム
+        lower: 下限（None の場合は下限なし）
+        upper: 上限（None の場合は上限なし）
+        closed: 境界を含むかどうか（'both', 'left', 'right', 'none'）
+
+    Returns:
+        Optional[Tuple[int, int]]: (start, stop)。`column` にソート済みのフラグがない場合は None。
+        範囲を指定した場合、先頭に並ぶ null の行は含まない（`filter` と同じ）
+    """
+    if closed not in CLOSED:
+        raise ValueError(f"未対応の closed です: {closed}（{', '.join(CLOSED)} のいずれか）")
+    if not is_sorted(df, column):
+        return None
+    s = df[column]
+    start = 0 if lower is None else int(s.search_sorted(lower, side="left" if closed in ("both", "left") else "right"))
+    if lower is not None or upper is not None:
+        start = max(start, s.null_count())
+    stop = s.len() if upper is None else int(s.search_sorted(upper, side="right" if closed in ("both", "right") else "left"))
+    return start, max(start, stop)
+
+
+def slice_between(
+    df: Union[pl.DataFrame, pl.LazyFrame],
+    column: str,
+    lower=None,
+    upper=None,
+    closed: str = "both"
+) -> Union[pl.DataFrame, pl.LazyFrame]:
+    """
+    `column` の値が範囲に入る行を取り出します。
+
+    ソート済みのフラグがあるDataFrameはゼロコピーのスライス（二分探索2回）で、
+    LazyFrame や並び順が保証されていないDataFrameは `filter` で絞り込みます（結果は同じ）。
+
+    Args:
+        df: DataFrame または LazyFrame
+        column: 範囲を判定するカラム
+        lower: 下限（None の場合は下限なし）
+        upper: 上限（None の場合は上限なし）
+        closed: 境界を含むかどうか（'both', 'left', 'right', 'none'）
+
+    Returns:
+        絞り込んだDataFrame（入力が LazyFrame の場合は LazyFrame）
+    """
+    bounds = row_bounds(df, column, lower, upper, closed)
+    if bounds is not None:
+        start, stop = bounds
+        return df.slice(start, stop - start)
+    exprs = _bound_exprs(column, lower, upper, closed)
+    return df.filter(exprs) if exprs else df
+
+
+def slice_dates(
+    df: Union[pl.DataFrame, pl.LazyFrame],
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> Union[pl.DataFrame, pl.LazyFrame]:
+    """
+    'Date' が開始日〜終了日（両端を含む）の行を取り出します（`slice_between` を参照）。
+    """
+    return slice_between(df, "Date", start_date, end_date, "both")
+
+
+def last_date(df: Union[pl.DataFrame, pl.LazyFrame]) -> Optional[date]:
+    """
+    最新の 'Date' を返します。ソート済みの場合は末尾の行を見るだけで求めます。
+    """
+    if is_sorted(df, "Date"):
+        return df["Date"][-1] if df["Date"].null_count() < df.height else None
+    return df.lazy().select(pl.col("Date").max()).collect(engine="streaming").item()
+
+
+def day_index(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    日ごとの行の位置（日付オフセットの索引）を作成します。
+
+    ソート済みの 'Date' に対して、最初の日から最後の日までの各日の先頭行を
+    まとめて二分探索するため、行数ではなく日数のオーダーで求まります。
+    `df.slice(Offset, Length)` でその日の行をコピーせずに取り出せます。
+
+    Args:
+        df: `mark_sorted` で 'Date' にソート済みのフラグが付いたDataFrame
+
+    Returns:
+        pl.DataFrame: [Date, Offset, Length]（行のある日だけ。Date 順）
+
+    Raises:
+        ValueError: 'Date' にソート済みのフラグがない場合
+    """
+    schema = {"Date": pl.Date, "Offset": pl.Int64, "Length": pl.Int64}
+    if not is_sorted(df, "Date"):
+        raise ValueError("'Date' がソートされていません（mark_sorted で並び順を確認してください）")
+    dates = df["Date"]
+    n_null = dates.null_count()
+    if n_null == dates.len():
+        return pl.DataFrame(schema=schema)
+
+    days = pl.date_range(dates[n_null], dates[-1], "1d", eager=True)
+    starts = dates.search_sorted(days, side="left").cast(pl.Int64)
+    return (
+        pl.DataFrame({"Date": days, "Offset": starts})
+        .with_columns(
+            (pl.col("Offset").shift(-1, fill_value=dates.len()) - pl.col("Offset")).alias("Length")
+        )
+        .filter(pl.col("Length") > 0)
+        .select(list(schema))
+    )
+
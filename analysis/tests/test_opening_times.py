@@ -0,0 +1,149 @@
+"""
+`extract_daily_opening_times` のパリティテスト。
+
+ベクトル化する前の実装（行ごとの状態機械）を参照実装として残し、乱数で作った開館記録で
+結果が一致することを確認します。
+
+    cd analysis/
+    PYTHONPATH=src uv run python -m unittest discover tests
+"""
+import random
+import unittest
+from datetime import datetime, timedelta
+
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from seras_analysis.preprocessing import extract_daily_opening_times
+from seras_analysis.schema import compact_frame
+
+# 乱数で作るケースの数とシード（失敗したケースを再現できるよう固定する）
+N_CASES = 200
+SEED = 20250401
+
+_RESULT_SCHEMA = {
+    "Date": pl.Date, "Building": pl.Utf8,
+    "OpenTime": pl.Datetime("us"), "CloseTime": pl.Datetime("us"),
+    "DurationHours": pl.Float64,
+    "Opener": pl.Utf8, "Closer": pl.Utf8,
+}
+
+
+def reference_opening_times(df: pl.DataFrame) -> pl.DataFrame:
+    """ベクトル化する前の `extract_daily_opening_times`（行ごとの状態機械）"""
+    results = []
+    for building in df["Building"].cast(pl.Utf8).unique().sort():
+        subset = df.filter(pl.col("Building").cast(pl.Utf8) == building).sort("Timestamp", maintain_order=True)
+        current_open = None  # (timestamp, actor, date)
+        for row in subset.select(["Timestamp", "Date", "Action", "Actor Name"]).iter_rows(named=True):
+            action = row["Action"].upper()
+            if action == "OPEN":
+                # 既に OPEN 状態での OPEN（二重押下）は無視
+                if current_open is None:
+                    current_open = (row["Timestamp"], row["Actor Name"], row["Date"])
+            elif action == "CLOSE" and current_open is not None:
+                # OPEN なしの CLOSE は無視
+                open_ts, open_actor, open_date = current_open
+                results.append({
+                    "Date": open_date,
+                    "Building": building,
+                    "OpenTime": open_ts,
+                    "CloseTime": row["Timestamp"],
+                    "DurationHours": (row["Timestamp"] - open_ts).total_seconds() / 3600.0,
+                    "Opener": open_actor,
+                    "Closer": row["Actor Name"],
+                })
+                current_open = None
+
+    # 1時間未満のデータを除外（誤操作とみなす）
+    return pl.DataFrame(results, schema=_RESULT_SCHEMA).filter(pl.col("DurationHours") >= 1.0)
+
+
+def random_open_logs(rng: random.Random) -> pl.DataFrame:
+    """
+    二重押下（OPEN-OPEN, CLOSE-CLOSE）、OPEN のない CLOSE、小文字の操作、1時間未満の組、
+    同じ時刻の操作を含む開館記録を作ります。行はシャッフルして返します。
+    """
+    start = datetime(2025, 4, 1, 7, 0)
+    actors = ["佐藤", "鈴木", "高橋"]
+    rows = []
+    for building in rng.sample(["本館", "2号館", "3号館"], rng.randint(1, 3)):
+        ts = start + timedelta(minutes=rng.randint(0, 120))
+        for _ in range(rng.randint(0, 30)):
+            action = rng.choice(["OPEN", "CLOSE", "open", "close", "Open"])
+            rows.append((ts, rng.choice(actors), action, building))
+            # 同じ時刻・数分後（1時間未満の組）・数時間後・翌日
+            ts += rng.choice([
+                timedelta(0),
+                timedelta(minutes=rng.randint(1, 59)),
+                timedelta(hours=rng.randint(1, 12), minutes=rng.randint(0, 59)),
+                timedelta(days=1),
+            ])
+    rng.shuffle(rows)
+    return pl.DataFrame(
+        rows,
+        schema={"Timestamp": pl.Datetime("us"), "Actor Name": pl.Utf8, "Action": pl.Utf8, "Building": pl.Utf8},
+        orient="row",
+    ).with_columns(pl.col("Timestamp").dt.date().alias("Date"))
+
+
+def _normalized(df: pl.DataFrame) -> pl.DataFrame:
+    """型と並び順を揃えます（Building 等は入力が Categorical / Enum の場合があるため）"""
+    return df.select(list(_RESULT_SCHEMA)).cast(_RESULT_SCHEMA).sort(["Building", "OpenTime"])
+
+
+class OpeningTimesParityTest(unittest.TestCase):
+    def assert_parity(self, df: pl.DataFrame) -> None:
+        # DurationHours は計算方法の違いで浮動小数点の丸めだけが異なるため、厳密には比較しない
+        assert_frame_equal(
+            _normalized(extract_daily_opening_times(df)),
+            _normalized(reference_opening_times(df)),
+            check_exact=False,
+        )
+
+    def test_random_cases(self):
+        rng = random.Random(SEED)
+        for case in range(N_CASES):
+            df = random_open_logs(rng)
+            with self.subTest(case=case):
+                self.assert_parity(df)
+
+    def test_random_cases_compact(self):
+        """`load_data()` の既定（Enum / Categorical）の型でも同じ結果になる"""
+        rng = random.Random(SEED + 1)
+        for case in range(N_CASES // 4):
+            df = random_open_logs(rng)
+            with self.subTest(case=case):
+                self.assert_parity(compact_frame(df))
+
+    def test_edge_cases(self):
+        t = datetime(2025, 4, 1, 8, 0)
+        rows = [
+            (t, "佐藤", "CLOSE", "本館"),                                 # OPEN のない CLOSE
+            (t + timedelta(minutes=5), "佐藤", "OPEN", "本館"),
+            (t + timedelta(minutes=6), "佐藤", "OPEN", "本館"),           # 二重押下
+            (t + timedelta(hours=10), "鈴木", "close", "本館"),           # 小文字
+            (t + timedelta(hours=10, minutes=1), "鈴木", "CLOSE", "本館"),  # 二重押下
+            (t + timedelta(hours=11), "高橋", "open", "本館"),
+            (t + timedelta(hours=11, minutes=30), "高橋", "close", "本館"),  # 1時間未満
+            (t + timedelta(hours=12), "高橋", "OPEN", "本館"),            # CLOSE のない OPEN
+        ]
+        df = pl.DataFrame(
+            rows,
+            schema={"Timestamp": pl.Datetime("us"), "Actor Name": pl.Utf8, "Action": pl.Utf8, "Building": pl.Utf8},
+            orient="row",
+        ).with_columns(pl.col("Timestamp").dt.date().alias("Date"))
+
+        self.assert_parity(df)
+        result = extract_daily_opening_times(df)
+        self.assertEqual(result.height, 1)
+        self.assertEqual(result["Opener"][0], "佐藤")
+        self.assertEqual(result["Closer"][0], "鈴木")
+
+    def test_empty(self):
+        df = random_open_logs(random.Random(0)).clear()
+        self.assert_parity(df)
+
+
+if __name__ == "__main__":
+    unittest.main()